@@ -7,6 +7,15 @@ from utils.file_session import FileSession
 from services.logger import init_logger_table
 from services.script_cache import init_script_costs_table
 from services.auth_manager import AuthManager
+from app.services.agendador_geracao import agendar_geracao_fila
+from app.services.perfil_scripts import init_perfil_scripts_tables
+from app.services.linter_desempenho import init_pontuacao_scripts
+from app.services.construtor_prompt import init_prompt_tokens_table
+from app.services.insert_data import init_checkpoints_insercao_table, init_valor_centavos
+from app.services.fila_insercao import init_jobs_insercao_table
+from app.services.filtro_ids import init_filtro_ids_table
+from app.services.lotes_ingestao import init_lotes_ingestao
+from app.utils.data_handler import carregar_template
 
 st.set_page_config(
     page_title="Ingestão de Dados",
@@ -22,6 +31,14 @@ if "banco_dados" not in st.session_state:
     init_database()
     init_logger_table()
     init_script_costs_table()
+    init_perfil_scripts_tables()
+    init_pontuacao_scripts()
+    init_prompt_tokens_table()
+    init_checkpoints_insercao_table()
+    init_valor_centavos()
+    init_jobs_insercao_table()
+    init_filtro_ids_table()
+    init_lotes_ingestao()
     st.session_state["banco_dados"] = True
 
 if "fila_arquivos" not in st.session_state:
@@ -96,6 +113,7 @@ with st.container(border=True):
                     st.error(f"Erro ao processar {arquivo.name}: {e}")
             
             bar_progress.empty()
+            agendar_geracao_fila(st.session_state["fila_arquivos"], auth.api_key, carregar_template())
             st.rerun()
 
 if st.session_state["fila_arquivos"]:    
@@ -1,19 +1,23 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import tempfile
 import os
 import sys
-import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.validation import validar_csv_completo
 from app.utils.ui_components import formatar_titulo_erro, renderizar_cabecalho, configurar_estilo_visual
-from app.services.script_cache import salvar_script_cache, buscar_script_cache, gerar_hash_estrutura
+from app.services.script_cache import salvar_script_cache, buscar_script_cache, gerar_hash_estrutura, obter_codigo_compilado
 from app.services.ai_code_generator import gerar_codigo_correcao_ia
-from app.utils.data_handler import carregar_template
+from app.services.cliente_llm import ProvedorIndisponivel
+from app.services.agendador_geracao import TEMPO_ESPERA_ANTECIPADA
+from app.services.executor_scripts import executar_script_perfilado, obter_executor
+from app.services.linter_desempenho import analisar_desempenho
+from app.services.perfil_scripts import registrar_execucao_script, registrar_script_validado, solicitar_reescrita_vetorizada
+from app.services.corretor_regras import erros_suportados, aplicar_correcoes_nativas, descrever_correcoes, separar_erros_para_ia
+from app.utils.data_handler import carregar_template, revalidar_dataframe
 from services.auth_manager import AuthManager
 
 st.set_page_config(
@@ -43,6 +47,9 @@ if "fila_arquivos" not in st.session_state or not st.session_state["fila_arquivo
         st.switch_page("main.py")
     st.stop()
 
+# Sobe os workers de execucao enquanto o operador revisa o script
+obter_executor()
+
 arquivos_tarefa = [
     f for f in st.session_state["fila_arquivos"] 
     if f.status in ["PENDENTE_CORRECAO", "PRONTO_IA", "FALHA_MANUAL"]
@@ -84,14 +91,99 @@ session_key_exec = f"exec_ok_{arquivo_atual.id}"
 session_key_error = f"gen_error_{arquivo_atual.id}"
 session_key_auto = f"auto_run_{arquivo_atual.id}"
 session_key_valid = f"valid_res_{arquivo_atual.id}"
+session_key_metricas = f"metricas_exec_{arquivo_atual.id}"
+session_key_base = f"base_regras_{arquivo_atual.id}"
 
 ignorar_cache_flag = st.session_state.get(f"ignore_cache_{arquivo_atual.id}", False)
 
+def obter_base_ia():
+    # Com correcoes parciais do motor de regras, a IA e o script trabalham sobre o arquivo
+    # ja corrigido e apenas com os erros que as regras nao cobrem
+    base = st.session_state.get(session_key_base)
+    if base is None:
+        return arquivo_atual.df_original, arquivo_atual.validacao
+    return base["df"], base["validacao"]
+
+def aplicar_resultado_geracao(resultado):
+    codigo, usou_cache, hash_est, s_id, qtd, tokens, econ = resultado
+    fonte_real = "CACHE" if usou_cache else "IA"
+    
+    st.session_state[session_key_code] = codigo
+    st.session_state[session_key_meta] = {
+        "hash": hash_est,
+        "tokens": tokens,
+        "econ": econ,
+        "fonte": fonte_real,
+        "script_id": s_id,
+        "vezes_utilizado": qtd
+    }
+    
+    arquivo_atual.update_ia_stats(tokens, fonte_real, econ)
+
+def aplicar_resultado_regras(df_regras, acoes_regras, res_regras, parcial=False):
+    st.session_state[session_key_code] = descrever_correcoes(acoes_regras)
+    st.session_state[session_key_meta] = {
+        "hash": None,
+        "tokens": 0,
+        "econ": 0,
+        "fonte": "REGRAS",
+        "script_id": None,
+        "vezes_utilizado": 0,
+        "parcial": parcial
+    }
+    st.session_state[session_key_exec] = df_regras
+    st.session_state[session_key_valid] = res_regras
+    arquivo_atual.update_ia_stats(0, "REGRAS")
+
 if session_key_code not in st.session_state:
     
-    if session_key_auto not in st.session_state and not st.session_state.get(session_key_error) and not ignorar_cache_flag:
-        colunas_hash = list(arquivo_atual.df_original.columns)
-        hash_est = gerar_hash_estrutura(colunas_hash, arquivo_atual.validacao["detalhes"])
+    tentativa_automatica = session_key_auto not in st.session_state and not st.session_state.get(session_key_error) and not ignorar_cache_flag
+    
+    if tentativa_automatica and erros_suportados(arquivo_atual.validacao["detalhes"]):
+        template = carregar_template()
+        df_regras, validacao_pendente, acoes_regras = separar_erros_para_ia(
+            arquivo_atual.df_original,
+            arquivo_atual.validacao,
+            template
+        )
+        res_regras = revalidar_dataframe(df_regras, template)
+        
+        if res_regras["valido"]:
+            if arquivo_atual.geracao_antecipada is not None:
+                arquivo_atual.geracao_antecipada.cancel()
+                arquivo_atual.geracao_antecipada = None
+            
+            aplicar_resultado_regras(df_regras, acoes_regras, res_regras)
+            st.rerun()
+        
+        # Restam erros fora das regras: so eles seguem para cache/IA, sobre o arquivo ja corrigido.
+        # Se as regras cobriam tudo e ainda assim falharam, o fluxo segue com o arquivo original
+        if validacao_pendente["detalhes"]:
+            st.session_state[session_key_base] = {"df": df_regras, "validacao": validacao_pendente, "acoes": acoes_regras}
+    
+    geracao_antecipada = arquivo_atual.geracao_antecipada
+    if geracao_antecipada is not None:
+        arquivo_atual.geracao_antecipada = None
+        
+        if tentativa_automatica:
+            with st.spinner("Aguardando script gerado em segundo plano..."):
+                try:
+                    resultado_antecipado = geracao_antecipada.result(timeout=TEMPO_ESPERA_ANTECIPADA)
+                except FuturesTimeoutError:
+                    # Fila do agendador lenta: a geracao segue de forma sincrona nesta pagina
+                    geracao_antecipada.cancel()
+                    st.session_state[session_key_auto] = True
+                    resultado_antecipado = None
+                except Exception:
+                    resultado_antecipado = None
+            
+            if resultado_antecipado:
+                aplicar_resultado_geracao(resultado_antecipado)
+                st.rerun()
+    
+    if tentativa_automatica:
+        df_base, validacao_base = obter_base_ia()
+        hash_est = gerar_hash_estrutura(list(df_base.columns), validacao_base["detalhes"])
         script_cache = buscar_script_cache(hash_est)
         
         if script_cache:
@@ -132,25 +224,31 @@ if session_key_code not in st.session_state:
 
         with st.spinner("Analisando dados e gerando script..."):
             try:
-                codigo, usou_cache, hash_est, s_id, qtd, tokens, econ = gerar_codigo_correcao_ia(
-                    arquivo_atual.df_original, 
-                    arquivo_atual.validacao,
+                df_base, validacao_base = obter_base_ia()
+                resultado = gerar_codigo_correcao_ia(
+                    df_base, 
+                    validacao_base,
                     ignorar_cache=ignorar_cache_flag
                 )
                 
-                fonte_real = "CACHE" if usou_cache else "IA"
-                
-                st.session_state[session_key_code] = codigo
-                st.session_state[session_key_meta] = {
-                    "hash": hash_est,
-                    "tokens": tokens,
-                    "econ": econ,
-                    "fonte": fonte_real,
-                    "script_id": s_id,
-                    "vezes_utilizado": qtd
-                }
+                aplicar_resultado_geracao(resultado)
+                st.rerun()
+            
+            except ProvedorIndisponivel as e:
+                arquivo_atual.logger.registrar_erro("GERACAO_SCRIPT", "Provedor Indisponivel", str(e))
                 
-                arquivo_atual.update_ia_stats(tokens, fonte_real, econ)
+                # Sem IA nem cache, o motor de regras corrige o que conseguir e o
+                # operador decide se o resultado parcial basta
+                template = carregar_template()
+                df_regras, acoes_regras, _ = aplicar_correcoes_nativas(
+                    arquivo_atual.df_original,
+                    arquivo_atual.validacao["detalhes"],
+                    template
+                )
+                if acoes_regras:
+                    aplicar_resultado_regras(df_regras, acoes_regras, revalidar_dataframe(df_regras, template), parcial=True)
+                else:
+                    st.session_state[session_key_error] = str(e)
                 st.rerun()
                 
             except Exception as e:
@@ -164,13 +262,28 @@ else:
     
     with st.container(border=True):
         st.markdown("#### Correção Automática Pronta")
-        if meta["fonte"] == "CACHE":
+        if meta["fonte"] == "REGRAS" and meta.get("parcial"):
+            st.markdown(":orange[**O provedor de IA está indisponível no momento. Foram aplicadas apenas as correções do motor de regras.**]")
+        elif meta["fonte"] == "REGRAS":
+            st.markdown(":green[**Os erros deste arquivo foram corrigidos diretamente pelo motor de regras, sem uso de IA.**]")
+        elif meta["fonte"] == "CACHE":
             st.markdown(f":green[**O sistema reconheceu este tipo de erro e aplicou uma correção validada anteriormente.**] (Esta correção já foi aplicada {meta.get('vezes_utilizado', 0)} vezes)")
         else:
             st.markdown(":blue[**A Inteligência Artificial analisou os erros e gerou um novo script de correção.**]")
     
         with st.expander("Ver detalhes técnicos da correção (Script Python)", expanded=False):
+            base_regras = st.session_state.get(session_key_base)
+            if meta["fonte"] != "REGRAS" and base_regras:
+                st.caption("Aplicado antes do script pelo motor de regras:")
+                st.code(descrever_correcoes(base_regras["acoes"]), language="python")
             st.code(codigo_atual, language="python")
+            
+            if meta["fonte"] != "REGRAS":
+                analise_desempenho = analisar_desempenho(codigo_atual)
+                if analise_desempenho["pontuacao"] is not None:
+                    st.caption(f"Pontuação de desempenho: {analise_desempenho['pontuacao']}/100")
+                    for problema in analise_desempenho["problemas"]:
+                        st.caption(f"Linha {problema['linha']}: {problema['mensagem']}")
     
     if session_key_exec not in st.session_state:
         
@@ -179,10 +292,14 @@ else:
         with col_exec:
             if st.button("Executar e Validar", type="primary", width='stretch'):
                 try:
-                    local_ns = {"df": arquivo_atual.df_original.copy(), "pd": pd, "np": np} 
-                    codigo_compilado = compile(codigo_atual, filename='<script_ia>', mode='exec')
-                    exec(codigo_compilado, local_ns)
-                    df_temp = local_ns["df"]
+                    # Compila aqui para acusar erro de sintaxe antes de ocupar um worker
+                    obter_codigo_compilado(codigo_atual)
+                    execucao = executar_script_perfilado(codigo_atual, obter_base_ia()[0])
+                    with st.spinner("Executando script em ambiente isolado..."):
+                        df_temp, metricas_execucao = execucao.result()
+                    
+                    registrar_execucao_script(codigo_atual, metricas_execucao, meta["hash"], meta.get("script_id"))
+                    st.session_state[session_key_metricas] = metricas_execucao
                     
                     st.session_state[session_key_exec] = df_temp
                     
@@ -233,24 +350,45 @@ else:
                     arquivo_atual.df_corrigido = df_temp
                     arquivo_atual.status = "PRONTO_IA"
                     
-                    if meta["fonte"] == "IA":
-                        tipos_erros = [e.get("tipo") for e in arquivo_atual.validacao["detalhes"]]
+                    if meta["fonte"] == "IA" or (meta["fonte"] == "CACHE" and meta.get("script_id") is None):
+                        # Scripts compartilhados por outra geracao em andamento ainda nao estao no cache
+                        tipos_erros = [e.get("tipo") for e in obter_base_ia()[1]["detalhes"]]
                         script_id = salvar_script_cache(
                             meta["hash"], 
                             codigo_atual, 
                             f"Auto-fix: {tipos_erros}", 
-                            tokens=meta["tokens"]
+                            tokens=meta["tokens"] if meta["fonte"] == "IA" else meta["econ"]
                         )
                         arquivo_atual.script_id = script_id
                     
-                    if meta["fonte"] == "CACHE":
+                    elif meta["fonte"] == "CACHE":
                         arquivo_atual.script_id = meta.get("script_id")
+                    
+                    metricas_execucao = st.session_state.get(session_key_metricas)
+                    if meta["fonte"] in ("IA", "CACHE") and arquivo_atual.script_id is not None:
+                        # Varias solucoes validadas para a mesma estrutura: o cache passa a servir a mais rapida
+                        registrar_script_validado(meta["hash"], codigo_atual, arquivo_atual.script_id)
+                        
+                        if metricas_execucao:
+                            df_base, validacao_base = obter_base_ia()
+                            solicitar_reescrita_vetorizada(
+                                meta["hash"],
+                                codigo_atual,
+                                arquivo_atual.script_id,
+                                metricas_execucao,
+                                df_base,
+                                validacao_base,
+                                AuthManager().obter_api_key(),
+                                carregar_template()
+                            )
 
                     del st.session_state[session_key_code]
                     del st.session_state[session_key_meta]
                     del st.session_state[session_key_exec]
                     if session_key_valid in st.session_state: del st.session_state[session_key_valid]
                     if session_key_error in st.session_state: del st.session_state[session_key_error]
+                    if session_key_metricas in st.session_state: del st.session_state[session_key_metricas]
+                    if session_key_base in st.session_state: del st.session_state[session_key_base]
                     st.rerun()
         else:
             with st.container(border=True):
@@ -290,5 +428,7 @@ with col_skip:
         if session_key_valid in st.session_state: del st.session_state[session_key_valid]
         if session_key_error in st.session_state: del st.session_state[session_key_error]
         if session_key_auto in st.session_state: del st.session_state[session_key_auto]
+        if session_key_metricas in st.session_state: del st.session_state[session_key_metricas]
+        if session_key_base in st.session_state: del st.session_state[session_key_base]
         
         st.rerun()
\ No newline at end of file
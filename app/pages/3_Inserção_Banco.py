@@ -1,16 +1,78 @@
 import streamlit as st
-import pandas as pd
 from pathlib import Path
 import sys
 import time
-import numpy as np
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from app.services.insert_data import inserir_transacoes, registrar_log_ingestao
+from app.services.insert_data import registrar_log_ingestao
+from app.services.fila_insercao import obter_escritor_insercao, consultar_job, STATUS_FINAIS
+from app.services.filtro_ids import ids_existentes
+from app.services.lotes_ingestao import remover_lote
 from app.utils.ui_components import exibir_preview, exibir_relatorio, preparar_retorno_ia, ir_para_dashboard, renderizar_cabecalho, configurar_estilo_visual, simplificar_msg_erro
 from services.auth_manager import AuthManager
 
+INTERVALO_ATUALIZACAO_JOB = 1.0
+
+def concluir_insercao(arquivo_atual, resultado, inicio, fim):
+    duracao = fim - inicio
+
+    resultado["nome_arquivo"] = arquivo_atual.nome
+    
+    origem_script = "Não utilizado"
+    if arquivo_atual.fonte_correcao == "IA":
+         origem_script = "IA"
+    elif arquivo_atual.fonte_correcao == "CACHE":
+         origem_script = "Cache"
+    elif arquivo_atual.fonte_correcao == "REGRAS":
+         origem_script = "Regras"
+    
+    resultado["origem_script"] = origem_script
+
+    inicio_real = getattr(arquivo_atual, "timestamp_upload", inicio)
+    duracao_total = fim - inicio_real
+    
+    total_sucesso = resultado.get("registros_inseridos", 0)
+    total_duplicados = resultado.get("registros_duplicados", 0)
+    total_erros = len(resultado.get("erros", []))
+
+    usou_ia = True if origem_script == "IA" else False
+    script_id = getattr(arquivo_atual, 'script_id', None)
+
+    registrar_log_ingestao(
+        arquivo_nome=arquivo_atual.nome,
+        registros_total=resultado.get("total_registros", 0),
+        registros_sucesso=total_sucesso,
+        registros_erro=total_erros,
+        usou_ia=usou_ia,
+        script_id=script_id,
+        duracao_segundos=duracao_total
+    )
+    
+    if not resultado.get("sucesso", True):
+        # Falha no meio do arquivo: os lotes ja gravados ficam no checkpoint e
+        # "Tentar Novamente" retoma a partir do proximo
+        msg = str(resultado["erros"][-1])
+        arquivo_atual.logger.registrar_erro("INSERCAO", "Falha Parcial", msg)
+        
+        st.session_state["erro_insercao_critico"] = True
+        st.session_state["erro_insercao_msg"] = msg
+        st.rerun()
+    
+    elif total_sucesso == 0 and total_duplicados == 0 and total_erros > 0:
+        msg = str(resultado["erros"][0])
+        arquivo_atual.logger.registrar_erro("INSERCAO", "Falha Total", msg)
+        arquivo_atual.finalizar_insercao(resultado, duracao)
+        
+        st.session_state["erro_insercao_critico"] = True
+        st.session_state["erro_insercao_msg"] = msg
+        st.rerun()
+            
+    else:
+        arquivo_atual.finalizar_insercao(resultado, duracao)
+        st.rerun()
+
+
 st.set_page_config(
     page_title="Inserção no Banco",
     layout="wide"
@@ -89,9 +151,22 @@ if arquivo_atual.status == "CONCLUIDO":
             preparar_retorno_ia(arquivo_atual, "Nenhum registro inserido (Rejeição Total pelo Banco)")
     
     else:
-        if st.button("Próximo Arquivo", type="primary", width='stretch'):
-            arquivo_atual.relatorio_visualizado = True
-            st.rerun()
+        col_prox, col_desfazer = st.columns([3, 1])
+        with col_prox:
+            if st.button("Próximo Arquivo", type="primary", width='stretch'):
+                arquivo_atual.relatorio_visualizado = True
+                st.rerun()
+        
+        with col_desfazer:
+            # Mapeamento errado percebido apos a gravacao: o lote sai inteiro e o arquivo volta para correcao
+            if ins > 0 and arquivo_atual.logger.db_id is not None:
+                if st.button("Desfazer e Reimportar", type="secondary", width='stretch'):
+                    try:
+                        removidas = remover_lote(arquivo_atual.logger.db_id)
+                        arquivo_atual.resultado_insercao = None
+                        preparar_retorno_ia(arquivo_atual, f"Importação desfeita pelo operador ({removidas} registros removidos)")
+                    except Exception as e:
+                        st.error(f"Erro ao desfazer a importação: {e}")
 
 else:
     df_final = arquivo_atual.df_corrigido if arquivo_atual.df_corrigido is not None else arquivo_atual.df_original
@@ -115,74 +190,62 @@ else:
                 if st.button("Solicitar Correção à IA", type="primary", width='stretch'):
                     preparar_retorno_ia(arquivo_atual, st.session_state.get("erro_insercao_msg"))
     
+    elif getattr(arquivo_atual, "job_insercao", None) is not None:
+        # A gravacao roda na thread do escritor; a pagina apenas acompanha o job
+        job_insercao = arquivo_atual.job_insercao
+        job = consultar_job(job_insercao["id"])
+        
+        if job is None or job["status"] not in STATUS_FINAIS:
+            total = job["total_registros"] if job else len(df_final)
+            processadas = job["registros_processados"] if job else 0
+            fracao = min(processadas / total, 1.0) if total else 0.0
+            
+            if job is None or job["status"] == "PENDENTE":
+                rotulo = "Aguardando a fila de gravação..."
+            else:
+                rotulo = f"Gravando dados no banco... {fracao:.0%}"
+            
+            with st.status(rotulo, expanded=True):
+                texto = f"{processadas:,} de {total:,} registros gravados".replace(",", ".")
+                st.progress(fracao, text=texto)
+            
+            time.sleep(INTERVALO_ATUALIZACAO_JOB)
+            st.rerun()
+        
+        arquivo_atual.job_insercao = None
+        if job["resultado"] is None:
+            msg = job["mensagem_erro"] or "Erro desconhecido"
+            arquivo_atual.logger.registrar_erro("INSERCAO", "Exception", msg)
+            
+            st.session_state["erro_insercao_critico"] = True
+            st.session_state["erro_insercao_msg"] = msg
+            st.rerun()
+        
+        concluir_insercao(arquivo_atual, job["resultado"], job_insercao["inicio"], time.time())
+    
     else:
+        if "id_transacao" in df_final.columns:
+            existentes = ids_existentes(df_final["id_transacao"])
+            if existentes:
+                st.info(f"{len(existentes)} IDs deste arquivo já existem no banco e serão ignorados na gravação.")
+        
         st.warning("Atenção: A ação abaixo irá gravar os dados no banco de dados.")
         
         col_act1, col_act2 = st.columns([3, 1])
         
         with col_act1:
             if st.button("Confirmar Inserção", type="primary", width='stretch'):
-                with st.status("Gravando dados no banco...", expanded=False) as status:
-                    try:
-                        inicio = time.time()
-                        
-                        df_final = df_final.replace({pd.NA: None, np.nan: None})
-                        
-                        resultado = inserir_transacoes(df_final)
-                        fim = time.time()
-                        duracao = fim - inicio
-
-                        resultado["nome_arquivo"] = arquivo_atual.nome
-                        
-                        origem_script = "Não utilizado"
-                        if arquivo_atual.fonte_correcao == "IA":
-                             origem_script = "IA"
-                        elif arquivo_atual.fonte_correcao == "CACHE":
-                             origem_script = "Cache"
-                        
-                        resultado["origem_script"] = origem_script
-
-                        inicio_real = getattr(arquivo_atual, "timestamp_upload", inicio)
-                        duracao_total = fim - inicio_real
-                        
-                        total_sucesso = resultado.get("registros_inseridos", 0)
-                        total_duplicados = resultado.get("registros_duplicados", 0)
-                        total_erros = len(resultado.get("erros", []))
-
-                        usou_ia = True if origem_script == "IA" else False
-                        script_id = getattr(arquivo_atual, 'script_id', None)
-
-                        registrar_log_ingestao(
-                            arquivo_nome=arquivo_atual.nome,
-                            registros_total=resultado.get("total_registros", 0),
-                            registros_sucesso=total_sucesso,
-                            registros_erro=total_erros,
-                            usou_ia=usou_ia,
-                            script_id=script_id,
-                            duracao_segundos=duracao_total
-                        )
-                        
-                        if total_sucesso == 0 and total_duplicados == 0 and total_erros > 0:
-                            msg = str(resultado["erros"][0])
-                            arquivo_atual.logger.registrar_erro("INSERCAO", "Falha Total", msg)
-                            arquivo_atual.finalizar_insercao(resultado, duracao)
-                            
-                            st.session_state["erro_insercao_critico"] = True
-                            st.session_state["erro_insercao_msg"] = msg
-                            st.rerun()
-                                
-                        else:
-                            arquivo_atual.finalizar_insercao(resultado, duracao)
-                            status.update(label="Concluído", state="complete")
-                            st.rerun()
-                        
-                    except Exception as e:
-                        status.update(label="Erro crítico", state="error")
-                        arquivo_atual.logger.registrar_erro("INSERCAO", "Exception", str(e))
-                        
-                        st.session_state["erro_insercao_critico"] = True
-                        st.session_state["erro_insercao_msg"] = str(e)
-                        st.rerun()
+                try:
+                    # O registro de monitoramento do arquivo identifica o lote gravado
+                    job_id = obter_escritor_insercao().enfileirar(df_final, arquivo_atual.nome, arquivo_atual.logger.db_id)
+                    arquivo_atual.job_insercao = {"id": job_id, "inicio": time.time()}
+                    
+                except Exception as e:
+                    arquivo_atual.logger.registrar_erro("INSERCAO", "Exception", str(e))
+                    
+                    st.session_state["erro_insercao_critico"] = True
+                    st.session_state["erro_insercao_msg"] = str(e)
+                st.rerun()
 
         with col_act2:
             if st.button("Pular Arquivo", type="secondary", width='stretch'):
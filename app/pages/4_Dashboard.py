@@ -7,6 +7,8 @@ import plotly.express as px
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from app.services.logger import carregar_dados
+from app.services.perfil_scripts import carregar_perfil_scripts, carregar_fila_regeneracao, LIMIAR_LINHAS_POR_SEGUNDO
+from app.services.cliente_llm import obter_cliente_llm
 from services.auth_manager import AuthManager
 from app.utils.ui_components import configurar_estilo_visual, simplificar_msg_erro
 
@@ -14,6 +16,8 @@ CORES = {
     "IA": "#5C7CFA",            
     "CACHE": "#10B981",
     "Cache": "#10B981",         
+    "REGRAS": "#F59E0B",
+    "Regras": "#F59E0B",
     "NENHUMA": "#94A3B8",
     "Nenhuma": "#94A3B8",       
     "Sem Correção": "#94A3B8",  
@@ -103,7 +107,7 @@ with col_graf1:
         df_origem = df_graficos['origem_correcao'].value_counts().reset_index()
         df_origem.columns = ['Origem', 'Total']
         
-        df_origem['Origem'] = df_origem['Origem'].replace({'NENHUMA': 'Sem Correção', 'CACHE': 'Cache'})
+        df_origem['Origem'] = df_origem['Origem'].replace({'NENHUMA': 'Sem Correção', 'CACHE': 'Cache', 'REGRAS': 'Regras'})
         
         fig_pizza = px.pie(
             df_origem, 
@@ -210,6 +214,73 @@ with col_graf4:
         else:
             st.success("Nenhum erro registrado nas últimas operações.")
 
+st.divider()
+st.subheader("Desempenho dos Scripts")
+
+df_perfil = carregar_perfil_scripts()
+
+if df_perfil.empty:
+    st.info("Nenhuma execução de script registrada ainda.")
+else:
+    qtd_alertas = (df_perfil['alerta'] != "").sum()
+    if qtd_alertas:
+        st.warning(f"{qtd_alertas} script(s) com desempenho abaixo do esperado (limiar: {LIMIAR_LINHAS_POR_SEGUNDO:,.0f} linhas/s).".replace(",", "."))
+    
+    st.dataframe(
+        df_perfil[[
+            'script_id', 'hash_script', 'validado', 'execucoes', 'linhas_max',
+            'tempo_medio_segundos', 'linhas_por_segundo', 'memoria_pico_mb', 'expoente_escala', 'alerta'
+        ]],
+        width='stretch',
+        hide_index=True,
+        column_config={
+            "script_id": st.column_config.NumberColumn("Script ID", format="%d"),
+            "hash_script": "Versão",
+            "validado": st.column_config.CheckboxColumn("Validado"),
+            "execucoes": st.column_config.NumberColumn("Execuções"),
+            "linhas_max": st.column_config.NumberColumn("Maior Arquivo (linhas)"),
+            "tempo_medio_segundos": st.column_config.NumberColumn("Tempo Médio (s)", format="%.3f"),
+            "linhas_por_segundo": st.column_config.NumberColumn("Linhas/s", format="%.0f"),
+            "memoria_pico_mb": st.column_config.NumberColumn("Pico de Memória (MB)", format="%.1f"),
+            "expoente_escala": st.column_config.NumberColumn("Escala (t ~ n^k)", format="%.2f"),
+            "alerta": st.column_config.TextColumn("Alerta", width="large")
+        }
+    )
+
+    df_fila = carregar_fila_regeneracao()
+    if not df_fila.empty:
+        with st.expander("Fila de Reescrita Vetorizada", expanded=False):
+            st.dataframe(
+                df_fila,
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    "linhas_por_segundo": st.column_config.NumberColumn("Linhas/s", format="%.0f"),
+                    "created_at": st.column_config.DatetimeColumn("Solicitado em", format="DD/MM HH:mm"),
+                    "updated_at": st.column_config.DatetimeColumn("Atualizado em", format="DD/MM HH:mm")
+                }
+            )
+
+st.divider()
+st.subheader("Provedor de IA")
+
+estatisticas_llm = obter_cliente_llm().estatisticas()
+latencia = estatisticas_llm["latencia"]
+
+col_circuito, col_chamadas, col_p50, col_p95 = st.columns(4)
+col_circuito.metric("Circuito", estatisticas_llm["circuito"].replace("_", " ").title())
+col_chamadas.metric("Chamadas", latencia["total"])
+col_p50.metric("Latência p50", f"≤ {latencia['p50_segundos']}s" if latencia["total"] else "-")
+col_p95.metric("Latência p95", f"≤ {latencia['p95_segundos']}s" if latencia["total"] else "-")
+
+if latencia["total"]:
+    df_latencia = pd.DataFrame({"Faixa": list(latencia["faixas"].keys()), "Chamadas": list(latencia["faixas"].values())})
+    fig_latencia = px.bar(df_latencia, x="Faixa", y="Chamadas", height=250)
+    fig_latencia.update_layout(xaxis_title="Latência", yaxis_title="Chamadas")
+    st.plotly_chart(fig_latencia, width='stretch')
+else:
+    st.info("Nenhuma chamada ao provedor desde o início do servidor.")
+
 st.divider()
 st.subheader("Histórico Detalhado")
 
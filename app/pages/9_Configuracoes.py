@@ -5,6 +5,9 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.services.auth_manager import AuthManager
+from app.services.pacote_cache import gerar_pacote_cache, importar_pacote_cache, ESTRATEGIAS_CONFLITO
+from app.services.filtro_ids import reconstruir_indice_ids
+from app.services.lotes_ingestao import listar_lotes, remover_lote
 
 st.set_page_config(page_title="Configurações", layout="wide")
 
@@ -82,7 +85,7 @@ with st.container(border=True):
             st.error("O campo de chave não pode estar vazio.")
         else:
             with st.spinner("Validando conexão..."):
-                valida, msg = auth.validar_api_key(nova_chave)
+                valida, msg = auth.validar_api_key(nova_chave, forcar=True)
                 
                 if valida:
                     salvou, msg_save = auth.salvar_api_key(nova_chave)
@@ -91,6 +94,88 @@ with st.container(border=True):
                 else:
                     st.error(f"Não foi possível conectar: {msg}")
 
+with st.container(border=True):
+    st.subheader("Cache de Scripts")
+    st.caption("Exporte o cache de correções para iniciar outra instância já aquecida, ou importe um pacote gerado em outro nó.")
+    
+    col_export, col_import = st.columns(2)
+    
+    with col_export:
+        # O pacote so e montado quando pedido, e nao a cada renderizacao da pagina
+        if st.button("Gerar Pacote", width='stretch'):
+            st.session_state["pacote_cache_exportado"] = gerar_pacote_cache()
+        
+        if "pacote_cache_exportado" in st.session_state:
+            st.download_button(
+                label="Exportar Cache",
+                data=st.session_state["pacote_cache_exportado"],
+                file_name="cache_scripts.json.gz",
+                mime="application/gzip",
+                width='stretch'
+            )
+    
+    with col_import:
+        pacote = st.file_uploader("Pacote de cache", type=["gz"], label_visibility="collapsed")
+        estrategia = st.selectbox(
+            "Em caso de conflito",
+            options=ESTRATEGIAS_CONFLITO,
+            format_func=lambda e: {
+                "mais_recente": "Manter o mais recente",
+                "mais_usado": "Manter o mais utilizado",
+                "manter_local": "Manter o local",
+                "sobrescrever": "Usar o do pacote"
+            }[e]
+        )
+        
+        if pacote and st.button("Importar Cache", type="primary", width='stretch'):
+            try:
+                resumo = importar_pacote_cache(pacote.getvalue(), estrategia=estrategia)
+                st.success(
+                    f"{resumo['inseridos']} novos, {resumo['atualizados']} atualizados, "
+                    f"{resumo['mantidos']} mantidos, {resumo['invalidos']} inválidos."
+                )
+            except ValueError as e:
+                st.error(str(e))
+
+with st.container(border=True):
+    st.subheader("Índice de IDs")
+    st.caption("Filtro em memória usado para antecipar IDs duplicados. É atualizado a cada inserção; reconstrua após remoções em massa feitas fora do sistema.")
+    
+    if st.button("Reconstruir Índice", width='stretch'):
+        try:
+            total = reconstruir_indice_ids()
+            st.success(f"Índice reconstruído com {total} IDs.")
+        except Exception as e:
+            st.error(f"Erro ao reconstruir o índice: {e}")
+
+with st.container(border=True):
+    st.subheader("Lotes de Importação")
+    st.caption("Cada arquivo importado forma um lote. Remover um lote apaga de uma vez todas as transações gravadas por ele.")
+    
+    try:
+        df_lotes = listar_lotes()
+    except Exception as e:
+        st.error(f"Erro ao carregar lotes: {e}")
+        df_lotes = None
+    
+    if df_lotes is None or df_lotes.empty:
+        st.info("Nenhum lote com transações gravadas.")
+    else:
+        opcoes = {
+            f"#{lote.lote_id} · {lote.arquivo_nome} · {lote.registros} registros · {lote.created_at}": int(lote.lote_id)
+            for lote in df_lotes.itertuples()
+        }
+        escolha = st.selectbox("Lote", list(opcoes.keys()))
+        confirmar = st.checkbox("Confirmo a remoção de todas as transações deste lote")
+        
+        if st.button("Remover Lote", width='stretch', disabled=not confirmar):
+            try:
+                removidas = remover_lote(opcoes[escolha])
+                st.session_state["msg_sucesso"] = f"Lote removido: {removidas} transações apagadas."
+                st.rerun()
+            except Exception as e:
+                st.error(f"Erro ao remover o lote: {e}")
+
 st.divider()
 
 col_vazio, col_voltar = st.columns([4, 1])
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+from app.services.ai_code_generator import gerar_codigo_correcao_ia, geracoes_em_andamento
+from app.services.corretor_regras import todos_erros_suportados, separar_erros_para_ia
+from app.services.script_cache import gerar_hash_estrutura
+
+LIMITE_CONCORRENCIA = int(os.getenv("GERACAO_MAX_CONCORRENCIA", 4))
+REQUISICOES_POR_MINUTO = int(os.getenv("GERACAO_REQUISICOES_POR_MINUTO", 30))
+# Espera maxima pela geracao antecipada antes de gerar de forma sincrona na pagina
+TEMPO_ESPERA_ANTECIPADA = float(os.getenv("GERACAO_ANTECIPADA_TIMEOUT_SEGUNDOS", 60))
+
+
+class LimitadorTaxa:
+    # Espaca o inicio das requisicoes para respeitar o limite por minuto do provedor
+    def __init__(self, requisicoes_por_minuto: int):
+        self.intervalo = 60.0 / max(requisicoes_por_minuto, 1)
+        self._proximo_horario = 0.0
+        self._lock = asyncio.Lock()
+
+    async def aguardar_vez(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            agora = loop.time()
+            espera = self._proximo_horario - agora
+            self._proximo_horario = max(agora, self._proximo_horario) + self.intervalo
+
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+
+class AgendadorGeracao:
+    def __init__(self, limite_concorrencia: int = LIMITE_CONCORRENCIA, requisicoes_por_minuto: int = REQUISICOES_POR_MINUTO):
+        self.limite_concorrencia = limite_concorrencia
+        self.requisicoes_por_minuto = requisicoes_por_minuto
+        self._loop = asyncio.new_event_loop()
+        # Geracoes em andamento por hash de estrutura, acessadas somente pela thread do loop
+        self._geracoes = {}
+        self._pronto = threading.Event()
+        self._thread = threading.Thread(target=self._executar_loop, name="agendador-geracao-ia", daemon=True)
+        self._thread.start()
+        self._pronto.wait()
+
+    def _executar_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaforo = asyncio.Semaphore(self.limite_concorrencia)
+        self._limitador = LimitadorTaxa(self.requisicoes_por_minuto)
+        self._pronto.set()
+        self._loop.run_forever()
+
+    async def _executar_limitado(self, funcao, *args):
+        async with self._semaforo:
+            await self._limitador.aguardar_vez()
+            return await asyncio.to_thread(funcao, *args)
+
+    def agendar_tarefa(self, funcao, *args) -> Future:
+        # Qualquer tarefa que chame o LLM divide o mesmo limite de concorrencia e de taxa
+        return asyncio.run_coroutine_threadsafe(self._executar_limitado(funcao, *args), self._loop)
+
+    async def _aguardar_geracao(self, anterior) -> bool:
+        # Seguidores esperam fora do semaforo; False se a geracao anterior falhou ou foi cancelada
+        try:
+            await asyncio.shield(anterior)
+            return True
+        except asyncio.CancelledError:
+            if not anterior.cancelled():
+                raise
+            return False
+        except Exception:
+            return False
+
+    async def _gerar_para_pendentes(self, df, validacao, api_key, template):
+        # O LLM recebe o arquivo ja corrigido pelas regras e apenas os erros que elas nao cobrem
+        df_base, validacao_base, _ = await asyncio.to_thread(separar_erros_para_ia, df, validacao, template)
+        args = (df_base, validacao_base, False, api_key, template, "")
+        chave = gerar_hash_estrutura(list(df_base.columns), validacao_base["detalhes"])
+
+        # Mesma estrutura ja gerada ou em geracao (por este agendador ou pela pagina): o resultado
+        # e reaproveitado sem ocupar vaga de concorrencia nem de taxa
+        anterior = self._geracoes.get(chave)
+        if anterior is None:
+            futuro = geracoes_em_andamento.futuro(chave)
+            anterior = asyncio.wrap_future(futuro) if futuro is not None else None
+        if anterior is not None and await self._aguardar_geracao(anterior):
+            return await asyncio.to_thread(gerar_codigo_correcao_ia, *args)
+
+        tarefa = asyncio.ensure_future(self._executar_limitado(gerar_codigo_correcao_ia, *args))
+        self._geracoes[chave] = tarefa
+        tarefa.add_done_callback(lambda _: self._geracoes.pop(chave, None) if self._geracoes.get(chave) is tarefa else None)
+        return await tarefa
+
+    def agendar(self, df, validacao, api_key, template) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._gerar_para_pendentes(df, validacao, api_key, template), self._loop)
+
+
+_agendador = None
+_lock_agendador = threading.Lock()
+
+def obter_agendador() -> AgendadorGeracao:
+    global _agendador
+    with _lock_agendador:
+        if _agendador is None:
+            _agendador = AgendadorGeracao()
+    return _agendador
+
+def agendar_geracao_fila(fila_arquivos, api_key, template) -> int:
+    if not api_key:
+        return 0
+
+    agendador = obter_agendador()
+    agendados = 0
+
+    for arquivo in fila_arquivos:
+        if arquivo.status != "PENDENTE_CORRECAO" or arquivo.geracao_antecipada is not None:
+            continue
+
+        # Arquivos cobertos pelo motor de regras sao corrigidos sem IA na pagina de correcao
+        if todos_erros_suportados(arquivo.validacao["detalhes"]):
+            continue
+
+        arquivo.geracao_antecipada = agendador.agendar(arquivo.df_original, arquivo.validacao, api_key, template)
+        agendados += 1
+
+    return agendados
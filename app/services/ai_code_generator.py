@@ -1,15 +1,24 @@
 import streamlit as st
 import json
 import pandas as pd
-from openai import OpenAI
 from pathlib import Path
 import os
 from dotenv import load_dotenv
 from app.services.auth_manager import AuthManager
 from app.services.script_cache import gerar_hash_estrutura, buscar_script_cache
 from app.utils.data_handler import carregar_template
+from app.services.single_flight import SingleFlight
+from app.services.linter_desempenho import analisar_desempenho, precisa_vetorizar, descrever_problemas
+from app.services.construtor_prompt import construir_prompt, registrar_tokens_prompt, contar_tokens
+from app.services.validacao_incremental import ValidadorIncremental, ErroGeracaoInterrompida
+from app.services.cliente_llm import obter_cliente_llm, ProvedorIndisponivel
 from app.utils.ui_components import formatar_titulo_erro
 
+geracoes_em_andamento = SingleFlight()
+
+# Novas tentativas imediatas quando a resposta em streaming e abortada
+TENTATIVAS_STREAMING = int(os.getenv("LLM_TENTATIVAS_STREAMING", 2))
+
 def _construir_instrucoes_dinamicas(detalhes_erros, template):
     instrucoes_estrutura = []
     instrucoes_dados = []
@@ -58,26 +67,26 @@ def _construir_instrucoes_dinamicas(detalhes_erros, template):
         elif tipo == "formato_valor":
             instrucoes_dados.append(
                 "FORMATACAO DE VALOR: Identifique colunas monetarias (ex: com 'R$', pontos de milhar). "
-                "Converta para float: remova 'R$', remova pontos, substitua virgula por ponto."
+                "Converta para float com a funcao pronta: df['valor'] = parse_brl(df['valor'])."
             )
             
         elif tipo == "formato_data":
+            formato = erro.get("formato_detectado")
+            argumento_formato = f", formato='{formato}'" if formato else ""
             instrucoes_dados.append(
-                "FORMATACAO DE DATA (CRITICO): Converta colunas de data para datetime. "
-                "Use pd.to_datetime(..., format='mixed', dayfirst=True, errors='coerce'). " \
-                "Depois converta para o formato 'YYYY-MM-DD' com .dt.strftime('%Y-%m-%d')."
+                "FORMATACAO DE DATA (CRITICO): Converta colunas de data para o formato 'YYYY-MM-DD' com a funcao pronta: "
+                f"df['data_transacao'] = normalize_dates(df['data_transacao']{argumento_formato})."
             )
             
         elif tipo == "colunas_duplicadas":
             conflitos = erro.get("conflitos", {})
             resumo_conflitos = "; ".join([f"{origens} > '{dest}'" for dest, origens in conflitos.items()])
+            chamadas = " ".join([f"df = coalesce_columns(df, '{dest}', {origens})" for dest, origens in conflitos.items()])
             
             instrucoes_estrutura.append(
                 f"CONFLITO DE COLUNAS: Existem disputas de mapeamento: [{resumo_conflitos}]. "
-                f"Resolva usando COALESCE: Mantenha os valores da coluna de destino como prioritarios. "
-                f"Use as colunas de origem APENAS para preencher lacunas (fillna) na destino. "
-                f"IMPORTANTE: NAO remova colunas extras no inicio do script se elas forem usadas aqui. "
-                f"Ao final, remova as colunas de origem sobressalentes."
+                f"Resolva com a funcao pronta (mantem a destino como prioritaria, preenche lacunas com as origens e remove as origens): {chamadas}. "
+                f"IMPORTANTE: NAO remova colunas extras no inicio do script se elas forem usadas aqui."
             )
 
         elif tipo == "valores_invalidos":
@@ -86,24 +95,11 @@ def _construir_instrucoes_dinamicas(detalhes_erros, template):
             mapeamento = erro.get("mapeamento_sugerido", {})
             default_val = erro.get("default")
 
-            acoes = [
-                f"1. Converta a coluna '{col}' para string, maiusculas e remova espacos (strip/upper)."
-            ]
-            
-            if mapeamento:
-                acoes.append(f"2. Aplique as correcoes conhecidas: df['{col}'] = df['{col}'].replace({json.dumps(mapeamento)})")
-            
-            if default_val:
-                acoes.append(f"3. Preencha valores nulos (NaN) com o padrao '{default_val}'.")
-                acoes.append(
-                    f"4. LIMPEZA FINAL: Qualquer valor que AINDA nao esteja na lista {permitidos} "
-                    f"deve ser substituido pelo padrao '{default_val}'."
-                )
-            else:
-                acoes.append(f"3. Valores nulos ou desconhecidos (fora de {permitidos}) devem ser convertidos para pd.NA (ou None).")
-
+            # map_enum normaliza (strip/upper), aplica o mapeamento e troca nulos e
+            # valores fora da lista pelo padrao (ou None, quando nao ha padrao)
             instrucoes_dados.append(
-                f"PADRONIZACAO DE CONTEUDO ('{col}'):\n   " + "\n   ".join(acoes)
+                f"PADRONIZACAO DE CONTEUDO ('{col}'): Use a funcao pronta: "
+                f"df['{col}'] = map_enum(df['{col}'], {permitidos!r}, {mapeamento!r}, {default_val!r})"
             )
 
     instrucoes = instrucoes_estrutura + instrucoes_dados
@@ -113,7 +109,114 @@ def _construir_instrucoes_dinamicas(detalhes_erros, template):
         
     return "\n".join([f"{i+1}. {inst}" for i, inst in enumerate(instrucoes)])
 
-def gerar_codigo_correcao_ia(df, resultado_validacao, ignorar_cache=False):
+def _extrair_uso(chunk):
+    # O uso chega no ultimo fragmento: em 'usage' (stream_options) ou em 'x_groq.usage'
+    uso = getattr(chunk, "usage", None)
+    if uso is None:
+        extra = getattr(chunk, "x_groq", None)
+        uso = extra.get("usage") if isinstance(extra, dict) else getattr(extra, "usage", None)
+    return uso
+
+def _transmitir_codigo(cliente_llm, api_key, prompt):
+    validador = ValidadorIncremental()
+    resposta = cliente_llm.criar_completion(
+        api_key,
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {
+                "role": "system",
+                "content": "Voce gera apenas codigo Python puro, sem formatacao Markdown."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=0.1,
+        max_tokens=4096,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    
+    uso = None
+    try:
+        for chunk in resposta:
+            uso = _extrair_uso(chunk) or uso
+            fragmento = chunk.choices[0].delta.content if chunk.choices else None
+            # Fechar a resposta interrompe a geracao: nao se paga pelo restante dos tokens
+            if fragmento and not validador.alimentar(fragmento):
+                raise ErroGeracaoInterrompida(validador.motivo_interrupcao, validador.codigo)
+        codigo_correcao = validador.finalizar()
+    finally:
+        resposta.close()
+    
+    return codigo_correcao, uso
+
+def _solicitar_codigo_llm(df, resultado_validacao, api_key, template, historico_tentativas):
+    cliente_llm = obter_cliente_llm()
+    
+    instrucoes_especificas = _construir_instrucoes_dinamicas(resultado_validacao["detalhes"],template)
+    hash_estrutura = gerar_hash_estrutura(list(df.columns), resultado_validacao["detalhes"])
+    
+    tokens_gastos = 0
+    historico = historico_tentativas
+    for tentativa in range(TENTATIVAS_STREAMING + 1):
+        # Apenas as colunas com erro e amostras dos valores problematicos entram no prompt,
+        # dentro do orcamento de tokens
+        prompt_construido = construir_prompt(df, resultado_validacao, template, instrucoes_especificas, historico)
+        
+        try:
+            codigo_correcao, uso = _transmitir_codigo(cliente_llm, api_key, prompt_construido["prompt"])
+        except ErroGeracaoInterrompida as e:
+            # Sem o uso informado pelo provedor, o custo da tentativa abortada e estimado
+            tokens_gastos += prompt_construido["total_tokens"] + contar_tokens(e.parcial)
+            registrar_tokens_prompt(prompt_construido, hash_estrutura)
+            if tentativa == TENTATIVAS_STREAMING:
+                raise
+            historico = f"""{historico_tentativas}
+    RESPOSTA ANTERIOR INTERROMPIDA ({e.motivo}). Responda somente com codigo Python valido, sem texto explicativo.
+    """
+            continue
+        
+        tokens_prompt_real = None
+        if uso:
+            tokens_gastos += uso.total_tokens
+            tokens_prompt_real = uso.prompt_tokens
+        
+        registrar_tokens_prompt(prompt_construido, hash_estrutura, tokens_prompt_real)
+        return codigo_correcao, tokens_gastos
+
+def _solicitar_codigo_com_revisao_desempenho(df, resultado_validacao, api_key, template, historico_tentativas):
+    codigo_correcao, tokens_gastos = _solicitar_codigo_llm(df, resultado_validacao, api_key, template, historico_tentativas)
+    
+    # Scripts cacheados sao repetidos a cada arquivo com a mesma estrutura: padroes lentos
+    # ganham uma tentativa de reescrita vetorizada antes de chegar ao cache
+    analise = analisar_desempenho(codigo_correcao)
+    if not precisa_vetorizar(analise):
+        return codigo_correcao, tokens_gastos
+    
+    historico_vetorizacao = f"""{historico_tentativas}
+    REVISAO DE DESEMPENHO: O script abaixo usa padroes lentos:
+    {descrever_problemas(analise)}
+    Reescreva-o usando operacoes vetorizadas do pandas, mantendo exatamente o mesmo resultado.
+    
+    SCRIPT A REESCREVER:
+    {codigo_correcao}
+    """
+    
+    try:
+        codigo_vetorizado, tokens_revisao = _solicitar_codigo_llm(df, resultado_validacao, api_key, template, historico_vetorizacao)
+    except Exception:
+        return codigo_correcao, tokens_gastos
+    
+    tokens_gastos += tokens_revisao
+    pontuacao_nova = analisar_desempenho(codigo_vetorizado)["pontuacao"]
+    if pontuacao_nova is not None and pontuacao_nova > analise["pontuacao"]:
+        codigo_correcao = codigo_vetorizado
+    
+    return codigo_correcao, tokens_gastos
+
+def gerar_codigo_correcao_ia(df, resultado_validacao, ignorar_cache=False, api_key=None, template=None, historico_tentativas=None):
     colunas_df = list(df.columns)
     hash_estrutura = gerar_hash_estrutura(colunas_df, resultado_validacao["detalhes"])
     
@@ -130,27 +233,23 @@ def gerar_codigo_correcao_ia(df, resultado_validacao, ignorar_cache=False):
                 script_cache.get("custo_tokens", 0)
             )
     
-    auth = AuthManager()
-    GROQ_API_KEY = auth.obter_api_key()
+    # Fora da thread do Streamlit (geracao em segundo plano) a chave, o template e o
+    # historico chegam por parametro, pois st.session_state nao esta disponivel
+    GROQ_API_KEY = api_key
+    if GROQ_API_KEY is None:
+        auth = AuthManager()
+        GROQ_API_KEY = auth.obter_api_key()
     
     if not GROQ_API_KEY:
         raise ValueError("API Key não encontrada! Configure o arquivo secrets.env")
     
-    client = OpenAI(
-        base_url="https://api.groq.com/openai/v1",
-        api_key=GROQ_API_KEY
-    )
-    
-    template = carregar_template()
+    if template is None:
+        template = carregar_template()
     
-    instrucoes_especificas = _construir_instrucoes_dinamicas(resultado_validacao["detalhes"],template)
-    
-    sample_data = df.head(3).to_dict('records')
-    dtypes_info = df.dtypes.to_string()
-    
-    historico_tentativas = ""
-    if "script_anterior" in st.session_state and "erro_anterior" in st.session_state:
-        historico_tentativas = f"""
+    if historico_tentativas is None:
+        historico_tentativas = ""
+        if "script_anterior" in st.session_state and "erro_anterior" in st.session_state:
+            historico_tentativas = f"""
         TENTATIVA ANTERIOR FALHOU COM O ERRO:
         {st.session_state['erro_anterior']}
         
@@ -158,55 +257,45 @@ def gerar_codigo_correcao_ia(df, resultado_validacao, ignorar_cache=False):
         {st.session_state['script_anterior']}
         """
 
-    prompt = f"""
-    Voce e um Engenheiro de Dados Senior especialista em Pandas.
-    Sua tarefa e gerar um script Python para corrigir um DataFrame chamado `df`.
-
-    CONTEXTO DOS DADOS:
-    - Colunas Atuais: {colunas_df}
-    - Tipos de Dados (dtypes):
-    {dtypes_info}
-    - Amostra (head 3):
-    {json.dumps(sample_data, indent=2, ensure_ascii=False)}
+    def gerar():
+        return _solicitar_codigo_com_revisao_desempenho(df, resultado_validacao, GROQ_API_KEY, template, historico_tentativas)
 
-    {historico_tentativas}
-
-    LISTA DE TAREFAS OBRIGATORIAS (Baseada nos erros detectados):
-    {instrucoes_especificas}
-
-    REGRAS GERAIS:
-    1. Apenas remova colunas extras que nao estejam no template {list(template["colunas"].keys())} APOS realizar todas as correcoes de dados (merges, renames, etc), no final do script.
-    2. O codigo deve assumir que 'df' e 'pd' ja existem.
-    3. NAO use blocos markdown. Retorne apenas o codigo.
-    4. Se precisar de regex, importe 're'. Se precisar de numpy, importe 'numpy as np'.
-    5. GARANTIA FINAL: Apos todas as transformacoes, execute df = df.loc[:, ~df.columns.duplicated()] para garantir que nao existam colunas com nomes duplicados.
-    6. A saida final deve ser a alteracao do dataframe `df`.
-
-    Gere apenas o codigo Python:
-    """
+    # Regeneracoes explicitas (cache ignorado ou com historico de falha) nao sao compartilhadas
+    try:
+        if ignorar_cache or historico_tentativas:
+            # O script compartilhado anterior foi recusado; outros arquivos nao o reaproveitam
+            geracoes_em_andamento.descartar(hash_estrutura)
+            codigo_correcao, tokens_gastos = gerar()
+            lider = True
+        else:
+            (codigo_correcao, tokens_gastos), lider = geracoes_em_andamento.executar(hash_estrutura, gerar)
+    except ProvedorIndisponivel:
+        # Com o provedor degradado, um script salvo por outra sessao enquanto esta esperava
+        # ainda serve; sem ele (ou com o cache recusado), a pagina recorre ao motor de regras
+        script_cache = None if ignorar_cache else buscar_script_cache(hash_estrutura)
+        if script_cache is None:
+            raise
+        return (
+            script_cache["script"],
+            True,
+            hash_estrutura,
+            script_cache["id"],
+            script_cache["vezes_utilizado"],
+            0,
+            script_cache.get("custo_tokens", 0)
+        )
     
-    chat_completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {
-                "role": "system",
-                "content": "Voce gera apenas codigo Python puro, sem formatacao Markdown."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        temperature=0.1,
-        max_tokens=4096,
-    )
-
-    tokens_gastos = 0
-    codigo_correcao = chat_completion.choices[0].message.content
-    codigo_correcao = codigo_correcao.replace("```python", "").replace("```", "").strip()
-
-    if hasattr(chat_completion, 'usage') and chat_completion.usage:
-        tokens_gastos = chat_completion.usage.total_tokens
+    if not lider:
+        # Outra sessao pagou pela geracao desta mesma estrutura; o script e reaproveitado como cache
+        return (
+            codigo_correcao,
+            True,
+            hash_estrutura,
+            None,
+            0,
+            0,
+            tokens_gastos
+        )
     
     return (
         codigo_correcao,
@@ -1,8 +1,9 @@
 import os
+import time
 from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv, set_key, unset_key
-from openai import OpenAI
+from app.services.cache_validacao import cache_validacao, TTL_VALIDACAO_SEGUNDOS
 
 ENV_PATH = Path(__file__).parent.parent / "secrets.env"
 
@@ -11,8 +12,22 @@ class AuthManager:
         self.api_key = self.obter_api_key()
 
     def obter_api_key(self):
-        if "GROQ_API_KEY" in st.session_state and st.session_state["GROQ_API_KEY"]:
-            return st.session_state["GROQ_API_KEY"]
+        chave_sessao = st.session_state.get("GROQ_API_KEY")
+        if chave_sessao:
+            validada_em = st.session_state.get("GROQ_API_KEY_VALIDADA_EM", 0)
+            if time.monotonic() - validada_em < TTL_VALIDACAO_SEGUNDOS:
+                return chave_sessao
+            
+            # Sessao vencida: consulta o cache do processo, sem rede; se a revalidacao em
+            # segundo plano recusar a chave, a proxima execucao da pagina pede outra
+            resultado = cache_validacao.consultar(chave_sessao)
+            if resultado is None or resultado[0]:
+                if resultado is not None:
+                    st.session_state["GROQ_API_KEY_VALIDADA_EM"] = time.monotonic()
+                return chave_sessao
+            
+            del st.session_state["GROQ_API_KEY"]
+            return None
         
         load_dotenv(ENV_PATH, override=True)
         env_key = os.getenv("GROQ_API_KEY")
@@ -21,48 +36,23 @@ class AuthManager:
             valida, _ = self.validar_api_key(env_key)
             if valida:
                 st.session_state["GROQ_API_KEY"] = env_key
+                st.session_state["GROQ_API_KEY_VALIDADA_EM"] = time.monotonic()
                 return env_key
 
         return None
 
-    def validar_api_key(self, api_key_candidata=None):
+    def validar_api_key(self, api_key_candidata=None, forcar=False):
         chave_teste = api_key_candidata if api_key_candidata else self.api_key
 
         if not chave_teste:
             return False, "Nenhuma chave fornecida para validação"
 
-        try:
-            client = OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=chave_teste
-            )
-
-            client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Voce gera apenas codigo Python puro, sem formatacao Markdown."
-                    },
-                    {
-                        "role": "user",
-                        "content": "Teste de conexao"
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=1, 
-            )
-            return True, "Chave valida e funcional"
-            
-        except Exception as e:
-            msg = str(e)
-            if "401" in msg:
-                return False, "Erro 401: Chave invalida ou nao autorizada"
-            return False, f"Erro de conexao: {msg}"
+        return cache_validacao.validar(chave_teste, forcar=forcar)
 
     def salvar_api_key(self, nova_api_key):
         self.api_key = nova_api_key
         st.session_state["GROQ_API_KEY"] = nova_api_key
+        st.session_state["GROQ_API_KEY_VALIDADA_EM"] = time.monotonic()
         
         try:
             if not os.path.exists(ENV_PATH):
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+import time
+
+from openai import AuthenticationError
+
+from app.services.cliente_llm import obter_cliente_llm
+
+TTL_VALIDACAO_SEGUNDOS = float(os.getenv("AUTH_VALIDACAO_TTL_SEGUNDOS", 900))
+
+
+def validar_chave_na_rede(api_key: str) -> tuple:
+    try:
+        obter_cliente_llm().criar_completion(
+            api_key,
+            model="llama-3.3-70b-versatile",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Voce gera apenas codigo Python puro, sem formatacao Markdown."
+                },
+                {
+                    "role": "user",
+                    "content": "Teste de conexao"
+                }
+            ],
+            temperature=0.1,
+            max_tokens=1, 
+        )
+        return True, "Chave valida e funcional", True
+        
+    except Exception as e:
+        msg = str(e)
+        # Somente a recusa da chave e definitiva; falhas de rede nao entram no cache
+        if isinstance(e, AuthenticationError) or "401" in msg:
+            return False, "Erro 401: Chave invalida ou nao autorizada", True
+        return False, f"Erro de conexao: {msg}", False
+
+
+def _chave_cache(api_key: str) -> str:
+    # A chave em si nao fica como indice do cache
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class CacheValidacaoChaves:
+    # Resultado da validacao de cada chave, compartilhado por todas as sessoes do processo.
+    # Resultados vencidos continuam valendo enquanto uma nova validacao roda em segundo plano
+    def __init__(self, validador, ttl: float = TTL_VALIDACAO_SEGUNDOS, relogio=time.monotonic):
+        # validador(api_key) -> (valida, mensagem, conclusivo); falhas de rede nao sao conclusivas
+        self._validador = validador
+        self.ttl = ttl
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._resultados = {}
+        self._em_andamento = set()
+
+    def _vencido(self, registro) -> bool:
+        return self._relogio() - registro["validado_em"] >= self.ttl
+
+    def _validar_agora(self, api_key: str) -> tuple:
+        valida, mensagem, conclusivo = self._validador(api_key)
+        if conclusivo:
+            with self._lock:
+                self._resultados[_chave_cache(api_key)] = {
+                    "valida": valida,
+                    "mensagem": mensagem,
+                    "validado_em": self._relogio()
+                }
+        return valida, mensagem
+
+    def _revalidar_em_segundo_plano(self, api_key: str):
+        chave = _chave_cache(api_key)
+        with self._lock:
+            if chave in self._em_andamento:
+                return
+            self._em_andamento.add(chave)
+
+        def executar():
+            try:
+                self._validar_agora(api_key)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._em_andamento.discard(chave)
+
+        threading.Thread(target=executar, daemon=True, name="revalidacao-chave").start()
+
+    def consultar(self, api_key: str):
+        # Nunca acessa a rede: retorna o ultimo resultado conhecido (ou None) e agenda
+        # a revalidacao quando ele nao existe ou venceu
+        with self._lock:
+            registro = self._resultados.get(_chave_cache(api_key))
+
+        if registro is None or self._vencido(registro):
+            self._revalidar_em_segundo_plano(api_key)
+        if registro is None:
+            return None
+        return registro["valida"], registro["mensagem"]
+
+    def validar(self, api_key: str, forcar: bool = False) -> tuple:
+        # Bloqueia apenas na primeira validacao da chave no processo; forcar (teste pedido
+        # pelo operador) sempre consulta a rede e atualiza o cache
+        with self._lock:
+            registro = self._resultados.get(_chave_cache(api_key))
+        if registro is None or forcar:
+            return self._validar_agora(api_key)
+        return self.consultar(api_key)
+
+    def invalidar(self, api_key: str):
+        with self._lock:
+            self._resultados.pop(_chave_cache(api_key), None)
+
+    def em_andamento(self, api_key: str) -> bool:
+        with self._lock:
+            return _chave_cache(api_key) in self._em_andamento
+
+
+# Fica neste modulo (sempre importado como app.services) para ser unico no processo,
+# mesmo com as paginas importando o auth_manager por caminhos diferentes
+cache_validacao = CacheValidacaoChaves(validar_chave_na_rede)
@@ -0,0 +1,226 @@
+import bisect
+import os
+import random
+import threading
+import time
+
+import openai
+from openai import OpenAI
+
+URL_BASE_LLM = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+TEMPO_LIMITE_SEGUNDOS = float(os.getenv("LLM_TEMPO_LIMITE_SEGUNDOS", 60))
+TEMPO_LIMITE_CONEXAO_SEGUNDOS = float(os.getenv("LLM_TEMPO_LIMITE_CONEXAO_SEGUNDOS", 5))
+MAX_TENTATIVAS = int(os.getenv("LLM_MAX_TENTATIVAS", 4))
+ESPERA_BASE_SEGUNDOS = float(os.getenv("LLM_ESPERA_BASE_SEGUNDOS", 0.5))
+ESPERA_MAXIMA_SEGUNDOS = float(os.getenv("LLM_ESPERA_MAXIMA_SEGUNDOS", 8))
+FALHAS_PARA_ABRIR_CIRCUITO = int(os.getenv("LLM_FALHAS_PARA_ABRIR_CIRCUITO", 5))
+CIRCUITO_ABERTO_SEGUNDOS = float(os.getenv("LLM_CIRCUITO_ABERTO_SEGUNDOS", 30))
+
+# Limites superiores (em segundos) das faixas do histograma de latencia
+FAIXAS_LATENCIA = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+ERROS_TRANSITORIOS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+class ProvedorIndisponivel(Exception):
+    # Provedor degradado: retentativas esgotadas ou circuito aberto
+    pass
+
+
+class CircuitoAberto(ProvedorIndisponivel):
+    pass
+
+
+class DisjuntorCircuito:
+    FECHADO = "FECHADO"
+    ABERTO = "ABERTO"
+    MEIO_ABERTO = "MEIO_ABERTO"
+
+    def __init__(self, falhas_para_abrir: int = FALHAS_PARA_ABRIR_CIRCUITO, segundos_aberto: float = CIRCUITO_ABERTO_SEGUNDOS, relogio=time.monotonic):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.segundos_aberto = segundos_aberto
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._falhas_consecutivas = 0
+        self._aberto_desde = None
+        self._sondagem_em_andamento = False
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            return self._estado()
+
+    def _estado(self) -> str:
+        if self._aberto_desde is None:
+            return self.FECHADO
+        if self._relogio() - self._aberto_desde >= self.segundos_aberto:
+            return self.MEIO_ABERTO
+        return self.ABERTO
+
+    def permitir(self) -> bool:
+        # True quando a chamada liberada e a sondagem do circuito meio aberto
+        with self._lock:
+            estado = self._estado()
+            # Meio aberto: uma unica chamada de sondagem decide se o circuito fecha
+            if estado == self.MEIO_ABERTO and not self._sondagem_em_andamento:
+                self._sondagem_em_andamento = True
+                return True
+            if estado != self.FECHADO:
+                restante = max(self.segundos_aberto - (self._relogio() - self._aberto_desde), 0)
+                raise CircuitoAberto(f"Provedor de IA indisponivel; novas tentativas em {restante:.0f}s")
+            return False
+
+    def liberar_sondagem(self):
+        # Sondagem encerrada sem veredito sobre o provedor (erro do cliente, excecao inesperada):
+        # o circuito segue meio aberto e a proxima chamada sonda de novo
+        with self._lock:
+            self._sondagem_em_andamento = False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas_consecutivas = 0
+            self._aberto_desde = None
+            self._sondagem_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas_consecutivas += 1
+            if self._sondagem_em_andamento or self._falhas_consecutivas >= self.falhas_para_abrir:
+                self._aberto_desde = self._relogio()
+            self._sondagem_em_andamento = False
+
+
+class HistogramaLatencia:
+    def __init__(self, faixas: tuple = FAIXAS_LATENCIA):
+        self.faixas = tuple(faixas)
+        self._lock = threading.Lock()
+        self._contagens = [0] * (len(self.faixas) + 1)
+        self._soma = 0.0
+
+    def registrar(self, segundos: float):
+        with self._lock:
+            self._contagens[bisect.bisect_left(self.faixas, segundos)] += 1
+            self._soma += segundos
+
+    def _percentil(self, contagens: list, total: int, fracao: float):
+        # Estimado pelo limite superior da faixa onde o percentil cai
+        alvo = fracao * total
+        acumulado = 0
+        for indice, contagem in enumerate(contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return self.faixas[indice] if indice < len(self.faixas) else float("inf")
+        return None
+
+    def resumo(self) -> dict:
+        with self._lock:
+            contagens = list(self._contagens)
+            soma = self._soma
+
+        total = sum(contagens)
+        rotulos = [f"<= {f}s" for f in self.faixas] + [f"> {self.faixas[-1]}s"]
+        return {
+            "total": total,
+            "media_segundos": soma / total if total else None,
+            "p50_segundos": self._percentil(contagens, total, 0.5) if total else None,
+            "p95_segundos": self._percentil(contagens, total, 0.95) if total else None,
+            "faixas": dict(zip(rotulos, contagens)),
+        }
+
+
+class ClienteLLM:
+    # Um unico pool HTTP compartilhado por todas as chaves e sessoes do processo;
+    # as retentativas sao feitas aqui (max_retries=0 no SDK) para alimentar o disjuntor
+    def __init__(
+        self,
+        url_base: str = URL_BASE_LLM,
+        tempo_limite: float = TEMPO_LIMITE_SEGUNDOS,
+        tempo_limite_conexao: float = TEMPO_LIMITE_CONEXAO_SEGUNDOS,
+        max_tentativas: int = MAX_TENTATIVAS,
+        espera_base: float = ESPERA_BASE_SEGUNDOS,
+        espera_maxima: float = ESPERA_MAXIMA_SEGUNDOS,
+        disjuntor: DisjuntorCircuito = None,
+    ):
+        self.url_base = url_base
+        self.tempo_limite = openai.Timeout(tempo_limite, connect=tempo_limite_conexao)
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = disjuntor or DisjuntorCircuito()
+        self.latencias = HistogramaLatencia()
+        self._http = openai.DefaultHttpxClient(timeout=self.tempo_limite)
+        self._clientes = {}
+        self._lock = threading.Lock()
+
+    def _cliente(self, api_key: str) -> OpenAI:
+        with self._lock:
+            cliente = self._clientes.get(api_key)
+            if cliente is None:
+                cliente = OpenAI(
+                    base_url=self.url_base,
+                    api_key=api_key,
+                    timeout=self.tempo_limite,
+                    max_retries=0,
+                    http_client=self._http
+                )
+                self._clientes[api_key] = cliente
+        return cliente
+
+    def _espera(self, tentativa: int, erro) -> float:
+        resposta = getattr(erro, "response", None)
+        retry_after = resposta.headers.get("retry-after") if resposta is not None else None
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), self.espera_maxima)
+        except ValueError:
+            pass
+        # Backoff exponencial com jitter para nao sincronizar as sessoes
+        return random.uniform(0, min(self.espera_base * 2 ** tentativa, self.espera_maxima))
+
+    def criar_completion(self, api_key: str, **parametros):
+        cliente = self._cliente(api_key)
+        ultimo_erro = None
+
+        for tentativa in range(self.max_tentativas):
+            sondagem = self.disjuntor.permitir()
+            inicio = time.perf_counter()
+            try:
+                resposta = cliente.chat.completions.create(**parametros)
+            except ERROS_TRANSITORIOS as e:
+                self.latencias.registrar(time.perf_counter() - inicio)
+                self.disjuntor.registrar_falha()
+                ultimo_erro = e
+                if tentativa < self.max_tentativas - 1:
+                    time.sleep(self._espera(tentativa, e))
+                continue
+            except openai.APIStatusError:
+                # Erros do cliente (401, 400) nao indicam degradacao do provedor, nem recuperacao
+                self.latencias.registrar(time.perf_counter() - inicio)
+                raise
+            else:
+                # Em streaming, a latencia medida e a ate o inicio da resposta
+                self.latencias.registrar(time.perf_counter() - inicio)
+                self.disjuntor.registrar_sucesso()
+                return resposta
+            finally:
+                if sondagem:
+                    self.disjuntor.liberar_sondagem()
+
+        raise ProvedorIndisponivel(f"Provedor de IA falhou apos {self.max_tentativas} tentativas: {ultimo_erro}") from ultimo_erro
+
+    def estatisticas(self) -> dict:
+        return {"circuito": self.disjuntor.estado, "latencia": self.latencias.resumo()}
+
+    def fechar(self):
+        self._http.close()
+
+
+_cliente_llm = None
+_lock_cliente = threading.Lock()
+
+def obter_cliente_llm() -> ClienteLLM:
+    global _cliente_llm
+    with _lock_cliente:
+        if _cliente_llm is None:
+            _cliente_llm = ClienteLLM()
+    return _cliente_llm
@@ -0,0 +1,145 @@
+import itertools
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+TEMPO_ESPERA_BLOQUEIO_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+CACHE_PAGINAS_KB = int(os.getenv("DB_CACHE_SIZE_KB", 64 * 1024))
+MMAP_BYTES = int(os.getenv("DB_MMAP_SIZE_BYTES", 256 * 1024 * 1024))
+
+_conexoes_thread = threading.local()
+_numeracao_pontos = itertools.count()
+
+
+class ConexaoReutilizavel(sqlite3.Connection):
+    # Conexao compartilhada pelos servicos da thread. Dentro de um emprestimo aninhado
+    # (o chamador tem uma transacao aberta) commit() e rollback() valem so para o trabalho
+    # do emprestimo, delimitado por um SAVEPOINT
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pontos_salvamento = []
+        self._pool = None
+
+    def commit(self):
+        if self._pontos_salvamento:
+            # O trabalho passa a fazer parte da transacao do chamador
+            ponto = self._pontos_salvamento[-1]
+            self.execute(f"RELEASE {ponto}")
+            self.execute(f"SAVEPOINT {ponto}")
+        else:
+            super().commit()
+
+    def rollback(self):
+        if self._pontos_salvamento:
+            self.execute(f"ROLLBACK TO {self._pontos_salvamento[-1]}")
+        else:
+            super().rollback()
+
+    def close(self):
+        # Fecha de fato; o proximo emprestimo na thread abre outra conexao
+        if self._pool is not None:
+            conexoes, chave = self._pool
+            if conexoes.get(chave) is self:
+                del conexoes[chave]
+            self._pool = None
+        super().close()
+
+
+class _ConexoesDaThread:
+    # Guardado no threading.local: quando a thread termina ele e coletado e as conexoes fecham
+    def __init__(self):
+        # O finalizador guarda so o dicionario; nada ali aponta de volta para este objeto
+        self.conexoes = {}
+        weakref.finalize(self, _encerrar, self.conexoes)
+
+
+def _encerrar(conexoes: dict):
+    for conn in list(conexoes.values()):
+        conn.close()
+
+
+def _configurar(conn: sqlite3.Connection, somente_leitura: bool):
+    conn.execute(f"PRAGMA busy_timeout = {TEMPO_ESPERA_BLOQUEIO_MS}")
+    if not somente_leitura:
+        # WAL fica gravado no arquivo: leitores nao bloqueiam o escritor e vice-versa
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_PAGINAS_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def _conexao_da_thread(db_path, somente_leitura: bool) -> ConexaoReutilizavel:
+    # Uma conexao por thread, banco e modo; reaproveitada entre emprestimos
+    caminho = Path(db_path).resolve()
+    chave = (str(caminho), somente_leitura)
+    registro = getattr(_conexoes_thread, "registro", None)
+    if registro is None:
+        registro = _conexoes_thread.registro = _ConexoesDaThread()
+
+    conn = registro.conexoes.get(chave)
+    if conn is not None:
+        return conn
+
+    destino, uri = (f"{caminho.as_uri()}?mode=ro", True) if somente_leitura else (str(caminho), False)
+    # check_same_thread=False apenas para o fechamento no fim da thread, que pode rodar em outra;
+    # enquanto a thread vive, a conexao so e entregue a ela
+    conn = sqlite3.connect(
+        destino,
+        uri=uri,
+        timeout=TEMPO_ESPERA_BLOQUEIO_MS / 1000,
+        factory=ConexaoReutilizavel,
+        check_same_thread=False
+    )
+    try:
+        _configurar(conn, somente_leitura)
+    except Exception:
+        conn.close()
+        raise
+
+    conn._pool = (registro.conexoes, chave)
+    registro.conexoes[chave] = conn
+    return conn
+
+
+@contextmanager
+def emprestar_conexao(db_path=DB_PATH, somente_leitura: bool = False):
+    # Empresta a conexao da thread: ao sair confirma o trabalho do bloco, ou o desfaz se
+    # houver excecao. Se o chamador ja tem uma transacao aberta na mesma conexao, o bloco
+    # roda dentro de um SAVEPOINT e nao confirma nem descarta o que e do chamador
+    conn = _conexao_da_thread(db_path, somente_leitura)
+    row_factory = conn.row_factory
+    ponto = None
+    if conn.in_transaction:
+        ponto = f"emprestimo_{next(_numeracao_pontos)}"
+        conn.execute(f"SAVEPOINT {ponto}")
+        conn._pontos_salvamento.append(ponto)
+
+    try:
+        yield conn
+    except BaseException:
+        if ponto is None:
+            conn.rollback()
+        else:
+            conn.execute(f"ROLLBACK TO {ponto}")
+        raise
+    else:
+        if ponto is None:
+            conn.commit()
+    finally:
+        if ponto is not None:
+            conn._pontos_salvamento.pop()
+            conn.execute(f"RELEASE {ponto}")
+        conn.row_factory = row_factory
+
+
+def fechar_conexoes():
+    # Encerra as conexoes da thread atual (fim de uma thread de trabalho ou dos testes)
+    registro = getattr(_conexoes_thread, "registro", None)
+    if registro is not None:
+        _encerrar(registro.conexoes)
@@ -0,0 +1,337 @@
+import os
+import re
+import sqlite3
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from app.services.conexao_db import emprestar_conexao
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+ORCAMENTO_TOKENS = int(os.getenv("PROMPT_ORCAMENTO_TOKENS", 2500))
+AMOSTRAS_POR_COLUNA = 5
+# Sem tokenizador instalado, ~4 caracteres por token e a media para texto e codigo
+CARACTERES_POR_TOKEN = 4
+
+PADRAO_DATA_ESPERADO = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+CABECALHO = (
+    "Voce e um Engenheiro de Dados Senior especialista em Pandas.\n"
+    "Sua tarefa e gerar um script Python para corrigir um DataFrame chamado `df`."
+)
+
+FUNCOES_AUXILIARES = """FUNCOES AUXILIARES JA DISPONIVEIS (nao importe nem reimplemente; sao vetorizadas e mais rapidas):
+- parse_brl(serie) -> Series float: converte 'R$ 1.234,56', '1.234,56' e '1234.56'
+- normalize_dates(serie, formato=None) -> Series de texto 'YYYY-MM-DD' (None se invalida); formato ex: 'DD/MM/YYYY'
+- map_enum(serie, permitidos, mapeamento=None, default=None) -> Series com valores da lista permitida
+- coalesce_columns(df, destino, origens) -> DataFrame com 'destino' preenchido pelas origens, que sao removidas"""
+
+_codificador = None
+
+
+def contar_tokens(texto: str) -> int:
+    global _codificador
+    if not texto:
+        return 0
+    if tiktoken is not None:
+        if _codificador is None:
+            _codificador = tiktoken.get_encoding("cl100k_base")
+        return len(_codificador.encode(texto))
+    return -(-len(texto) // CARACTERES_POR_TOKEN)
+
+
+# =============================================================================
+# COLUNAS ENVOLVIDAS NOS ERROS
+# =============================================================================
+
+def _coluna_no_df(df: pd.DataFrame, destino: str, template: dict, mapeamento: dict):
+    if destino in df.columns:
+        return destino
+    for origem, dest in mapeamento.items():
+        if dest == destino and origem in df.columns:
+            return origem
+    for alias in template["colunas"].get(destino, {}).get("aliases", []):
+        if alias in df.columns:
+            return alias
+    return None
+
+
+def identificar_colunas_envolvidas(df: pd.DataFrame, detalhes: list, template: dict) -> dict:
+    # Retorna {coluna do df: tipo de problema}; colunas apenas renomeadas nao precisam de amostras
+    mapeamento = {}
+    for erro in detalhes:
+        if erro.get("tipo") == "nomes_colunas":
+            mapeamento.update(erro.get("mapeamento", {}))
+
+    envolvidas = {origem: "nome" for origem in mapeamento if origem in df.columns}
+
+    for erro in detalhes:
+        tipo = erro.get("tipo")
+
+        if tipo == "formato_data":
+            coluna = _coluna_no_df(df, "data_transacao", template, mapeamento)
+            if coluna:
+                envolvidas[coluna] = "data"
+
+        elif tipo == "formato_valor":
+            coluna = _coluna_no_df(df, "valor", template, mapeamento)
+            if coluna:
+                envolvidas[coluna] = "valor"
+
+        elif tipo == "valores_invalidos":
+            coluna = erro.get("coluna_origem") or _coluna_no_df(df, erro.get("coluna"), template, mapeamento)
+            if coluna in df.columns:
+                envolvidas[coluna] = "enum"
+
+        elif tipo == "colunas_duplicadas":
+            for destino, origens in erro.get("conflitos", {}).items():
+                for coluna in [destino, *origens]:
+                    if coluna in df.columns:
+                        envolvidas[coluna] = "conflito"
+
+    return envolvidas
+
+
+def _mascara_problematica(serie: pd.Series, problema: str) -> pd.Series:
+    texto = serie.astype(str).str.strip()
+    if problema == "data":
+        return ~texto.str.match(PADRAO_DATA_ESPERADO)
+    if problema == "valor":
+        return pd.to_numeric(texto, errors="coerce").isna()
+    return pd.Series(True, index=serie.index)
+
+
+def selecionar_amostras(serie: pd.Series, problema: str, limite: int = AMOSTRAS_POR_COLUNA, erro: dict = None) -> list:
+    # Valores distintos que exibem o problema vem primeiro; um valor ja correto,
+    # quando existe, mostra ao modelo o contraste
+    preenchida = serie.dropna()
+    if preenchida.empty or limite <= 0:
+        return []
+
+    if problema == "enum" and erro:
+        problematicos = list(dict.fromkeys(
+            list(erro.get("mapeamento_sugerido", {}).keys()) + list(erro.get("valores_invalidos", []))
+        ))
+        corretos = [v for v in preenchida.astype(str).unique() if v in set(erro.get("valores_permitidos", []))]
+    else:
+        mascara = _mascara_problematica(preenchida, problema)
+        problematicos = preenchida[mascara].astype(str).value_counts().index.tolist()
+        corretos = preenchida[~mascara].astype(str).value_counts().index.tolist()
+
+    vagas_problematicos = limite - 1 if corretos and limite > 1 else limite
+    amostras = problematicos[:vagas_problematicos]
+    amostras += corretos[:limite - len(amostras)]
+    return amostras
+
+
+# =============================================================================
+# SECOES DO PROMPT
+# =============================================================================
+
+def _secao_contexto(df: pd.DataFrame, envolvidas: dict, listar_demais: bool) -> str:
+    linhas = ["CONTEXTO DOS DADOS:", "- Colunas envolvidas nos erros (nome: dtype):"]
+    linhas += [f"  {coluna}: {df[coluna].dtype}" for coluna in envolvidas]
+
+    demais = [c for c in df.columns if c not in envolvidas]
+    if demais and listar_demais:
+        linhas.append(f"- Demais colunas (sem erros): {demais}")
+    elif demais:
+        linhas.append(f"- Mais {len(demais)} colunas sem erros (nao precisam de correcao)")
+    return "\n".join(linhas)
+
+
+def _secao_amostras(df: pd.DataFrame, envolvidas: dict, detalhes: list, limite: int, tamanho_maximo_valor: int = None) -> str:
+    erros_enum = {e.get("coluna_origem"): e for e in detalhes if e.get("tipo") == "valores_invalidos"}
+
+    linhas = []
+    for coluna, problema in envolvidas.items():
+        if problema == "nome":
+            continue
+        amostras = selecionar_amostras(df[coluna], problema, limite, erros_enum.get(coluna))
+        if tamanho_maximo_valor:
+            amostras = [a[:tamanho_maximo_valor] for a in amostras]
+        nulos = int(df[coluna].isna().sum())
+        sufixo_nulos = f", {nulos} nulos" if nulos else ""
+        linhas.append(f"- '{coluna}' ({problema}{sufixo_nulos}): {amostras}")
+
+    if not linhas:
+        return ""
+    return "AMOSTRAS POR COLUNA COM ERRO (valores distintos, problematicos primeiro):\n" + "\n".join(linhas)
+
+
+def _compactar_codigo(texto: str) -> str:
+    # Linhas em branco, comentarios e indentacao do texto do prompt nao ajudam o modelo
+    linhas = []
+    for linha in texto.splitlines():
+        conteudo = linha.strip()
+        if not conteudo or conteudo.startswith("#"):
+            continue
+        recuo = len(linha) - len(linha.lstrip())
+        linhas.append((recuo, linha.rstrip()))
+
+    if not linhas:
+        return ""
+    recuo_minimo = min(r for r, _ in linhas)
+    return "\n".join(linha[recuo_minimo:] for _, linha in linhas)
+
+
+def resumir_historico(historico: str, limite_tokens: int = None) -> str:
+    resumo = _compactar_codigo(historico or "")
+    if limite_tokens is None or contar_tokens(resumo) <= limite_tokens:
+        return resumo
+
+    # Mantem o inicio (erro e comeco do script) e o fim do script, omitindo o meio
+    linhas = resumo.splitlines()
+    inicio, fim = [], []
+    while len(inicio) + len(fim) < len(linhas):
+        candidata = linhas[len(inicio)] if len(inicio) <= len(fim) else linhas[-(len(fim) + 1)]
+        parcial = inicio + [candidata] + ["..."] + fim
+        if contar_tokens("\n".join(parcial)) > limite_tokens:
+            break
+        if len(inicio) <= len(fim):
+            inicio.append(candidata)
+        else:
+            fim.insert(0, candidata)
+
+    omitidas = len(linhas) - len(inicio) - len(fim)
+    return "\n".join(inicio + [f"... ({omitidas} linhas omitidas) ..."] + fim)
+
+
+def _secao_regras(template: dict) -> str:
+    return f"""REGRAS GERAIS:
+1. Apenas remova colunas extras que nao estejam no template {list(template["colunas"].keys())} APOS realizar todas as correcoes de dados (merges, renames, etc), no final do script.
+2. O codigo deve assumir que 'df', 'pd', 'np' e as funcoes auxiliares acima ja existem.
+3. NAO use blocos markdown. Retorne apenas o codigo.
+4. Se precisar de regex, importe 're'. Se precisar de numpy, importe 'numpy as np'.
+5. GARANTIA FINAL: Apos todas as transformacoes, execute df = df.loc[:, ~df.columns.duplicated()] para garantir que nao existam colunas com nomes duplicados.
+6. A saida final deve ser a alteracao do dataframe `df`.
+
+Gere apenas o codigo Python:"""
+
+
+# Cada nivel corta mais do que o anterior; as tarefas e as regras nunca sao cortadas
+NIVEIS_COMPACTACAO = [
+    {"amostras": AMOSTRAS_POR_COLUNA, "listar_demais": True, "tamanho_maximo_valor": None},
+    {"amostras": 3, "listar_demais": False, "tamanho_maximo_valor": None},
+    {"amostras": 2, "listar_demais": False, "tamanho_maximo_valor": 40},
+]
+
+
+def construir_prompt(df: pd.DataFrame, resultado_validacao: dict, template: dict, instrucoes_especificas: str, historico_tentativas: str = "", orcamento: int = ORCAMENTO_TOKENS) -> dict:
+    detalhes = resultado_validacao.get("detalhes", [])
+    envolvidas = identificar_colunas_envolvidas(df, detalhes, template)
+
+    fixas = {
+        "cabecalho": CABECALHO,
+        "tarefas": "LISTA DE TAREFAS OBRIGATORIAS (Baseada nos erros detectados):\n" + instrucoes_especificas,
+        "funcoes": FUNCOES_AUXILIARES,
+        "regras": _secao_regras(template),
+    }
+    tokens_fixos = sum(contar_tokens(texto) for texto in fixas.values())
+
+    for nivel, config in enumerate(NIVEIS_COMPACTACAO):
+        secoes = {
+            "cabecalho": fixas["cabecalho"],
+            "contexto": _secao_contexto(df, envolvidas, config["listar_demais"]),
+            "amostras": _secao_amostras(df, envolvidas, detalhes, config["amostras"], config["tamanho_maximo_valor"]),
+            "historico": resumir_historico(historico_tentativas),
+            "tarefas": fixas["tarefas"],
+            "funcoes": fixas["funcoes"],
+            "regras": fixas["regras"],
+        }
+        tokens = {nome: contar_tokens(texto) for nome, texto in secoes.items()}
+        if sum(tokens.values()) <= orcamento:
+            break
+
+    # O historico fica com o que sobrar do orcamento no nivel mais compacto
+    if sum(tokens.values()) > orcamento and secoes["historico"]:
+        restante = orcamento - tokens_fixos - tokens["contexto"] - tokens["amostras"]
+        secoes["historico"] = resumir_historico(historico_tentativas, max(restante, 0))
+        tokens["historico"] = contar_tokens(secoes["historico"])
+
+    prompt = "\n\n".join(texto for texto in secoes.values() if texto)
+    return {
+        "prompt": prompt,
+        "secoes": tokens,
+        "total_tokens": contar_tokens(prompt),
+        "orcamento": orcamento,
+        "nivel_compactacao": nivel,
+        "colunas_envolvidas": list(envolvidas),
+    }
+
+
+# =============================================================================
+# REGISTRO DE TOKENS POR SECAO
+# =============================================================================
+
+def init_prompt_tokens_table(db_path=DB_PATH):
+    try:
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS prompt_tokens (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prompt_id TEXT NOT NULL,
+                    hash_estrutura TEXT,
+                    secao TEXT NOT NULL,
+                    tokens_estimados INTEGER NOT NULL,
+                    tokens_prompt_real INTEGER,
+                    orcamento INTEGER,
+                    nivel_compactacao INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompt_tokens_secao ON prompt_tokens(secao)")
+
+            conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao inicializar tabela de tokens do prompt: {e}")
+
+
+def registrar_tokens_prompt(prompt_construido: dict, hash_estrutura: str = None, tokens_prompt_real: int = None, db_path=DB_PATH) -> str:
+    prompt_id = uuid.uuid4().hex
+    try:
+        with emprestar_conexao(db_path) as conn:
+            conn.executemany(
+                """
+                INSERT INTO prompt_tokens
+                (prompt_id, hash_estrutura, secao, tokens_estimados, tokens_prompt_real, orcamento, nivel_compactacao)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        prompt_id, hash_estrutura, secao, tokens, tokens_prompt_real,
+                        prompt_construido["orcamento"], prompt_construido["nivel_compactacao"]
+                    )
+                    for secao, tokens in prompt_construido["secoes"].items()
+                ]
+            )
+            conn.commit()
+    except sqlite3.Error:
+        # O registro serve so para ajuste do orcamento; nunca bloqueia a geracao
+        return None
+    return prompt_id
+
+
+def carregar_uso_tokens_por_secao(db_path=DB_PATH) -> pd.DataFrame:
+    with emprestar_conexao(db_path, somente_leitura=True) as conn:
+        return pd.read_sql_query(
+            """
+            SELECT secao,
+                   COUNT(*) AS prompts,
+                   AVG(tokens_estimados) AS media_tokens,
+                   MAX(tokens_estimados) AS max_tokens
+            FROM prompt_tokens
+            GROUP BY secao
+            ORDER BY media_tokens DESC
+            """,
+            conn
+        )
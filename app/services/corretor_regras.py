@@ -0,0 +1,108 @@
+import re
+import pandas as pd
+
+from app.services.helpers_correcao import parse_brl, normalize_dates, map_enum, coalesce_columns
+
+TIPOS_SUPORTADOS = {
+    "colunas_faltando",
+    "nomes_colunas",
+    "formato_data",
+    "formato_valor",
+    "colunas_duplicadas",
+    "valores_invalidos",
+}
+
+
+def erros_suportados(detalhes_erros: list) -> bool:
+    # Basta um erro coberto para o motor de regras atuar; o restante segue para a IA
+    return any(e.get("tipo") in TIPOS_SUPORTADOS for e in detalhes_erros)
+
+
+def todos_erros_suportados(detalhes_erros: list) -> bool:
+    return bool(detalhes_erros) and all(e.get("tipo") in TIPOS_SUPORTADOS for e in detalhes_erros)
+
+
+def aplicar_correcoes_nativas(df: pd.DataFrame, detalhes_erros: list, template: dict):
+    df = df.copy()
+    acoes = []
+    pendentes = [e for e in detalhes_erros if e.get("tipo") not in TIPOS_SUPORTADOS]
+    por_tipo = {}
+    for erro in detalhes_erros:
+        por_tipo.setdefault(erro.get("tipo"), []).append(erro)
+
+    colunas_template = template.get("colunas", {})
+
+    destinos_conflitantes = set()
+    for erro in por_tipo.get("colunas_duplicadas", []):
+        for destino, origens in erro.get("conflitos", {}).items():
+            df = coalesce_columns(df, destino, origens)
+            destinos_conflitantes.add(destino)
+            acoes.append(f"Coalesce {origens} -> '{destino}'")
+
+    for erro in por_tipo.get("nomes_colunas", []):
+        mapeamento = {
+            orig: dest for orig, dest in erro.get("mapeamento", {}).items()
+            if dest not in destinos_conflitantes and orig in df.columns
+        }
+        if mapeamento:
+            df = df.drop(columns=[d for d in mapeamento.values() if d in df.columns and d not in mapeamento])
+            df = df.rename(columns=mapeamento)
+            acoes.append(f"Renomear colunas {mapeamento}")
+
+    for erro in por_tipo.get("colunas_faltando", []):
+        for coluna in erro.get("colunas", []):
+            if coluna in df.columns:
+                continue
+            default = colunas_template.get(coluna, {}).get("validacao", {}).get("default")
+            df[coluna] = default
+            acoes.append(f"Criar coluna '{coluna}' com valor padrao {default!r}")
+
+    if por_tipo.get("formato_valor") and "valor" in df.columns:
+        df["valor"] = parse_brl(df["valor"])
+        acoes.append("Converter 'valor' de formato monetario brasileiro para decimal")
+
+    for erro in por_tipo.get("formato_data", []):
+        if "data_transacao" in df.columns:
+            df["data_transacao"] = normalize_dates(df["data_transacao"], erro.get("formato_detectado"))
+            acoes.append("Converter 'data_transacao' para YYYY-MM-DD")
+
+    for erro in por_tipo.get("valores_invalidos", []):
+        coluna = erro.get("coluna")
+        if coluna not in df.columns:
+            continue
+        validacao = colunas_template.get(coluna, {}).get("validacao", {})
+        mapeamento = {**validacao.get("mapeamento", {}), **erro.get("mapeamento_sugerido", {})}
+        df[coluna] = map_enum(
+            df[coluna],
+            erro.get("valores_permitidos", validacao.get("valores_permitidos", [])),
+            mapeamento,
+            erro.get("default")
+        )
+        acoes.append(f"Padronizar valores de '{coluna}'")
+
+    df = df.loc[:, ~df.columns.duplicated()]
+    extras = [c for c in df.columns if c not in colunas_template]
+    if extras:
+        df = df.drop(columns=extras)
+        acoes.append(f"Remover colunas extras {extras}")
+
+    return df, acoes, pendentes
+
+
+def separar_erros_para_ia(df: pd.DataFrame, validacao: dict, template: dict):
+    # Aplica as regras ao que elas cobrem e devolve (df corrigido, validacao so com os pendentes, acoes).
+    # Deterministico: a geracao antecipada e a pagina de correcao chegam a mesma base e ao mesmo hash
+    if not erros_suportados(validacao.get("detalhes", [])):
+        return df, validacao, []
+
+    df_regras, acoes, pendentes = aplicar_correcoes_nativas(df, validacao["detalhes"], template)
+    validacao_pendente = {**validacao, "valido": not pendentes, "total_erros": len(pendentes), "detalhes": pendentes}
+    return df_regras, validacao_pendente, acoes
+
+
+def descrever_correcoes(acoes: list) -> str:
+    linhas = ["# Correcao aplicada pelo motor de regras (sem uso de IA)"]
+    for i, acao in enumerate(acoes):
+        acao_linha_unica = re.sub(r"[\r\n]+", " ", acao)
+        linhas.append(f"# {i + 1}. {acao_linha_unica}")
+    return "\n".join(linhas)
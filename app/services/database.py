@@ -1,5 +1,5 @@
-import sqlite3
 from pathlib import Path
+from app.services.conexao_db import emprestar_conexao
 
 
 def init_database():
@@ -11,10 +11,8 @@ def init_database():
     
     db_path.parent.mkdir(parents=True, exist_ok=True)
     
-    conn = sqlite3.connect(db_path)
-    
-    with open(schema_path, "r", encoding="utf-8") as f:
-        conn.executescript(f.read())
-    
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with emprestar_conexao(db_path) as conn:
+        with open(schema_path, "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        
+        conn.commit()
\ No newline at end of file
@@ -0,0 +1,324 @@
+import argparse
+import ast
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from src.validation import detectar_encoding, detectar_delimitador
+from app.services.executor_scripts import obter_executor
+from app.services.script_cache import gerar_hash_estrutura, buscar_script_cache
+
+TAMANHO_BLOCO = 50_000
+LINHAS_AMOSTRA = 2_000
+
+# Operacoes cujo resultado depende de outras linhas alem da propria
+METODOS_NAO_LOCAIS = {
+    "groupby", "sort_values", "sort_index", "shift", "diff", "pct_change",
+    "cumsum", "cumprod", "cummax", "cummin", "rolling", "expanding", "ewm",
+    "rank", "drop_duplicates", "duplicated", "ffill", "bfill", "pad", "backfill",
+    "interpolate", "merge", "join", "pivot", "pivot_table", "melt", "stack", "unstack",
+    "agg", "aggregate", "transform", "value_counts", "nunique", "unique", "mode",
+    "mean", "median", "sum", "min", "max", "std", "var", "count", "quantile",
+    "idxmin", "idxmax", "head", "tail", "sample", "nlargest", "nsmallest",
+}
+FUNCOES_NAO_LOCAIS = {"len", "sorted", "enumerate"}
+ATRIBUTOS_NAO_LOCAIS = {"shape", "size"}
+# Acessores cujos metodos operam valor a valor (ex: .str.count, .str.len)
+ACESSORES_POR_VALOR = {"str", "dt", "columns"}
+
+
+def verificar_localidade_estatica(codigo: str) -> tuple:
+    arvore = ast.parse(codigo)
+    motivos = []
+
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Attribute):
+            # df.columns.duplicated() atua sobre os nomes das colunas e ", ".join sobre uma constante
+            por_valor = (
+                (isinstance(no.value, ast.Attribute) and no.value.attr in ACESSORES_POR_VALOR)
+                or isinstance(no.value, ast.Constant)
+            )
+            if no.attr in METODOS_NAO_LOCAIS and not por_valor:
+                motivos.append(f"Linha {no.lineno}: '.{no.attr}' depende de outras linhas")
+            elif no.attr in ATRIBUTOS_NAO_LOCAIS:
+                motivos.append(f"Linha {no.lineno}: '.{no.attr}' depende da posicao ou do total de linhas")
+
+        elif isinstance(no, ast.Call):
+            if isinstance(no.func, ast.Name) and no.func.id in FUNCOES_NAO_LOCAIS:
+                motivos.append(f"Linha {no.lineno}: '{no.func.id}()' depende do total de linhas")
+            if any(k.arg == "method" for k in no.keywords):
+                motivos.append(f"Linha {no.lineno}: parametro 'method' propaga valores entre linhas")
+
+    return not motivos, motivos
+
+
+def _normalizar_para_comparacao(df: pd.DataFrame) -> pd.DataFrame:
+    # Blocos com colunas todas nulas mudam o dtype inferido; compara pelo conteudo
+    df = df.reset_index(drop=True)
+    return df.astype(object).where(df.notna(), None)
+
+
+def verificar_localidade_empirica(codigo: str, df_amostra: pd.DataFrame, executor=None) -> tuple:
+    if df_amostra.empty:
+        return True, []
+
+    executor = executor or obter_executor()
+    referencia = executor.executar(codigo, df_amostra).result()
+
+    # Blocos de tamanhos diferentes, incluindo um bloco de uma unica linha
+    cortes = sorted({0, 1, max(len(df_amostra) // 3, 1), max(2 * len(df_amostra) // 3, 1), len(df_amostra)})
+    futuros = [
+        executor.executar(codigo, df_amostra.iloc[inicio:fim])
+        for inicio, fim in zip(cortes, cortes[1:]) if fim > inicio
+    ]
+    em_blocos = pd.concat([f.result() for f in futuros])
+
+    try:
+        pd.testing.assert_frame_equal(
+            _normalizar_para_comparacao(referencia),
+            _normalizar_para_comparacao(em_blocos),
+            check_dtype=False
+        )
+    except AssertionError as e:
+        return False, [f"Resultado em blocos difere da execucao completa: {str(e).splitlines()[0]}"]
+
+    return True, []
+
+
+def script_e_local(codigo: str, df_amostra: pd.DataFrame, executor=None) -> tuple:
+    local, motivos = verificar_localidade_estatica(codigo)
+    if not local:
+        return False, motivos
+    return verificar_localidade_empirica(codigo, df_amostra, executor)
+
+
+def ler_csv_em_blocos(caminho_csv, tamanho_bloco: int = TAMANHO_BLOCO):
+    encoding = detectar_encoding(caminho_csv)
+    delimitador = detectar_delimitador(caminho_csv, encoding)
+    return pd.read_csv(caminho_csv, encoding=encoding, sep=delimitador, chunksize=tamanho_bloco)
+
+
+def localizar_script_para_arquivo(caminho_csv, template: dict, linhas_amostra: int = LINHAS_AMOSTRA):
+    # A estrutura (colunas e erros) e inferida pelas primeiras linhas, sem carregar o arquivo inteiro
+    from app.utils.data_handler import revalidar_dataframe
+
+    df_amostra = next(iter(ler_csv_em_blocos(caminho_csv, linhas_amostra)))
+    validacao = revalidar_dataframe(df_amostra, template)
+    hash_estrutura = gerar_hash_estrutura(list(df_amostra.columns), validacao["detalhes"])
+
+    return df_amostra, validacao, hash_estrutura, buscar_script_cache(hash_estrutura)
+
+
+# =============================================================================
+# DESTINOS DOS BLOCOS CORRIGIDOS
+# =============================================================================
+
+class DestinoParquet:
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._escritor = None
+        self._schema = None
+
+    def __call__(self, bloco: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+
+        if self._escritor is None:
+            # Colunas sem nenhum valor no primeiro bloco sao gravadas como texto
+            campos = [pa.field(c.name, pa.string()) if pa.types.is_null(c.type) else c for c in tabela.schema]
+            self._schema = pa.schema(campos)
+            self._escritor = pq.ParquetWriter(self.caminho, self._schema)
+
+        self._escritor.write_table(tabela.select(self._schema.names).cast(self._schema))
+
+    def fechar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+
+
+class DestinoInsercao:
+    # lote_id marca as linhas para que a importacao possa ser desfeita; com hash_arquivo cada
+    # bloco tem checkpoints proprios ("<hash>:<bloco>") e uma execucao interrompida retoma de onde parou
+    def __init__(self, db_path=None, lote_id: int = None, hash_arquivo: str = None):
+        self.db_path = db_path
+        self.lote_id = lote_id
+        self.hash_arquivo = hash_arquivo
+        self._hashes_blocos = []
+        self.resultado = {
+            "sucesso": True,
+            "registros_inseridos": 0,
+            "registros_duplicados": 0,
+            "total_registros": 0,
+            "erros": []
+        }
+
+    def __call__(self, bloco: pd.DataFrame):
+        from app.services.insert_data import DB_PATH, inserir_transacoes
+
+        hash_bloco = None
+        if self.hash_arquivo:
+            hash_bloco = f"{self.hash_arquivo}:{len(self._hashes_blocos)}"
+            self._hashes_blocos.append(hash_bloco)
+
+        # O indice dos blocos do read_csv continua de um bloco para o outro,
+        # entao a linha informada nos erros segue a numeracao do arquivo.
+        # Os checkpoints ficam ate o arquivo inteiro terminar (finalizar)
+        parcial = inserir_transacoes(
+            bloco, self.db_path or DB_PATH, hash_arquivo=hash_bloco, lote_id=self.lote_id, manter_checkpoints=True
+        )
+        self.resultado["sucesso"] = self.resultado["sucesso"] and parcial["sucesso"]
+        for chave in ("registros_inseridos", "registros_duplicados", "total_registros"):
+            self.resultado[chave] += parcial[chave]
+        self.resultado["erros"].extend(parcial["erros"])
+
+    def fechar(self):
+        pass
+
+    def finalizar(self):
+        # Arquivo inteiro gravado: um novo envio do mesmo conteudo comeca do zero
+        from app.services.insert_data import DB_PATH, descartar_checkpoints
+
+        if self.resultado["sucesso"] and self._hashes_blocos:
+            descartar_checkpoints(self._hashes_blocos, self.db_path or DB_PATH)
+
+
+def aplicar_script_em_blocos(codigo: str, caminho_csv, destino, tamanho_bloco: int = TAMANHO_BLOCO, executor=None) -> dict:
+    executor = executor or obter_executor()
+    resumo = {"blocos": 0, "linhas_entrada": 0, "linhas_saida": 0, "duracao_segundos": 0.0, "memoria_pico_bytes": 0}
+
+    def entregar(futuro, linhas_entrada):
+        corrigido, metricas = futuro.result()
+        destino(corrigido)
+        resumo["blocos"] += 1
+        resumo["linhas_entrada"] += linhas_entrada
+        resumo["linhas_saida"] += len(corrigido)
+        resumo["duracao_segundos"] += metricas["duracao_segundos"]
+        resumo["memoria_pico_bytes"] = max(resumo["memoria_pico_bytes"], metricas["memoria_pico_bytes"])
+
+    # No maximo dois blocos em memoria: o proximo e corrigido enquanto o anterior e gravado
+    pendente = None
+    try:
+        for bloco in ler_csv_em_blocos(caminho_csv, tamanho_bloco):
+            futuro = executor.executar_perfilado(codigo, bloco)
+            if pendente is not None:
+                entregar(*pendente)
+            pendente = (futuro, len(bloco))
+
+        if pendente is not None:
+            entregar(*pendente)
+    finally:
+        destino.fechar()
+
+    duracao = resumo["duracao_segundos"]
+    resumo["linhas_por_segundo"] = resumo["linhas_entrada"] / duracao if duracao > 0 else None
+    return resumo
+
+
+def _hash_execucao(caminho_csv, codigo: str, tamanho_bloco: int) -> str:
+    # Mesmo arquivo, mesmo script e mesmo corte de blocos: os checkpoints de uma execucao anterior valem
+    conteudo = hashlib.sha256(f"{codigo}|{tamanho_bloco}|".encode("utf-8"))
+    with open(caminho_csv, "rb") as f:
+        for parte in iter(lambda: f.read(1024 * 1024), b""):
+            conteudo.update(parte)
+    return conteudo.hexdigest()
+
+
+def _abrir_lote(caminho_csv, hash_arquivo: str) -> int:
+    # Registro de monitoramento da importacao, usado como lote_id das linhas gravadas
+    from app.services.conexao_db import emprestar_conexao
+    from app.services.insert_data import DB_PATH
+
+    with emprestar_conexao(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO monitoramento_processamento (arquivo_hash, arquivo_nome, status, etapa_final)
+            VALUES (?, ?, 'PROCESSANDO', 'INSERCAO_BLOCOS')
+            """,
+            (hash_arquivo, Path(caminho_csv).name)
+        )
+        conn.commit()
+        return cursor.lastrowid
+
+
+def _fechar_lote(lote_id: int, resultado: dict):
+    # Numa retomada os blocos ja gravados voltam pelos checkpoints, entao o resultado cobre o arquivo todo
+    from app.services.conexao_db import emprestar_conexao
+    from app.services.insert_data import DB_PATH
+
+    with emprestar_conexao(DB_PATH) as conn:
+        conn.execute(
+            """
+            UPDATE monitoramento_processamento
+            SET status = ?, registros_inseridos = ?, registros_duplicados = ?,
+                registros_erros = ?
+            WHERE id = ?
+            """,
+            (
+                "CONCLUIDO" if resultado["sucesso"] else "FALHA",
+                resultado["registros_inseridos"], resultado["registros_duplicados"],
+                len(resultado["erros"]), lote_id
+            )
+        )
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aplica um script de correcao do cache a um CSV grande, em blocos.")
+    parser.add_argument("arquivo", type=Path)
+    saida = parser.add_mutually_exclusive_group(required=True)
+    saida.add_argument("--parquet", type=Path, help="Grava o resultado corrigido em Parquet")
+    saida.add_argument("--inserir", action="store_true", help="Insere os blocos corrigidos no banco")
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO)
+    parser.add_argument("--lote-id", type=int, help="Retoma a insercao sob um lote (monitoramento) ja existente")
+
+    args = parser.parse_args(argv)
+
+    from app.utils.data_handler import carregar_template
+    df_amostra, validacao, hash_estrutura, script_cache = localizar_script_para_arquivo(args.arquivo, carregar_template())
+
+    if validacao["valido"]:
+        codigo = "df = df"
+    elif script_cache is None:
+        print("Nenhum script em cache para esta estrutura; corrija um arquivo de amostra pela aplicacao primeiro.")
+        return 1
+    else:
+        codigo = script_cache["script"]
+
+    local, motivos = script_e_local(codigo, df_amostra)
+    if not local:
+        print("Script nao pode ser aplicado em blocos:")
+        for motivo in motivos:
+            print(f"- {motivo}")
+        return 1
+
+    if args.parquet:
+        destino = DestinoParquet(args.parquet)
+    else:
+        hash_arquivo = _hash_execucao(args.arquivo, codigo, args.tamanho_bloco)
+        lote_id = args.lote_id or _abrir_lote(args.arquivo, hash_arquivo)
+        destino = DestinoInsercao(lote_id=lote_id, hash_arquivo=hash_arquivo)
+    resumo = aplicar_script_em_blocos(codigo, args.arquivo, destino, args.tamanho_bloco)
+
+    if script_cache is not None:
+        from app.services.perfil_scripts import registrar_execucao_script
+        metricas = {**resumo, "linhas": resumo["linhas_entrada"]}
+        registrar_execucao_script(codigo, metricas, hash_estrutura, script_cache["id"])
+
+    if isinstance(destino, DestinoInsercao):
+        destino.finalizar()
+        _fechar_lote(destino.lote_id, destino.resultado)
+        resumo["lote_id"] = destino.lote_id
+        resumo["insercao"] = {k: v for k, v in destino.resultado.items() if k != "erros"}
+        resumo["insercao"]["erros"] = len(destino.resultado["erros"])
+    print(json.dumps(resumo, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import pandas as pd
+
+from app.services.helpers_correcao import HELPERS
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+NUMERO_WORKERS = int(os.getenv("SCRIPT_WORKERS", 2))
+TEMPO_LIMITE_SEGUNDOS = float(os.getenv("SCRIPT_TEMPO_LIMITE_SEGUNDOS", 60))
+LIMITE_MEMORIA_MB = int(os.getenv("SCRIPT_LIMITE_MEMORIA_MB", 1024))
+
+_limite_memoria_worker = LIMITE_MEMORIA_MB
+
+FORMATO_ARROW = "arrow"
+FORMATO_PICKLE = "pickle"
+
+
+class ErroExecucaoScript(Exception):
+    # Erro levantado pelo script dentro do worker, transportado como texto
+    # porque excecoes arbitrarias do codigo gerado nem sempre sao serializaveis
+    def __init__(self, tipo: str, mensagem: str):
+        super().__init__(tipo, mensagem)
+        self.tipo = tipo
+        self.mensagem = mensagem
+
+    def __str__(self):
+        return f"{self.tipo}: {self.mensagem}"
+
+
+def montar_namespace_execucao(df: pd.DataFrame) -> dict:
+    return {"df": df, "pd": pd, "np": np, **HELPERS}
+
+
+# =============================================================================
+# TRANSPORTE DE DATAFRAMES POR MEMORIA COMPARTILHADA
+# =============================================================================
+
+def _serializar(df: pd.DataFrame):
+    if pa is not None:
+        try:
+            tabela = pa.Table.from_pandas(df, preserve_index=True)
+            destino = pa.BufferOutputStream()
+            with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+            return FORMATO_ARROW, destino.getvalue()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Colunas object com tipos misturados nao tem representacao Arrow
+            pass
+    return FORMATO_PICKLE, pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _publicar(df: pd.DataFrame) -> tuple:
+    formato, dados = _serializar(df)
+    tamanho = len(dados)
+    memoria = shared_memory.SharedMemory(create=True, size=max(tamanho, 1))
+    memoria.buf[:tamanho] = memoryview(dados).cast("B")
+    nome = memoria.name
+    memoria.close()
+    return formato, nome, tamanho
+
+
+def _consumir(formato: str, nome: str, tamanho: int, remover: bool = True) -> pd.DataFrame:
+    memoria = shared_memory.SharedMemory(name=nome)
+    try:
+        visao = memoria.buf[:tamanho]
+        if formato == FORMATO_ARROW:
+            # Uma unica copia de memoria desvincula os buffers Arrow do segmento (as strings
+            # do pandas continuam apontando para eles); nao ha desserializacao por linha
+            buffer = pa.py_buffer(visao).to_pybytes()
+            df = pa.ipc.open_stream(buffer).read_all().to_pandas()
+        else:
+            df = pickle.loads(visao)
+        visao.release()
+    finally:
+        memoria.close()
+        if remover:
+            memoria.unlink()
+    return df
+
+
+def _liberar(nome: str):
+    try:
+        memoria = shared_memory.SharedMemory(name=nome)
+        memoria.close()
+        memoria.unlink()
+    except FileNotFoundError:
+        pass
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+def _inicializar_worker(limite_memoria_mb: int):
+    # Os imports pesados ja aconteceram no carregamento deste modulo no processo filho
+    global _limite_memoria_worker
+    _limite_memoria_worker = limite_memoria_mb
+    try:
+        import resource
+        with open("/proc/self/status") as f:
+            uso_atual_kb = next(int(l.split()[1]) for l in f if l.startswith("VmSize:"))
+        limite = uso_atual_kb * 1024 + limite_memoria_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+    except (ImportError, OSError, StopIteration, ValueError):
+        pass
+
+
+def _memoria_residente() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _MonitorMemoria:
+    # Amostra a memoria residente do worker durante o script; o pico relativo ao
+    # inicio da execucao e a memoria que o proprio script precisou
+    INTERVALO_SEGUNDOS = 0.005
+
+    def __enter__(self):
+        self.base = _memoria_residente()
+        self.pico = self.base
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+
+    def _amostrar(self):
+        while not self._parar.wait(self.INTERVALO_SEGUNDOS):
+            self.pico = max(self.pico, _memoria_residente())
+
+    def __exit__(self, *args):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, _memoria_residente())
+
+    @property
+    def pico_bytes(self) -> int:
+        return max(self.pico - self.base, 0)
+
+
+def _executar_no_worker(codigo: str, formato: str, nome: str, tamanho: int) -> tuple:
+    df = _consumir(formato, nome, tamanho, remover=False)
+    # O bloco de entrada pertence ao processo principal; o worker so o le
+    resource_tracker.unregister(f"/{nome}", "shared_memory")
+
+    try:
+        namespace = montar_namespace_execucao(df)
+        codigo_compilado = compile(codigo, filename='<script_ia>', mode='exec')
+        with _MonitorMemoria() as monitor:
+            inicio = time.perf_counter()
+            exec(codigo_compilado, namespace)
+            duracao = time.perf_counter() - inicio
+        resultado = namespace["df"]
+        if not isinstance(resultado, pd.DataFrame):
+            raise TypeError("O script deve manter 'df' como um DataFrame")
+        saida = _publicar(resultado)
+    except MemoryError:
+        raise ErroExecucaoScript("MemoryError", f"Script excedeu o limite de {_limite_memoria_worker} MB")
+    except Exception as e:
+        raise ErroExecucaoScript(type(e).__name__, str(e))
+
+    # O bloco de saida passa a ser responsabilidade do processo principal
+    resource_tracker.unregister(f"/{saida[1]}", "shared_memory")
+
+    metricas = {
+        "linhas": len(df),
+        "duracao_segundos": duracao,
+        "linhas_por_segundo": len(df) / duracao if duracao > 0 else None,
+        "memoria_pico_bytes": monitor.pico_bytes
+    }
+    return saida, metricas
+
+
+def _laco_worker(conexao, limite_memoria_mb: int):
+    _inicializar_worker(limite_memoria_mb)
+    while True:
+        try:
+            tarefa = conexao.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            conexao.send(("ok", _executar_no_worker(*tarefa)))
+        except ErroExecucaoScript as e:
+            conexao.send(("erro", (e.tipo, e.mensagem)))
+        except Exception as e:
+            conexao.send(("erro", (type(e).__name__, str(e))))
+
+
+class _Worker:
+    # Um processo dedicado por worker, com canal proprio: um script travado
+    # derruba apenas o processo em que esta rodando
+    def __init__(self, contexto, limite_memoria_mb: int):
+        self._conexao, conexao_filho = contexto.Pipe()
+        self.processo = contexto.Process(
+            target=_laco_worker,
+            args=(conexao_filho, limite_memoria_mb),
+            name="worker-scripts",
+            daemon=True
+        )
+        self.processo.start()
+        conexao_filho.close()
+
+    def executar(self, tempo_limite: float, *tarefa) -> tuple:
+        self._conexao.send(tarefa)
+        if not self._conexao.poll(tempo_limite):
+            raise TimeoutError
+        status, valor = self._conexao.recv()
+        if status == "erro":
+            raise ErroExecucaoScript(*valor)
+        return valor
+
+    def encerrar(self):
+        self.processo.kill()
+        self.processo.join()
+        self._conexao.close()
+
+
+# =============================================================================
+# EXECUTOR
+# =============================================================================
+
+class ExecutorScripts:
+    def __init__(self, workers: int = NUMERO_WORKERS, tempo_limite: float = TEMPO_LIMITE_SEGUNDOS, limite_memoria_mb: int = LIMITE_MEMORIA_MB):
+        self.workers = workers
+        self.tempo_limite = tempo_limite
+        self.limite_memoria_mb = limite_memoria_mb
+        # spawn evita herdar o estado do Streamlit (threads, sockets) via fork
+        self._contexto = multiprocessing.get_context("spawn")
+        self._ociosos = queue.Queue()
+        self._supervisor = ThreadPoolExecutor(max_workers=max(workers * 2, 2), thread_name_prefix="supervisor-scripts")
+        for _ in range(workers):
+            self._ociosos.put(self._novo_worker())
+
+    def _novo_worker(self) -> _Worker:
+        return _Worker(self._contexto, self.limite_memoria_mb)
+
+    def _supervisionar(self, codigo: str, df: pd.DataFrame) -> tuple:
+        formato, nome, tamanho = _publicar(df)
+        worker = self._ociosos.get()
+
+        try:
+            try:
+                saida, metricas = worker.executar(self.tempo_limite, codigo, formato, nome, tamanho)
+            except TimeoutError:
+                # Somente o worker deste script e encerrado; os demais seguem com suas tarefas
+                worker.encerrar()
+                worker = self._novo_worker()
+                raise TimeoutError(f"Script excedeu o tempo limite de {self.tempo_limite:.0f}s")
+            except (EOFError, OSError):
+                worker.encerrar()
+                worker = self._novo_worker()
+                raise MemoryError("O processo de execucao foi encerrado (provavel excesso de memoria)")
+        finally:
+            self._ociosos.put(worker)
+            _liberar(nome)
+
+        return _consumir(*saida), metricas
+
+    def executar_perfilado(self, codigo: str, df: pd.DataFrame) -> Future:
+        # Resultado: (df corrigido, metricas de tempo e memoria do script)
+        return self._supervisor.submit(self._supervisionar, codigo, df)
+
+    def executar(self, codigo: str, df: pd.DataFrame) -> Future:
+        return self._supervisor.submit(lambda: self._supervisionar(codigo, df)[0])
+
+
+_executor = None
+_lock_executor = threading.Lock()
+
+def obter_executor() -> ExecutorScripts:
+    global _executor
+    with _lock_executor:
+        if _executor is None:
+            _executor = ExecutorScripts()
+    return _executor
+
+def executar_script(codigo: str, df: pd.DataFrame) -> Future:
+    return obter_executor().executar(codigo, df)
+
+def executar_script_perfilado(codigo: str, df: pd.DataFrame) -> Future:
+    return obter_executor().executar_perfilado(codigo, df)
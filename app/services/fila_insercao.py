@@ -0,0 +1,214 @@
+import streamlit as st
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Optional
+
+from app.services.conexao_db import emprestar_conexao, fechar_conexoes
+from app.services.insert_data import DB_PATH, inserir_transacoes, inserir_transacoes_agrupadas
+
+# Jobs ate este tamanho podem dividir a mesma transacao com outros da fila
+LIMITE_JOB_PEQUENO = int(os.getenv("INSERCAO_JOB_PEQUENO_LINHAS", 5_000))
+LIMITE_LINHAS_AGRUPADAS = int(os.getenv("INSERCAO_AGRUPAR_ATE_LINHAS", 20_000))
+
+STATUS_FINAIS = ("CONCLUIDO", "FALHA")
+
+_PARAR = object()
+
+logger = logging.getLogger(__name__)
+
+def _garantir_tabela_jobs(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs_insercao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            arquivo_nome TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('PENDENTE', 'PROCESSANDO', 'CONCLUIDO', 'FALHA')),
+            total_registros INTEGER DEFAULT 0,
+            registros_processados INTEGER DEFAULT 0,
+            resultado TEXT,
+            mensagem_erro TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs_insercao(status)")
+
+def init_jobs_insercao_table(db_path=DB_PATH):
+    try:
+        with emprestar_conexao(db_path) as conn:
+            _garantir_tabela_jobs(conn.cursor())
+            conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao inicializar tabela de jobs de insercao: {e}")
+
+def consultar_job(job_id: int, db_path=DB_PATH) -> Optional[dict]:
+    with emprestar_conexao(db_path, somente_leitura=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, arquivo_nome, status, total_registros, registros_processados,
+                   resultado, mensagem_erro, created_at, updated_at
+            FROM jobs_insercao WHERE id = ?
+            """,
+            (job_id,)
+        )
+        linha = cursor.fetchone()
+        colunas = [c[0] for c in cursor.description]
+
+    if linha is None:
+        return None
+    job = dict(zip(colunas, linha))
+    job["resultado"] = json.loads(job["resultado"]) if job["resultado"] else None
+    return job
+
+
+class EscritorInsercao:
+    # Unica thread que grava transacoes: as paginas apenas enfileiram e acompanham o job pela tabela
+    def __init__(self, db_path=DB_PATH, limite_job_pequeno: int = LIMITE_JOB_PEQUENO,
+                 limite_linhas_agrupadas: int = LIMITE_LINHAS_AGRUPADAS):
+        self.db_path = db_path
+        self.limite_job_pequeno = limite_job_pequeno
+        self.limite_linhas_agrupadas = limite_linhas_agrupadas
+        self._fila = queue.Queue()
+
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            _garantir_tabela_jobs(cursor)
+            # Jobs de um processo anterior perderam os dados em memoria e nao serao retomados aqui
+            cursor.execute(
+                """
+                UPDATE jobs_insercao
+                SET status = 'FALHA', mensagem_erro = 'Processo reiniciado antes da conclusao', updated_at = CURRENT_TIMESTAMP
+                WHERE status IN ('PENDENTE', 'PROCESSANDO')
+                """
+            )
+            conn.commit()
+
+        self._thread = None
+        self.iniciar()
+
+    def ativo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        # Jobs que ja estao na fila sao preservados quando a thread e recriada
+        if not self.ativo():
+            self._thread = threading.Thread(target=self._executar, name="escritor-insercao", daemon=True)
+            self._thread.start()
+
+    def enfileirar(self, df, arquivo_nome: str, lote_id: int = None) -> int:
+        # Apenas o registro do job e gravado aqui; as transacoes ficam com a thread do escritor
+        with emprestar_conexao(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO jobs_insercao (arquivo_nome, status, total_registros) VALUES (?, 'PENDENTE', ?)",
+                (arquivo_nome, len(df))
+            )
+            job_id = cursor.lastrowid
+            conn.commit()
+
+        self._fila.put((job_id, df, lote_id))
+        return job_id
+
+    def parar(self, timeout: float = None):
+        self._fila.put(_PARAR)
+        self._thread.join(timeout)
+
+    def _pequeno(self, job) -> bool:
+        return job is not _PARAR and len(job[1]) <= self.limite_job_pequeno
+
+    def _executar(self):
+        adiado = None
+        while True:
+            job = adiado if adiado is not None else self._fila.get()
+            adiado = None
+            if job is _PARAR:
+                break
+
+            # Jobs pequenos que ja estao na fila entram na mesma transacao
+            grupo = [job]
+            if self._pequeno(job):
+                linhas = len(job[1])
+                while linhas < self.limite_linhas_agrupadas:
+                    try:
+                        proximo = self._fila.get_nowait()
+                    except queue.Empty:
+                        break
+                    if not self._pequeno(proximo):
+                        adiado = proximo
+                        break
+                    grupo.append(proximo)
+                    linhas += len(proximo[1])
+
+            try:
+                self._processar(grupo)
+            except Exception as e:
+                logger.exception("Falha ao gravar jobs de insercao %s", [job_id for job_id, *_ in grupo])
+                self._registrar_falha(grupo, str(e))
+
+        fechar_conexoes()
+
+    def _registrar_falha(self, grupo: list, mensagem_erro: str):
+        # Se nem o status de falha puder ser gravado (banco indisponivel), o erro fica no log
+        # e o laco segue atendendo a fila
+        for job_id, *_ in grupo:
+            try:
+                self._finalizar(job_id, None, mensagem_erro)
+            except Exception:
+                logger.exception("Nao foi possivel registrar a falha do job de insercao %s", job_id)
+
+    def _processar(self, grupo: list):
+        for job_id, *_ in grupo:
+            self._atualizar(job_id, status="PROCESSANDO")
+
+        if len(grupo) == 1:
+            job_id, df, lote_id = grupo[0]
+            resultados = [
+                inserir_transacoes(
+                    df, self.db_path, lote_id=lote_id,
+                    progresso=lambda processadas, total: self._atualizar(job_id, registros_processados=processadas)
+                )
+            ]
+        else:
+            resultados = inserir_transacoes_agrupadas([df for _, df, _ in grupo], self.db_path, [lote_id for *_, lote_id in grupo])
+
+        for (job_id, *_), resultado in zip(grupo, resultados):
+            self._finalizar(job_id, resultado)
+
+    def _atualizar(self, job_id: int, **campos):
+        with emprestar_conexao(self.db_path) as conn:
+            atribuicoes = ", ".join(f"{campo} = ?" for campo in campos)
+            conn.execute(
+                f"UPDATE jobs_insercao SET {atribuicoes}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (*campos.values(), job_id)
+            )
+            conn.commit()
+
+    def _finalizar(self, job_id: int, resultado: Optional[dict], mensagem_erro: str = None):
+        if resultado is None:
+            self._atualizar(job_id, status="FALHA", mensagem_erro=mensagem_erro)
+            return
+
+        campos = {"resultado": json.dumps(resultado, ensure_ascii=False, default=str)}
+        if resultado.get("sucesso", True):
+            campos.update(status="CONCLUIDO", registros_processados=resultado.get("total_registros", 0))
+        else:
+            # O resultado parcial acompanha a falha: os lotes gravados ficam no checkpoint
+            campos.update(status="FALHA", mensagem_erro=str(resultado["erros"][-1].get("erro")))
+        self._atualizar(job_id, **campos)
+
+
+_escritor = None
+_lock_escritor = threading.Lock()
+
+def obter_escritor_insercao() -> EscritorInsercao:
+    global _escritor
+    with _lock_escritor:
+        if _escritor is None:
+            _escritor = EscritorInsercao()
+        elif not _escritor.ativo():
+            logger.warning("Thread do escritor de insercao encerrada; reiniciando")
+            _escritor.iniciar()
+    return _escritor
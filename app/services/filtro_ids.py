@@ -0,0 +1,247 @@
+import streamlit as st
+import math
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.services.conexao_db import emprestar_conexao
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+CAPACIDADE_FILTRO_IDS = int(os.getenv("FILTRO_IDS_CAPACIDADE", 1_000_000))
+TAXA_FALSO_POSITIVO = float(os.getenv("FILTRO_IDS_TAXA_FALSO_POSITIVO", 0.01))
+TAMANHO_LOTE_LEITURA = 50_000
+LIMITE_PARAMETROS_CONSULTA = 500
+
+# Chaves fixas (16 bytes) para que o hash seja o mesmo entre processos e o filtro possa ser persistido
+CHAVE_HASH_BASE = "ids_transac_base"
+CHAVE_HASH_PASSO = "ids_transac_step"
+
+
+class FiltroBloom:
+    # Filtro de Bloom com k posicoes por ID via hash duplo (h1 + i * h2), calculado em lote com numpy.
+    # Nunca da falso negativo: "ausente" e definitivo, "presente" precisa ser confirmado no banco
+    def __init__(self, capacidade: int, taxa_falso_positivo: float = TAXA_FALSO_POSITIVO, bits: bytes = None,
+                 num_hashes: int = None, total: int = 0):
+        self.capacidade = max(int(capacidade), 1)
+        if bits is None:
+            num_bits = math.ceil(-self.capacidade * math.log(taxa_falso_positivo) / math.log(2) ** 2)
+            self.bits = np.zeros(math.ceil(num_bits / 8), dtype=np.uint8)
+        else:
+            self.bits = np.frombuffer(bits, dtype=np.uint8).copy()
+        self.num_bits = self.bits.size * 8
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / self.capacidade * math.log(2)))
+        self.total = total
+
+    def _posicoes(self, ids) -> np.ndarray:
+        valores = np.asarray(ids, dtype=object)
+        base = pd.util.hash_array(valores, hash_key=CHAVE_HASH_BASE, categorize=False)
+        passo = pd.util.hash_array(valores, hash_key=CHAVE_HASH_PASSO, categorize=False) | np.uint64(1)
+        indices = np.arange(self.num_hashes, dtype=np.uint64)
+        return (base[:, None] + indices[None, :] * passo[:, None]) % np.uint64(self.num_bits)
+
+    def adicionar(self, ids):
+        if len(ids) == 0:
+            return
+        posicoes = self._posicoes(ids).ravel()
+        np.bitwise_or.at(self.bits, posicoes >> np.uint64(3), np.left_shift(1, posicoes & np.uint64(7)).astype(np.uint8))
+        self.total += len(ids)
+
+    def contem(self, ids) -> np.ndarray:
+        if len(ids) == 0:
+            return np.zeros(0, dtype=bool)
+        posicoes = self._posicoes(ids)
+        bytes_ = self.bits[posicoes >> np.uint64(3)]
+        return ((bytes_ >> (posicoes & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+    @property
+    def saturado(self) -> bool:
+        return self.total > self.capacidade
+
+
+def _garantir_tabela_filtro(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS filtro_ids (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            capacidade INTEGER NOT NULL,
+            num_hashes INTEGER NOT NULL,
+            total_ids INTEGER NOT NULL,
+            ultimo_rowid INTEGER NOT NULL,
+            id_ultimo_rowid TEXT,
+            bits BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(filtro_ids)")}
+    if "id_ultimo_rowid" not in colunas:
+        # Filtros salvos antes da marca de ID sao reconstruidos na primeira sincronizacao
+        cursor.execute("ALTER TABLE filtro_ids ADD COLUMN id_ultimo_rowid TEXT")
+
+def init_filtro_ids_table(db_path=DB_PATH):
+    try:
+        with emprestar_conexao(db_path) as conn:
+            _garantir_tabela_filtro(conn.cursor())
+            conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao inicializar tabela do filtro de IDs: {e}")
+
+
+class IndiceIds:
+    # Filtro de um banco, mantido em memoria e persistido na tabela filtro_ids.
+    # ultimo_rowid marca ate onde a tabela ja foi incluida: gravacoes feitas fora do app
+    # sao incorporadas na proxima sincronizacao, sem reconstruir tudo.
+    # id_ultimo_rowid guarda o ID da linha na marca: se outra linha ocupa esse rowid, o fim da
+    # tabela foi removido e regravado (rowids reutilizados) e o filtro precisa ser reconstruido
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.filtro = None
+        self.ultimo_rowid = 0
+        self.id_ultimo_rowid = None
+        self._lock = threading.RLock()
+
+    def _id_no_rowid(self, cursor, rowid: int):
+        linha = cursor.execute("SELECT id_transacao FROM transacoes_financeiras WHERE rowid = ?", (rowid,)).fetchone()
+        return linha[0] if linha else None
+
+    def _mover_marca(self, cursor, rowid: int):
+        self.ultimo_rowid = rowid
+        self.id_ultimo_rowid = self._id_no_rowid(cursor, rowid)
+
+    def _adicionar_da_tabela(self, cursor, a_partir_do_rowid: int) -> int:
+        cursor.execute(
+            "SELECT rowid, id_transacao FROM transacoes_financeiras WHERE rowid > ? ORDER BY rowid",
+            (a_partir_do_rowid,)
+        )
+        ultimo = a_partir_do_rowid
+        while True:
+            linhas = cursor.fetchmany(TAMANHO_LOTE_LEITURA)
+            if not linhas:
+                break
+            self.filtro.adicionar([id_transacao for _, id_transacao in linhas])
+            ultimo = linhas[-1][0]
+        return ultimo
+
+    def _salvar(self, conn):
+        cursor = conn.cursor()
+        _garantir_tabela_filtro(cursor)
+        cursor.execute(
+            """
+            INSERT INTO filtro_ids (id, capacidade, num_hashes, total_ids, ultimo_rowid, id_ultimo_rowid, bits, updated_at)
+            VALUES (1, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(id) DO UPDATE SET
+                capacidade = excluded.capacidade,
+                num_hashes = excluded.num_hashes,
+                total_ids = excluded.total_ids,
+                ultimo_rowid = excluded.ultimo_rowid,
+                id_ultimo_rowid = excluded.id_ultimo_rowid,
+                bits = excluded.bits,
+                updated_at = excluded.updated_at
+            """,
+            (
+                self.filtro.capacidade, self.filtro.num_hashes, self.filtro.total,
+                self.ultimo_rowid, self.id_ultimo_rowid, self.filtro.bits.tobytes()
+            )
+        )
+        conn.commit()
+
+    def reconstruir(self) -> int:
+        with self._lock:
+            with emprestar_conexao(self.db_path) as conn:
+                cursor = conn.cursor()
+                total = cursor.execute("SELECT COUNT(*) FROM transacoes_financeiras").fetchone()[0]
+                # Folga para crescer antes da proxima reconstrucao
+                self.filtro = FiltroBloom(max(CAPACIDADE_FILTRO_IDS, 2 * total))
+                self._mover_marca(cursor, self._adicionar_da_tabela(cursor, 0))
+                self._salvar(conn)
+                return total
+
+    def sincronizar(self):
+        with self._lock:
+            with emprestar_conexao(self.db_path) as conn:
+                cursor = conn.cursor()
+                if self.filtro is None:
+                    _garantir_tabela_filtro(cursor)
+                    conn.commit()
+                    salvo = cursor.execute(
+                        "SELECT capacidade, num_hashes, total_ids, ultimo_rowid, id_ultimo_rowid, bits FROM filtro_ids WHERE id = 1"
+                    ).fetchone()
+                    if salvo is None:
+                        self.reconstruir()
+                        return
+                    capacidade, num_hashes, total, self.ultimo_rowid, self.id_ultimo_rowid, bits = salvo
+                    self.filtro = FiltroBloom(capacidade, bits=bits, num_hashes=num_hashes, total=total)
+
+                maior_rowid = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM transacoes_financeiras").fetchone()[0]
+                id_na_marca = self._id_no_rowid(cursor, self.ultimo_rowid)
+                if id_na_marca is not None and id_na_marca != self.id_ultimo_rowid:
+                    self.reconstruir()
+                    return
+
+                # Remocoes no fim da tabela liberam rowids que serao reutilizados
+                if maior_rowid < self.ultimo_rowid:
+                    self._mover_marca(cursor, maior_rowid)
+                    self._salvar(conn)
+                elif maior_rowid > self.ultimo_rowid:
+                    self._mover_marca(cursor, self._adicionar_da_tabela(cursor, self.ultimo_rowid))
+                    if self.filtro.saturado:
+                        self.reconstruir()
+                        return
+                    self._salvar(conn)
+
+    def provaveis(self, ids) -> np.ndarray:
+        # Mascara dos IDs que podem existir no banco; os demais certamente nao existem
+        with self._lock:
+            if self.filtro is None:
+                self.sincronizar()
+            return self.filtro.contem(ids)
+
+    def registrar_insercao(self, conn, ids):
+        # Chamado pelo escritor apos o commit do lote, na mesma conexao
+        with self._lock:
+            if self.filtro is None:
+                self.sincronizar()
+                return
+            self.filtro.adicionar(ids)
+            cursor = conn.cursor()
+            self._mover_marca(cursor, cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM transacoes_financeiras").fetchone()[0])
+            if self.filtro.saturado:
+                self.reconstruir()
+            else:
+                self._salvar(conn)
+
+
+_indices = {}
+_lock_indices = threading.Lock()
+
+def obter_indice_ids(db_path=DB_PATH) -> IndiceIds:
+    chave = str(Path(db_path).resolve())
+    with _lock_indices:
+        if chave not in _indices:
+            _indices[chave] = IndiceIds(db_path)
+    return _indices[chave]
+
+def ids_existentes(ids, db_path=DB_PATH) -> set:
+    # Triagem em memoria; somente os provaveis acertos sao consultados no banco
+    ids = pd.Series(ids, dtype=object).dropna().astype(str).str.strip().unique()
+    indice = obter_indice_ids(db_path)
+    indice.sincronizar()
+    candidatos = ids[indice.provaveis(ids)].tolist()
+
+    existentes = set()
+    with emprestar_conexao(db_path, somente_leitura=True) as conn:
+        for inicio in range(0, len(candidatos), LIMITE_PARAMETROS_CONSULTA):
+            parte = candidatos[inicio:inicio + LIMITE_PARAMETROS_CONSULTA]
+            placeholders = ", ".join(["?"] * len(parte))
+            existentes.update(
+                linha[0] for linha in conn.execute(
+                    f"SELECT id_transacao FROM transacoes_financeiras WHERE id_transacao IN ({placeholders})", parte
+                )
+            )
+    return existentes
+
+def reconstruir_indice_ids(db_path=DB_PATH) -> int:
+    # Reconstrucao sob demanda: descarta falsos positivos de IDs removidos e redimensiona o filtro
+    return obter_indice_ids(db_path).reconstruir()
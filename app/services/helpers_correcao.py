@@ -0,0 +1,125 @@
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+FORMATOS_DATA = {
+    "DD/MM/YYYY": "%d/%m/%Y",
+    "DD-MM-YYYY": "%d-%m-%Y",
+    "MM/DD/YYYY": "%m/%d/%Y",
+    "YYYY-MM-DD": "%Y-%m-%d",
+}
+
+
+def _em_unicos(serie: pd.Series, converter) -> pd.Series:
+    # Arquivos financeiros repetem muito os mesmos valores: a conversao roda
+    # uma vez por valor distinto e o resultado e espalhado pelos codigos
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    convertidos = converter(pd.Series(unicos, dtype=object))
+    resultado = convertidos.reindex(codigos).to_numpy()
+    return pd.Series(resultado, index=serie.index, dtype=object)
+
+
+def parse_brl_centavos(serie: pd.Series) -> pd.Series:
+    # Valor monetario como inteiro de centavos, sem passar por float: "1.234,56" -> 123456.
+    # A terceira casa decimal arredonda a segunda (meio para cima), tambem para floats:
+    # 1.005 vira 101 a partir do decimal impresso, e nao 100 como em rint(1.005 * 100)
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype("Int64") * 100
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        def arredondar(valor):
+            valor = float(valor)
+            if not math.isfinite(valor):
+                return None
+            return int((Decimal(str(valor)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+        return _em_unicos(serie, lambda unicos: unicos.map(arredondar)).astype("Int64")
+
+    def converter(unicos):
+        texto = unicos.astype(str).str.replace("R$", "", regex=False).str.replace(r"\s+", "", regex=True)
+        # Com virgula decimal, o ponto e separador de milhar. Sem virgula, pontos seguidos de
+        # exatamente 3 digitos tambem sao milhar ("1.500" -> 1500, "1.234.567"); "1.50" segue decimal
+        com_virgula = texto.str.contains(",", regex=False)
+        so_milhar = ~com_virgula & texto.str.fullmatch(r"[+-]?[1-9]\d{0,2}(?:\.\d{3})+")
+        texto = texto.where(~(com_virgula | so_milhar), texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+
+        # Ate 16 digitos inteiros para que os centavos caibam em int64
+        partes = texto.str.extract(r"^([+-]?)(\d{0,16})(?:\.(\d*))?$")
+        inteiro, fracao = partes[1].fillna(""), partes[2].fillna("")
+        validos = partes[1].notna() & ((inteiro != "") | (fracao != ""))
+
+        centavos = (
+            pd.to_numeric(inteiro.where(inteiro != "", "0").where(validos, "0")).astype("int64") * 100
+            + pd.to_numeric((fracao + "00").str[:2].where(validos, "0")).astype("int64")
+            + (fracao.str[2:3] >= "5").astype("int64")
+        )
+        centavos = centavos.where(partes[0] != "-", -centavos)
+        return centavos.astype("Int64").where(validos, pd.NA)
+
+    return _em_unicos(serie, converter).astype("Int64")
+
+
+def parse_brl(serie: pd.Series) -> pd.Series:
+    centavos = parse_brl_centavos(serie)
+    return pd.Series(centavos.to_numpy(dtype=float, na_value=np.nan) / 100, index=serie.index)
+
+
+def normalize_dates(serie: pd.Series, formato: str = None, formato_saida: str = "%Y-%m-%d") -> pd.Series:
+    formato = FORMATOS_DATA.get(formato, formato)
+
+    def converter(unicos):
+        texto = unicos.astype(str).str.strip()
+        datas = pd.Series(pd.NaT, index=texto.index, dtype="datetime64[ns]")
+
+        for tentativa in (formato, "%Y-%m-%d"):
+            if tentativa:
+                datas = datas.fillna(pd.to_datetime(texto, format=tentativa, errors="coerce"))
+
+        restantes = datas.isna()
+        if restantes.any():
+            datas[restantes] = pd.to_datetime(texto[restantes], format="mixed", dayfirst=True, errors="coerce")
+
+        return datas.dt.strftime(formato_saida).astype(object).where(datas.notna(), None)
+
+    return _em_unicos(serie, converter).astype(object).where(serie.notna(), None)
+
+
+def map_enum(serie: pd.Series, permitidos: list, mapeamento: dict = None, default=None) -> pd.Series:
+    permitidos = set(permitidos)
+    mapeamento = mapeamento or {}
+    mapeamento_normalizado = {str(k).strip().lower(): v for k, v in mapeamento.items()}
+
+    def converter_valor(valor):
+        texto = str(valor).strip()
+        if texto in mapeamento:
+            texto = mapeamento[texto]
+        elif texto.lower() in mapeamento_normalizado:
+            texto = mapeamento_normalizado[texto.lower()]
+        texto = str(texto).upper()
+        return texto if texto in permitidos else default
+
+    resultado = _em_unicos(serie, lambda unicos: unicos.map(converter_valor))
+    return resultado.astype(object).where(serie.notna(), default)
+
+
+def coalesce_columns(df: pd.DataFrame, destino: str, origens: list) -> pd.DataFrame:
+    colunas = [c for c in dict.fromkeys([destino] + list(origens)) if c in df.columns]
+    if not colunas:
+        return df
+
+    resultado = df[colunas[0]]
+    for coluna in colunas[1:]:
+        resultado = resultado.fillna(df[coluna])
+
+    df = df.drop(columns=colunas)
+    df[destino] = resultado
+    return df
+
+
+HELPERS = {
+    "parse_brl": parse_brl,
+    "normalize_dates": normalize_dates,
+    "map_enum": map_enum,
+    "coalesce_columns": coalesce_columns,
+}
@@ -1,135 +1,491 @@
 import streamlit as st
+import hashlib
+import itertools
+import json
+import os
 import sqlite3
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Dict
 
-def inserir_transacoes(df: pd.DataFrame) -> Dict:
-    db_path = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
-    conn = None
-        
+from app.services.restricoes_schema import numerar_linhas, verificar_restricoes
+from app.services.helpers_correcao import parse_brl_centavos
+from app.services.conexao_db import emprestar_conexao
+from app.services.filtro_ids import obter_indice_ids
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+TAMANHO_LOTE_STAGING = int(os.getenv("INSERCAO_TAMANHO_LOTE_STAGING", 10_000))
+# Linhas por transacao; cada lote gravado vira um checkpoint para retomada
+TAMANHO_LOTE_INSERCAO = int(os.getenv("INSERCAO_TAMANHO_LOTE", 50_000))
+TAMANHO_LOTE_CENTAVOS = 50_000
+
+COLUNAS_TRANSACAO = [
+    "id_transacao", "data_transacao", "valor", "valor_centavos", "tipo", "categoria",
+    "descricao", "conta_origem", "conta_destino", "status", "lote_id"
+]
+
+def _para_python(serie: pd.Series) -> list:
+    # Nulos (None, NaN, NA, NaT) viram None e os escalares numpy viram tipos nativos do sqlite3
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        serie = serie.dt.strftime("%Y-%m-%d")
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+def _codificar_colunas(df: pd.DataFrame) -> tuple:
+    # Cada coluna e convertida uma unica vez; as linhas so sao montadas ao gravar
+    linhas = numerar_linhas(df)
+    vazia = pd.Series(None, index=df.index, dtype=object)
+    
+    ids = df["id_transacao"].astype(str).str.strip() if "id_transacao" in df.columns else vazia
+    valor_original = df["valor"] if "valor" in df.columns else vazia
+    # O valor e lido uma unica vez como centavos; a coluna decimal e derivada deles
+    centavos = parse_brl_centavos(valor_original)
+    
+    invalidos = centavos.isna().to_numpy()
+    erros = []
+    for posicao in np.flatnonzero(invalidos):
+        original = valor_original.iloc[posicao]
+        erros.append({
+            "linha": linhas[posicao],
+            "id_transacao": ids.iloc[posicao],
+            "erro": "Valor ausente" if pd.isna(original) else f"Valor nao numerico: {original!r}"
+        })
+    
+    colunas = {c: _para_python(df[c]) if c in df.columns else [None] * len(df) for c in COLUNAS_TRANSACAO}
+    colunas["id_transacao"] = ids.tolist()
+    colunas["valor_centavos"] = _para_python(centavos)
+    colunas["valor"] = _para_python(centavos / 100)
+    
+    return linhas, colunas, invalidos, erros
+
+def _montar_registros(df: pd.DataFrame, erros: list, filtro_ids=None, lote_id: int = None) -> tuple:
+    linhas, colunas, invalidos, erros_conversao = _codificar_colunas(df)
+    erros.extend(erros_conversao)
+    # Todas as linhas do arquivo levam o lote da importacao, para que possa ser desfeita de uma vez
+    colunas["lote_id"] = [lote_id] * len(df)
+    
+    # Sem filtro, toda linha precisa da consulta de duplicidade no banco
+    ids = colunas["id_transacao"]
+    suspeitos = filtro_ids(ids).tolist() if filtro_ids else itertools.repeat(True, len(ids))
+    
+    registros = zip(linhas, *(colunas[c] for c in COLUNAS_TRANSACAO), suspeitos)
+    if not invalidos.any():
+        return registros, ids
+    return itertools.compress(registros, ~invalidos), list(itertools.compress(ids, ~invalidos))
+
+def _carregar_staging(cursor, registros):
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS staging_transacoes (
+            linha INTEGER NOT NULL,
+            {", ".join(COLUNAS_TRANSACAO)},
+            suspeito INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS temp.idx_staging_id ON staging_transacoes(id_transacao, linha)")
+    cursor.execute("DELETE FROM staging_transacoes")
+    
+    # Lotes limitados mantem a memoria constante mesmo com o gerador de registros
+    placeholders = ", ".join(["?"] * (len(COLUNAS_TRANSACAO) + 2))
+    while True:
+        lote = list(itertools.islice(registros, TAMANHO_LOTE_STAGING))
+        if not lote:
+            break
+        cursor.executemany(f"INSERT INTO staging_transacoes VALUES ({placeholders})", lote)
+
+def _duplicados_staging(cursor) -> list:
+    # IDs ja existentes no banco e repeticoes dentro do proprio arquivo (a primeira ocorrencia vale).
+    # So as linhas marcadas como suspeitas pelo filtro de IDs consultam a tabela principal
+    cursor.execute("""
+        SELECT s.linha, s.id_transacao,
+               CASE WHEN s.suspeito AND EXISTS (SELECT 1 FROM transacoes_financeiras t WHERE t.id_transacao = s.id_transacao)
+                    THEN 'ID duplicado (já existe no banco)'
+                    ELSE 'ID duplicado (repetido no arquivo)'
+               END
+        FROM staging_transacoes s
+        WHERE (s.suspeito AND EXISTS (SELECT 1 FROM transacoes_financeiras t WHERE t.id_transacao = s.id_transacao))
+           OR EXISTS (
+                SELECT 1 FROM staging_transacoes anterior
+                WHERE anterior.id_transacao = s.id_transacao AND anterior.linha < s.linha
+           )
+        ORDER BY s.linha
+    """)
+    return [{"linha": linha, "id_transacao": id_transacao, "erro": erro} for linha, id_transacao, erro in cursor.fetchall()]
+
+def _duplicados_nao_reportados(cursor, maior_rowid_anterior: int, reportadas: set) -> list:
+    # Linhas que o filtro de IDs deu como novas mas que o ON CONFLICT descartou: o ID ja estava
+    # numa linha gravada antes deste lote (rowid ate a marca anterior ao INSERT)
+    cursor.execute(
+        """
+        SELECT s.linha, s.id_transacao
+        FROM staging_transacoes s
+        WHERE NOT s.suspeito
+          AND EXISTS (
+              SELECT 1 FROM transacoes_financeiras t
+              WHERE t.id_transacao = s.id_transacao AND t.rowid <= ?
+          )
+        ORDER BY s.linha
+        """,
+        (maior_rowid_anterior,)
+    )
+    return [
+        {"linha": linha, "id_transacao": id_transacao, "erro": "ID duplicado (já existe no banco)"}
+        for linha, id_transacao in cursor.fetchall()
+        if linha not in reportadas
+    ]
+
+def gerar_hash_dataframe(df: pd.DataFrame) -> str:
+    # Identifica o conteudo final a inserir: o mesmo arquivo corrigido retoma os mesmos lotes
+    conteudo = hashlib.sha256("|".join(map(str, df.columns)).encode("utf-8"))
+    conteudo.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return conteudo.hexdigest()
+
+def _garantir_tabela_checkpoints(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints_insercao (
+            hash_arquivo TEXT NOT NULL,
+            lote INTEGER NOT NULL,
+            tamanho_lote INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            registros_inseridos INTEGER NOT NULL,
+            registros_duplicados INTEGER NOT NULL,
+            erros TEXT,
+            lote_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (hash_arquivo, lote)
+        )
+    """)
+
+def init_checkpoints_insercao_table(db_path=DB_PATH):
     try:
-        df["id_transacao"] = df["id_transacao"].astype(str).str.strip()
-        conn = sqlite3.connect(db_path)
+        with emprestar_conexao(db_path) as conn:
+            _garantir_tabela_checkpoints(conn.cursor())
+            conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao inicializar tabela de checkpoints de insercao: {e}")
+
+def init_valor_centavos(db_path=DB_PATH):
+    # Bancos criados antes da coluna de centavos: adiciona a coluna, o indice e a visao
+    # e preenche as linhas antigas em lotes por rowid
+    try:
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(transacoes_financeiras)")}
+            if "valor_centavos" not in colunas:
+                cursor.execute("ALTER TABLE transacoes_financeiras ADD COLUMN valor_centavos INTEGER")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_valor_centavos ON transacoes_financeiras(valor_centavos)")
+            cursor.execute("""
+                CREATE VIEW IF NOT EXISTS transacoes_valor_decimal AS
+                SELECT
+                    id_transacao, data_transacao, valor_centavos,
+                    printf('%d.%02d', valor_centavos / 100, valor_centavos % 100) AS valor_decimal,
+                    tipo, categoria, descricao, conta_origem, conta_destino, status, created_at
+                FROM transacoes_financeiras
+            """)
+            conn.commit()
+            
+            maior_rowid = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM transacoes_financeiras").fetchone()[0]
+            for inicio in range(1, maior_rowid + 1, TAMANHO_LOTE_CENTAVOS):
+                cursor.execute(
+                    """
+                    UPDATE transacoes_financeiras SET valor_centavos = CAST(ROUND(valor * 100) AS INTEGER)
+                    WHERE rowid BETWEEN ? AND ? AND valor_centavos IS NULL
+                    """,
+                    (inicio, inicio + TAMANHO_LOTE_CENTAVOS - 1)
+                )
+                conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao migrar valores para centavos: {e}")
+
+def _carregar_checkpoints(cursor, hash_arquivo: str, tamanho_lote: int) -> dict:
+    # Checkpoints de uma execucao com outro tamanho de lote nao correspondem aos mesmos cortes
+    cursor.execute("DELETE FROM checkpoints_insercao WHERE hash_arquivo = ? AND tamanho_lote != ?", (hash_arquivo, tamanho_lote))
+    cursor.execute(
+        """
+        SELECT lote, linhas, registros_inseridos, registros_duplicados, erros, lote_id
+        FROM checkpoints_insercao WHERE hash_arquivo = ?
+        """,
+        (hash_arquivo,)
+    )
+    return {
+        lote: {
+            "linhas": linhas, "registros_inseridos": inseridos, "registros_duplicados": duplicados,
+            "erros": json.loads(erros or "[]"), "lote_id": lote_id
+        }
+        for lote, linhas, inseridos, duplicados, erros, lote_id in cursor.fetchall()
+    }
+
+def descartar_checkpoints(hashes: list, db_path=DB_PATH):
+    with emprestar_conexao(db_path) as conn:
         cursor = conn.cursor()
+        _garantir_tabela_checkpoints(cursor)
+        cursor.executemany("DELETE FROM checkpoints_insercao WHERE hash_arquivo = ?", [(h,) for h in hashes])
+        conn.commit()
+
+def _remarcar_lotes_retomados(cursor, df: pd.DataFrame, concluidos: dict, hash_arquivo: str, tamanho_lote: int, lote_id: int):
+    # Retomada sob outra importacao: as linhas ja gravadas passam para o lote atual,
+    # para que desfazer o lote remova o arquivo inteiro. So linhas deste arquivo com o
+    # lote antigo mudam; IDs que ja existiam no banco continuam no lote de origem
+    for lote, parcial in concluidos.items():
+        if parcial["lote_id"] == lote_id:
+            continue
+        ids = df["id_transacao"].iloc[lote * tamanho_lote:(lote + 1) * tamanho_lote].astype(str).str.strip()
+        cursor.executemany(
+            "UPDATE transacoes_financeiras SET lote_id = ? WHERE id_transacao = ? AND lote_id IS ?",
+            ((lote_id, id_transacao, parcial["lote_id"]) for id_transacao in ids)
+        )
+        cursor.execute(
+            "UPDATE checkpoints_insercao SET lote_id = ? WHERE hash_arquivo = ? AND lote = ?",
+            (lote_id, hash_arquivo, lote)
+        )
+
+def _inserir_faixa_staging(cursor, rowids: list, duplicados: set, erros: list) -> int:
+    # Tenta a faixa inteira num SAVEPOINT; se alguma linha viola um CHECK/NOT NULL, divide ao meio.
+    # Com k linhas invalidas em n, sao O(k log n) comandos em vez de um por linha
+    colunas = ", ".join(COLUNAS_TRANSACAO)
+    cursor.execute("SAVEPOINT faixa_staging")
+    try:
+        cursor.execute(
+            f"""
+            INSERT INTO transacoes_financeiras ({colunas})
+            SELECT {colunas} FROM staging_transacoes WHERE rowid BETWEEN ? AND ? ORDER BY linha
+            ON CONFLICT(id_transacao) DO NOTHING
+            """,
+            (rowids[0], rowids[-1])
+        )
+        inseridos = cursor.rowcount
+        cursor.execute("RELEASE faixa_staging")
+        return inseridos
+    
+    except sqlite3.IntegrityError as e:
+        cursor.execute("ROLLBACK TO faixa_staging")
+        cursor.execute("RELEASE faixa_staging")
         
-        ids_transacao = df['id_transacao'].astype(str).tolist()
-        placeholders = ','.join(['?'] * len(ids_transacao))
+        if len(rowids) > 1:
+            meio = len(rowids) // 2
+            return (_inserir_faixa_staging(cursor, rowids[:meio], duplicados, erros)
+                    + _inserir_faixa_staging(cursor, rowids[meio:], duplicados, erros))
         
-        query_check = f"SELECT id_transacao FROM transacoes_financeiras WHERE id_transacao IN ({placeholders})"
-        cursor.execute(query_check, ids_transacao)
+        cursor.execute("SELECT linha, id_transacao FROM staging_transacoes WHERE rowid = ?", (rowids[0],))
+        linha, id_transacao = cursor.fetchone()
+        # Linha ja reportada como duplicada nao entraria de qualquer forma
+        if linha not in duplicados:
+            erros.append({"linha": linha, "id_transacao": id_transacao, "erro": f"Violacao de restricao: {e}"})
+        return 0
+
+def _inserir_lote(cursor, df_lote: pd.DataFrame, filtro_ids=None, lote_id: int = None) -> dict:
+    erros = []
+    registros, ids = _montar_registros(df_lote, erros, filtro_ids, lote_id)
+    _carregar_staging(cursor, registros)
+    
+    duplicados = _duplicados_staging(cursor)
+    erros.extend(duplicados)
+    
+    cursor.execute("SELECT rowid FROM staging_transacoes ORDER BY rowid")
+    rowids = [rowid for rowid, in cursor.fetchall()]
+    maior_rowid = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM transacoes_financeiras").fetchone()[0]
+    inseridos = 0
+    erros_antes = len(erros)
+    if rowids:
+        inseridos = _inserir_faixa_staging(cursor, rowids, {d["linha"] for d in duplicados}, erros)
+    
+    # Toda linha limpa do staging deve ter sido inserida; a diferenca sao IDs ja existentes
+    # que o filtro nao marcou como suspeitos (filtro defasado) e que o ON CONFLICT descartou
+    rejeitadas = {e["linha"] for e in erros[erros_antes:]}
+    perdidos = []
+    if inseridos < len(rowids) - len(duplicados) - len(rejeitadas):
+        perdidos = _duplicados_nao_reportados(cursor, maior_rowid, {d["linha"] for d in duplicados} | rejeitadas)
+        erros.extend(perdidos)
+    
+    return {
+        "linhas": len(df_lote),
+        "registros_inseridos": inseridos,
+        "registros_duplicados": len(duplicados) + len(perdidos),
+        "erros": erros,
+        "ids": ids,
+        "filtro_defasado": bool(perdidos)
+    }
+
+def inserir_transacoes(df: pd.DataFrame, db_path=DB_PATH, tamanho_lote: int = None, hash_arquivo: str = None, progresso=None,
+                       lote_id: int = None, manter_checkpoints: bool = False) -> Dict:
+    # progresso(linhas_processadas, total_linhas) e chamado apos cada lote gravado.
+    # lote_id e o registro de monitoramento_processamento da importacao, gravado em cada linha.
+    # manter_checkpoints: o df e parte de um arquivo maior e o chamador descarta os checkpoints no fim
+    tamanho_lote = tamanho_lote or TAMANHO_LOTE_INSERCAO
+    resultado = {
+        "sucesso": True, 
+        "registros_inseridos": 0,
+        "registros_duplicados": 0,
+        "total_registros": len(df),
+        "erros": []
+    }
+    
+    def acumular(parcial):
+        resultado["registros_inseridos"] += parcial["registros_inseridos"]
+        resultado["registros_duplicados"] += parcial["registros_duplicados"]
+        resultado["erros"].extend(parcial["erros"])
         
-        ids_existentes = set(row[0] for row in cursor.fetchall())
+    try:
+        if not pd.api.types.is_integer_dtype(df.index):
+            df = df.reset_index(drop=True)
+        hash_arquivo = hash_arquivo or gerar_hash_dataframe(df)
         
-        novos_registros = []
-        erros = []
-        registros_duplicados = 0
+        # Violacoes conhecidas do schema saem antes do banco; so as linhas limpas seguem para os lotes
+        invalidas, erros_restricoes = verificar_restricoes(df)
+        resultado["erros"].extend(erros_restricoes)
+        if invalidas.any():
+            df = df[~invalidas]
+        total = resultado["total_registros"]
         
-        for index, row in df.iterrows():
-            id_transacao = row['id_transacao']
-            if id_transacao in ids_existentes:
-                registros_duplicados += 1
-                erros.append({
-                    "linha": index + 1,
-                    "id_transacao": id_transacao,
-                    "erro": "ID duplicado (já existe no banco)"
-                })
-                continue
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            _garantir_tabela_checkpoints(cursor)
+            
+            # Lotes ja gravados por uma execucao interrompida nao sao reprocessados
+            concluidos = _carregar_checkpoints(cursor, hash_arquivo, tamanho_lote)
+            if lote_id is not None and "id_transacao" in df.columns:
+                _remarcar_lotes_retomados(cursor, df, concluidos, hash_arquivo, tamanho_lote, lote_id)
+            conn.commit()
+            indice_ids = obter_indice_ids(db_path)
+            indice_ids.sincronizar()
+            for parcial in concluidos.values():
+                acumular(parcial)
+            processadas = len(erros_restricoes) + sum(p["linhas"] for p in concluidos.values())
+            if progresso:
+                progresso(processadas, total)
             
-            try:             
-                dados_tupla = (
-                    id_transacao,
-                    row['data_transacao'],
-                    float(row['valor']),
-                    row.get('tipo'),
-                    row.get('categoria'),
-                    row.get('descricao'),
-                    row['conta_origem'],
-                    row.get('conta_destino'),
-                    row.get('status')
+            for lote, inicio in enumerate(range(0, len(df), tamanho_lote)):
+                if lote in concluidos:
+                    continue
+                
+                # Lote e checkpoint entram na mesma transacao: ou ambos sao gravados ou nenhum
+                parcial = _inserir_lote(cursor, df.iloc[inicio:inicio + tamanho_lote], indice_ids.provaveis, lote_id)
+                cursor.execute(
+                    """
+                    INSERT INTO checkpoints_insercao
+                    (hash_arquivo, lote, tamanho_lote, linhas, registros_inseridos, registros_duplicados, erros, lote_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        hash_arquivo, lote, tamanho_lote, parcial["linhas"],
+                        parcial["registros_inseridos"], parcial["registros_duplicados"],
+                        json.dumps(parcial["erros"], ensure_ascii=False, default=str), lote_id
+                    )
                 )
-                novos_registros.append(dados_tupla)
+                conn.commit()
+                if parcial["filtro_defasado"]:
+                    indice_ids.reconstruir()
+                else:
+                    indice_ids.registrar_insercao(conn, parcial["ids"])
                 
-            except Exception as e:
-                erros.append({
-                    "linha": index + 1,
-                    "id_transacao": id_transacao,
-                    "erro": str(e)
-                })
-        
-        if novos_registros:
-            cursor.executemany(
-                """
-                INSERT INTO transacoes_financeiras 
-                (id_transacao, data_transacao, valor, tipo, categoria, 
-                 descricao, conta_origem, conta_destino, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                novos_registros
-            )
-            conn.commit()
-        
-        return {
-            "sucesso": True, 
-            "registros_inseridos": len(novos_registros),
-            "registros_duplicados": registros_duplicados,
-            "total_registros": len(df),
-            "erros": erros
-        }
+                acumular(parcial)
+                processadas += parcial["linhas"]
+                if progresso:
+                    progresso(processadas, total)
+            
+            # Arquivo concluido: um novo envio do mesmo conteudo comeca do zero
+            if not manter_checkpoints:
+                cursor.execute("DELETE FROM checkpoints_insercao WHERE hash_arquivo = ?", (hash_arquivo,))
+                conn.commit()
+            
+            resultado["erros"].sort(key=lambda e: e.get("linha", 0))
+            return resultado
         
     except Exception as e:
-        if conn:
-            conn.rollback()
-        
-        return {
-            "sucesso": False,
-            "registros_inseridos": 0,
-            "registros_duplicados": 0,
-            "total_registros": len(df),
-            "erros": [{"erro": f"Erro fatal no banco: {str(e)}"}]
-        }
+        resultado["sucesso"] = False
+        resultado["erros"].append({"erro": f"Erro fatal no banco: {str(e)}"})
+        return resultado
+
+def inserir_transacoes_agrupadas(dfs: list, db_path=DB_PATH, lote_ids: list = None) -> list:
+    # Varios arquivos pequenos numa unica transacao; cada um fica num SAVEPOINT,
+    # entao a falha de um arquivo nao desfaz os outros
+    resultados = []
+    ids_gravados = []
+    filtro_defasado = False
+    try:
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            indice_ids = obter_indice_ids(db_path)
+            indice_ids.sincronizar()
+            cursor.execute("BEGIN")
+            for df, lote_id in zip(dfs, lote_ids or [None] * len(dfs)):
+                resultado = {
+                    "sucesso": True,
+                    "registros_inseridos": 0,
+                    "registros_duplicados": 0,
+                    "total_registros": len(df),
+                    "erros": []
+                }
+                cursor.execute("SAVEPOINT arquivo_agrupado")
+                try:
+                    if not pd.api.types.is_integer_dtype(df.index):
+                        df = df.reset_index(drop=True)
+                    invalidas, erros_restricoes = verificar_restricoes(df)
+                    parcial = _inserir_lote(cursor, df[~invalidas], indice_ids.provaveis, lote_id)
+                    cursor.execute("RELEASE arquivo_agrupado")
+                    ids_gravados.extend(parcial["ids"])
+                    filtro_defasado = filtro_defasado or parcial["filtro_defasado"]
+                    
+                    resultado["registros_inseridos"] = parcial["registros_inseridos"]
+                    resultado["registros_duplicados"] = parcial["registros_duplicados"]
+                    resultado["erros"] = sorted(erros_restricoes + parcial["erros"], key=lambda e: e.get("linha", 0))
+                except sqlite3.Error as e:
+                    cursor.execute("ROLLBACK TO arquivo_agrupado")
+                    cursor.execute("RELEASE arquivo_agrupado")
+                    resultado["sucesso"] = False
+                    resultado["erros"].append({"erro": f"Erro fatal no banco: {str(e)}"})
+                resultados.append(resultado)
+            
+            conn.commit()
+            if filtro_defasado:
+                indice_ids.reconstruir()
+            else:
+                indice_ids.registrar_insercao(conn, ids_gravados)
+            return resultados
     
-    finally:
-        if conn:
-            conn.close()
+    except Exception as e:
+        # Sem o commit nenhum arquivo do grupo foi gravado
+        return [
+            {
+                "sucesso": False,
+                "registros_inseridos": 0,
+                "registros_duplicados": 0,
+                "total_registros": len(df),
+                "erros": [{"erro": f"Erro fatal no banco: {str(e)}"}]
+            }
+            for df in dfs
+        ]
 
 def registrar_log_ingestao(arquivo_nome: str, registros_total: int, registros_sucesso: int, registros_erro: int,
                            usou_ia: bool, script_id: int = None, duracao_segundos: float = 0.0) -> bool:
     
-    db_path = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
-    conn = None
+    db_path = DB_PATH
     
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """
-            INSERT INTO log_ingestao 
-            (arquivo_nome, registros_total, registros_sucesso, registros_erro, 
-             usou_ia, script_id, duracao_segundos)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                arquivo_nome,
-                registros_total,
-                registros_sucesso,
-                registros_erro,
-                usou_ia,
-                script_id,
-                duracao_segundos
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                """
+                INSERT INTO log_ingestao 
+                (arquivo_nome, registros_total, registros_sucesso, registros_erro, 
+                 usou_ia, script_id, duracao_segundos)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    arquivo_nome,
+                    registros_total,
+                    registros_sucesso,
+                    registros_erro,
+                    usou_ia,
+                    script_id,
+                    duracao_segundos
+                )
             )
-        )
-        
-        conn.commit()
-        return True
+            
+            conn.commit()
+            return True
         
     except Exception as e:
-        if conn:
-            conn.rollback()
         st.error(f"Erro ao registrar log de ingestão: {e}")
         return False
-        
-    finally:
-        if conn:
-            conn.close()
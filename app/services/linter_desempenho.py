@@ -0,0 +1,178 @@
+import ast
+import os
+from pathlib import Path
+from app.services.conexao_db import emprestar_conexao
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+PONTUACAO_MINIMA = int(os.getenv("SCRIPT_PONTUACAO_MINIMA", 70))
+
+# Penalidade de cada padrao lento; a pontuacao parte de 100
+PESOS = {
+    "iterrows": 40,
+    "itertuples_em_laco": 30,
+    "apply_por_linha": 30,
+    "laco_sobre_dataframe": 30,
+    "to_datetime_sem_formato": 10,
+    "copia_em_laco": 20,
+    "concat_em_laco": 25,
+    "acesso_escalar_em_laco": 15,
+}
+
+MENSAGENS = {
+    "iterrows": "iterrows() cria uma Series por linha; use operacoes vetorizadas por coluna",
+    "itertuples_em_laco": "itertuples() em laco processa linha a linha em Python",
+    "apply_por_linha": "apply(axis=1) chama uma funcao Python por linha; prefira operacoes por coluna, np.where ou .map",
+    "laco_sobre_dataframe": "Laco Python sobre as linhas do DataFrame; use operacoes vetorizadas",
+    "to_datetime_sem_formato": "pd.to_datetime sem 'format' infere o formato valor a valor",
+    "copia_em_laco": "df.copy() dentro de laco duplica o DataFrame a cada iteracao",
+    "concat_em_laco": "pd.concat dentro de laco copia todo o acumulado a cada iteracao",
+    "acesso_escalar_em_laco": "Atribuicao com .loc/.at/.iloc dentro de laco altera uma celula por vez",
+}
+
+
+def _e_chamada(no, metodo: str) -> bool:
+    return isinstance(no, ast.Call) and isinstance(no.func, ast.Attribute) and no.func.attr == metodo
+
+
+def _dataframe_ou_coluna(no) -> bool:
+    # df ou df['coluna']; df[['a', 'b']] devolve outro DataFrame e iterar nele percorre rotulos
+    if isinstance(no, ast.Subscript):
+        return isinstance(no.slice, ast.Constant) and isinstance(no.value, ast.Name) and no.value.id == "df"
+    return isinstance(no, ast.Name) and no.id == "df"
+
+
+def _itera_linhas(no) -> bool:
+    # for x in df / df['x'] / df.values / df.index; .columns, .dtypes e .items() percorrem colunas
+    if isinstance(no, ast.Attribute) and no.attr in ("values", "index"):
+        return _dataframe_ou_coluna(no.value)
+    return _dataframe_ou_coluna(no)
+
+
+class _Analisador(ast.NodeVisitor):
+    def __init__(self):
+        self.problemas = []
+        self._profundidade_laco = 0
+
+    def _registrar(self, no, padrao: str):
+        self.problemas.append({
+            "linha": getattr(no, "lineno", None),
+            "padrao": padrao,
+            "mensagem": MENSAGENS[padrao],
+            "peso": PESOS[padrao],
+        })
+
+    def _visitar_laco(self, no):
+        self._profundidade_laco += 1
+        self.generic_visit(no)
+        self._profundidade_laco -= 1
+
+    def visit_For(self, no):
+        iteravel = no.iter
+        if _e_chamada(iteravel, "iterrows"):
+            pass  # ja sinalizado como iterrows
+        elif _e_chamada(iteravel, "itertuples"):
+            self._registrar(no, "itertuples_em_laco")
+        elif _itera_linhas(iteravel):
+            self._registrar(no, "laco_sobre_dataframe")
+        elif (
+            isinstance(iteravel, ast.Call) and isinstance(iteravel.func, ast.Name) and iteravel.func.id == "range"
+            and any(
+                isinstance(a, ast.Call) and isinstance(a.func, ast.Name) and a.func.id == "len" and a.args and _itera_linhas(a.args[0])
+                for a in iteravel.args
+            )
+        ):
+            # for i in range(len(df))
+            self._registrar(no, "laco_sobre_dataframe")
+        self._visitar_laco(no)
+
+    visit_While = _visitar_laco
+
+    def visit_comprehension(self, no):
+        if _e_chamada(no.iter, "itertuples"):
+            self._registrar(no.iter, "itertuples_em_laco")
+        self.generic_visit(no)
+
+    def visit_Call(self, no):
+        if isinstance(no.func, ast.Attribute):
+            metodo = no.func.attr
+
+            if metodo == "iterrows":
+                self._registrar(no, "iterrows")
+
+            elif metodo == "apply":
+                eixo = next((k.value for k in no.keywords if k.arg == "axis"), None)
+                if isinstance(eixo, ast.Constant) and eixo.value in (1, "columns"):
+                    self._registrar(no, "apply_por_linha")
+
+            elif metodo == "to_datetime" and not any(k.arg == "format" for k in no.keywords):
+                self._registrar(no, "to_datetime_sem_formato")
+
+            elif self._profundidade_laco and metodo == "copy":
+                self._registrar(no, "copia_em_laco")
+
+            elif self._profundidade_laco and metodo == "concat":
+                self._registrar(no, "concat_em_laco")
+
+        self.generic_visit(no)
+
+    def visit_Assign(self, no):
+        if self._profundidade_laco:
+            for alvo in no.targets:
+                if (
+                    isinstance(alvo, ast.Subscript) and isinstance(alvo.value, ast.Attribute)
+                    and alvo.value.attr in ("loc", "at", "iloc", "iat")
+                ):
+                    self._registrar(no, "acesso_escalar_em_laco")
+        self.generic_visit(no)
+
+
+def analisar_desempenho(codigo: str) -> dict:
+    try:
+        arvore = ast.parse(codigo)
+    except SyntaxError:
+        return {"pontuacao": None, "problemas": []}
+
+    analisador = _Analisador()
+    analisador.visit(arvore)
+    problemas = sorted(analisador.problemas, key=lambda p: (p["linha"] or 0))
+
+    return {
+        "pontuacao": max(0, 100 - sum(p["peso"] for p in problemas)),
+        "problemas": problemas,
+    }
+
+
+def precisa_vetorizar(analise: dict) -> bool:
+    return analise["pontuacao"] is not None and analise["pontuacao"] < PONTUACAO_MINIMA
+
+
+def descrever_problemas(analise: dict) -> str:
+    return "\n".join(f"- Linha {p['linha']}: {p['mensagem']}" for p in analise["problemas"])
+
+
+# =============================================================================
+# PONTUACAO NO CACHE DE SCRIPTS
+# =============================================================================
+
+def registrar_pontuacao(cursor, hash_estrutura: str, script: str):
+    cursor.execute(
+        "UPDATE scripts_transformacao SET pontuacao_desempenho = ? WHERE hash_estrutura = ?",
+        (analisar_desempenho(script)["pontuacao"], hash_estrutura)
+    )
+
+
+def init_pontuacao_scripts(db_path=DB_PATH):
+    with emprestar_conexao(db_path) as conn:
+        cursor = conn.cursor()
+
+        colunas_existentes = {row[1] for row in cursor.execute("PRAGMA table_info(scripts_transformacao)")}
+        if "pontuacao_desempenho" not in colunas_existentes:
+            cursor.execute("ALTER TABLE scripts_transformacao ADD COLUMN pontuacao_desempenho INTEGER")
+
+        # Scripts cacheados antes do linter recebem a pontuacao uma unica vez
+        cursor.execute("SELECT hash_estrutura, script_python FROM scripts_transformacao WHERE pontuacao_desempenho IS NULL")
+        for hash_estrutura, script in cursor.fetchall():
+            registrar_pontuacao(cursor, hash_estrutura, script)
+
+        conn.commit()
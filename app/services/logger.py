@@ -1,62 +1,85 @@
 import streamlit as st
-import sqlite3
 import hashlib
 import streamlit as st
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
+from app.services.conexao_db import emprestar_conexao
 
 DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
 
+SQL_TABELA_MONITORAMENTO = """
+    CREATE TABLE IF NOT EXISTS monitoramento_processamento (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        arquivo_hash TEXT NOT NULL,
+        arquivo_nome TEXT NOT NULL,
+        origem_correcao TEXT CHECK (origem_correcao IN ('IA', 'CACHE', 'REGRAS', 'NENHUMA')),
+        tokens_gastos INTEGER DEFAULT 0,
+        tokens_economizados INTEGER DEFAULT 0,
+        tentativas_ia INTEGER DEFAULT 0,
+        registros_inseridos INTEGER DEFAULT 0,
+        registros_duplicados INTEGER DEFAULT 0,
+        registros_erros INTEGER DEFAULT 0,       
+        status TEXT NOT NULL CHECK (status IN ('CONCLUIDO', 'FALHA', 'INTERROMPIDO', 'PENDENTE', 'CANCELADO', 'PROCESSANDO')),
+        etapa_final TEXT,
+        tipo_erro TEXT,
+        mensagem_erro TEXT,
+        duracao_segundos REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+COLUNAS_MONITORAMENTO = """
+    id, arquivo_hash, arquivo_nome, origem_correcao, tokens_gastos, tokens_economizados, tentativas_ia,
+    registros_inseridos, registros_duplicados, registros_erros, status, etapa_final, tipo_erro,
+    mensagem_erro, duracao_segundos, created_at
+"""
+
 def init_logger_table():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with emprestar_conexao(DB_PATH) as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'monitoramento_processamento'")
+            tabela_existente = cursor.fetchone()
+            migrar_origens = tabela_existente is not None and "'REGRAS'" not in tabela_existente[0]
+        
+            if migrar_origens:
+                # O SQLite nao altera CHECK existente: a tabela e recriada preservando o historico
+                cursor.execute("PRAGMA legacy_alter_table = ON")
+                cursor.execute("ALTER TABLE monitoramento_processamento RENAME TO monitoramento_processamento_legado")
+                cursor.execute("PRAGMA legacy_alter_table = OFF")
+        
+            cursor.execute(SQL_TABELA_MONITORAMENTO)
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS monitoramento_processamento (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                arquivo_hash TEXT NOT NULL,
-                arquivo_nome TEXT NOT NULL,
-                origem_correcao TEXT CHECK (origem_correcao IN ('IA', 'CACHE', 'NENHUMA')),
-                tokens_gastos INTEGER DEFAULT 0,
-                tokens_economizados INTEGER DEFAULT 0,
-                tentativas_ia INTEGER DEFAULT 0,
-                registros_inseridos INTEGER DEFAULT 0,
-                registros_duplicados INTEGER DEFAULT 0,
-                registros_erros INTEGER DEFAULT 0,       
-                status TEXT NOT NULL CHECK (status IN ('CONCLUIDO', 'FALHA', 'INTERROMPIDO', 'PENDENTE', 'CANCELADO', 'PROCESSANDO')),
-                etapa_final TEXT,
-                tipo_erro TEXT,
-                mensagem_erro TEXT,
-                duracao_segundos REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            if migrar_origens:
+                cursor.execute(f"""
+                    INSERT INTO monitoramento_processamento ({COLUNAS_MONITORAMENTO})
+                    SELECT {COLUNAS_MONITORAMENTO} FROM monitoramento_processamento_legado
+                """)
+                cursor.execute("DROP TABLE monitoramento_processamento_legado")
         
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_hash ON monitoramento_processamento(arquivo_hash)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_status ON monitoramento_processamento(status)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_data ON monitoramento_processamento(created_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_hash ON monitoramento_processamento(arquivo_hash)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_status ON monitoramento_processamento(status)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_log_data ON monitoramento_processamento(created_at)")
         
-        conn.commit()
-        conn.close()
+            conn.commit()
     except Exception as e:
         st.error(f"Erro ao inicializar tabela de logs: {e}")
 
 def carregar_dados():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        query = """
-            SELECT 
-                id, arquivo_nome, origem_correcao, 
-                tokens_gastos, tokens_economizados, tentativas_ia,
-                registros_inseridos, registros_duplicados, registros_erros, status, 
-                etapa_final, tipo_erro, mensagem_erro, duracao_segundos, created_at
-            FROM monitoramento_processamento
-            ORDER BY created_at DESC
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        with emprestar_conexao(DB_PATH, somente_leitura=True) as conn:
+            query = """
+                SELECT 
+                    id, arquivo_nome, origem_correcao, 
+                    tokens_gastos, tokens_economizados, tentativas_ia,
+                    registros_inseridos, registros_duplicados, registros_erros, status, 
+                    etapa_final, tipo_erro, mensagem_erro, duracao_segundos, created_at
+                FROM monitoramento_processamento
+                ORDER BY created_at DESC
+            """
+            df = pd.read_sql_query(query, conn)
         
         df['created_at'] = pd.to_datetime(df['created_at'])
         return df
@@ -125,70 +148,69 @@ class LogMonitoramento:
 
     def _salvar_log_no_banco(self):
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
+            with emprestar_conexao(DB_PATH) as conn:
+                cursor = conn.cursor()
             
-            # Se ainda não tem ID, faz INSERT
-            if self.db_id is None:
-                cursor.execute("""
-                    INSERT INTO monitoramento_processamento 
-                    (arquivo_hash, arquivo_nome, origem_correcao, tokens_gastos, tokens_economizados, tentativas_ia,
-                    registros_inseridos, registros_duplicados, registros_erros, status, 
-                    etapa_final, tipo_erro, mensagem_erro, duracao_segundos)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    self.dados.get("hash"),
-                    self.dados.get("nome"),
-                    self.dados.get("origem_correcao", "NENHUMA"),
-                    self.dados.get("tokens", 0),
-                    self.dados.get("tokens_economizados", 0),
-                    self.dados.get("tentativas_ia", 0),
-                    self.dados.get("inseridos", 0),      
-                    self.dados.get("duplicados", 0),  
-                    self.dados.get("erros", 0),       
-                    self.dados.get("status"),
-                    self.dados.get("etapa"),
-                    self.dados.get("tipo_erro"),
-                    self.dados.get("mensagem_erro"),
-                    self.dados.get("duracao", 0.0)
-                ))
-                # Captura o ID da linha recém criada e guarda na memória
-                self.db_id = cursor.lastrowid
+                # Se ainda não tem ID, faz INSERT
+                if self.db_id is None:
+                    cursor.execute("""
+                        INSERT INTO monitoramento_processamento 
+                        (arquivo_hash, arquivo_nome, origem_correcao, tokens_gastos, tokens_economizados, tentativas_ia,
+                        registros_inseridos, registros_duplicados, registros_erros, status, 
+                        etapa_final, tipo_erro, mensagem_erro, duracao_segundos)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        self.dados.get("hash"),
+                        self.dados.get("nome"),
+                        self.dados.get("origem_correcao", "NENHUMA"),
+                        self.dados.get("tokens", 0),
+                        self.dados.get("tokens_economizados", 0),
+                        self.dados.get("tentativas_ia", 0),
+                        self.dados.get("inseridos", 0),      
+                        self.dados.get("duplicados", 0),  
+                        self.dados.get("erros", 0),       
+                        self.dados.get("status"),
+                        self.dados.get("etapa"),
+                        self.dados.get("tipo_erro"),
+                        self.dados.get("mensagem_erro"),
+                        self.dados.get("duracao", 0.0)
+                    ))
+                    # Captura o ID da linha recém criada e guarda na memória
+                    self.db_id = cursor.lastrowid
             
-            # Se JÁ tem ID, faz UPDATE
-            else:
-                cursor.execute("""
-                    UPDATE monitoramento_processamento SET
-                        origem_correcao = ?,
-                        tokens_gastos = ?,
-                        tokens_economizados = ?,
-                        tentativas_ia = ?,
-                        registros_inseridos = ?,
-                        registros_duplicados = ?,
-                        registros_erros = ?,
-                        status = ?,
-                        etapa_final = ?,
-                        tipo_erro = ?,
-                        mensagem_erro = ?,
-                        duracao_segundos = ?
-                    WHERE id = ?
-                """, (
-                    self.dados.get("origem_correcao", "NENHUMA"),
-                    self.dados.get("tokens", 0),
-                    self.dados.get("tokens_economizados", 0),
-                    self.dados.get("tentativas_ia", 0),
-                    self.dados.get("inseridos", 0),      
-                    self.dados.get("duplicados", 0),  
-                    self.dados.get("erros", 0),       
-                    self.dados.get("status"),
-                    self.dados.get("etapa"),
-                    self.dados.get("tipo_erro"),
-                    self.dados.get("mensagem_erro"),
-                    self.dados.get("duracao", 0.0),
-                    self.db_id
-                ))
+                # Se JÁ tem ID, faz UPDATE
+                else:
+                    cursor.execute("""
+                        UPDATE monitoramento_processamento SET
+                            origem_correcao = ?,
+                            tokens_gastos = ?,
+                            tokens_economizados = ?,
+                            tentativas_ia = ?,
+                            registros_inseridos = ?,
+                            registros_duplicados = ?,
+                            registros_erros = ?,
+                            status = ?,
+                            etapa_final = ?,
+                            tipo_erro = ?,
+                            mensagem_erro = ?,
+                            duracao_segundos = ?
+                        WHERE id = ?
+                    """, (
+                        self.dados.get("origem_correcao", "NENHUMA"),
+                        self.dados.get("tokens", 0),
+                        self.dados.get("tokens_economizados", 0),
+                        self.dados.get("tentativas_ia", 0),
+                        self.dados.get("inseridos", 0),      
+                        self.dados.get("duplicados", 0),  
+                        self.dados.get("erros", 0),       
+                        self.dados.get("status"),
+                        self.dados.get("etapa"),
+                        self.dados.get("tipo_erro"),
+                        self.dados.get("mensagem_erro"),
+                        self.dados.get("duracao", 0.0),
+                        self.db_id
+                    ))
             
-            conn.commit()
-            conn.close()
+                conn.commit()
         except Exception as e:
             st.error(f"Erro ao salvar log no banco: {e}")
\ No newline at end of file
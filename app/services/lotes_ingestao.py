@@ -0,0 +1,65 @@
+import streamlit as st
+import pandas as pd
+
+from app.services.conexao_db import emprestar_conexao
+from app.services.filtro_ids import obter_indice_ids
+from app.services.insert_data import DB_PATH, _garantir_tabela_checkpoints
+
+def init_lotes_ingestao(db_path=DB_PATH):
+    # Bancos criados antes do lote_id: as linhas antigas ficam sem lote e nao podem ser desfeitas
+    try:
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            for tabela in ("transacoes_financeiras", "checkpoints_insercao"):
+                colunas = {linha[1] for linha in cursor.execute(f"PRAGMA table_info({tabela})")}
+                if colunas and "lote_id" not in colunas:
+                    referencia = " REFERENCES monitoramento_processamento(id)" if tabela == "transacoes_financeiras" else ""
+                    cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN lote_id INTEGER{referencia}")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_lote_id ON transacoes_financeiras(lote_id)")
+            conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao inicializar lotes de ingestao: {e}")
+
+def listar_lotes(db_path=DB_PATH, limite: int = 100) -> pd.DataFrame:
+    # Importacoes com linhas gravadas, da mais recente para a mais antiga
+    with emprestar_conexao(db_path, somente_leitura=True) as conn:
+        return pd.read_sql_query(
+            """
+            SELECT m.id AS lote_id, m.arquivo_nome, m.status, m.created_at, t.registros
+            FROM (
+                SELECT lote_id, COUNT(*) AS registros
+                FROM transacoes_financeiras
+                WHERE lote_id IS NOT NULL
+                GROUP BY lote_id
+            ) t
+            JOIN monitoramento_processamento m ON m.id = t.lote_id
+            ORDER BY m.id DESC
+            LIMIT ?
+            """,
+            conn,
+            params=(limite,)
+        )
+
+def remover_lote(lote_id: int, db_path=DB_PATH) -> int:
+    # Um DELETE pelo indice de lote_id; checkpoints do lote saem junto para que
+    # uma reimportacao do mesmo arquivo grave tudo de novo
+    with emprestar_conexao(db_path) as conn:
+        cursor = conn.cursor()
+        _garantir_tabela_checkpoints(cursor)
+        cursor.execute("DELETE FROM transacoes_financeiras WHERE lote_id = ?", (lote_id,))
+        removidas = cursor.rowcount
+        cursor.execute("DELETE FROM checkpoints_insercao WHERE lote_id = ?", (lote_id,))
+        cursor.execute(
+            """
+            UPDATE monitoramento_processamento
+            SET status = 'CANCELADO', etapa_final = 'LOTE_REMOVIDO', registros_inseridos = 0
+            WHERE id = ?
+            """,
+            (lote_id,)
+        )
+        conn.commit()
+
+    # IDs removidos continuam no filtro como falsos positivos e apenas custam uma consulta;
+    # a sincronizacao ajusta a marca de rowid caso o lote estivesse no fim da tabela
+    obter_indice_ids(db_path).sincronizar()
+    return removidas
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from app.services.conexao_db import emprestar_conexao
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+LIMITE_ENTRADAS = int(os.getenv("SCRIPT_CACHE_MAX_ENTRADAS", 500))
+LIMITE_BYTES = int(os.getenv("SCRIPT_CACHE_MAX_BYTES", 5 * 1024 * 1024))
+LOTE_MANUTENCAO = 50
+INTERVALO_MANUTENCAO_SEGUNDOS = 300
+PAUSA_ENTRE_LOTES_SEGUNDOS = 0.05
+
+_lock_manutencao = threading.Lock()
+_estado_manutencao = {"ultima_execucao": 0.0, "thread": None, "ultimo_resultado": None}
+
+
+def compactar_custos_scripts(db_path=DB_PATH, lote: int = LOTE_MANUTENCAO) -> int:
+    # Consolida script_costs em uma unica linha por script:
+    # custo_tokens = custo da geracao mais recente, custo_acumulado = soma de todas as geracoes
+    with emprestar_conexao(db_path) as conn:
+        cursor = conn.cursor()
+        linhas_removidas = 0
+
+        cursor.execute("""
+            DELETE FROM script_costs
+            WHERE script_id NOT IN (SELECT id FROM scripts_transformacao)
+        """)
+        linhas_removidas += cursor.rowcount
+        conn.commit()
+
+        while True:
+            cursor.execute(
+                """
+                SELECT
+                    script_id,
+                    MAX(id) AS ultimo_id,
+                    SUM(COALESCE(custo_acumulado, custo_tokens, 0)) AS total,
+                    SUM(COALESCE(geracoes, 1)) AS qtd_geracoes
+                FROM script_costs
+                GROUP BY script_id
+                HAVING COUNT(*) > 1
+                LIMIT ?
+                """,
+                (lote,)
+            )
+            agregados = cursor.fetchall()
+
+            if not agregados:
+                break
+
+            for script_id, ultimo_id, total, qtd_geracoes in agregados:
+                cursor.execute(
+                    "UPDATE script_costs SET custo_acumulado = ?, geracoes = ? WHERE id = ?",
+                    (total, qtd_geracoes, ultimo_id)
+                )
+                cursor.execute(
+                    "DELETE FROM script_costs WHERE script_id = ? AND id <> ?",
+                    (script_id, ultimo_id)
+                )
+                linhas_removidas += cursor.rowcount
+
+            conn.commit()
+            time.sleep(PAUSA_ENTRE_LOTES_SEGUNDOS)
+
+        return linhas_removidas
+
+
+def _uso_atual_cache(cursor):
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(script_python AS BLOB))), 0)
+        FROM scripts_transformacao
+    """)
+    return cursor.fetchone()
+
+
+def _remover_dependentes(cursor, ids_remover: list, hashes_remover: list):
+    # Perfis, variantes e regeneracoes pendentes dos scripts descartados saem na mesma transacao;
+    # as tabelas de desempenho so existem depois de init_perfil_scripts_tables
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('script_execucoes', 'script_variantes', 'fila_regeneracao')"
+    )
+    tabelas = {row[0] for row in cursor.fetchall()}
+
+    marcadores_ids = ",".join(["?"] * len(ids_remover))
+    marcadores_hashes = ",".join(["?"] * len(hashes_remover))
+    if "script_execucoes" in tabelas:
+        cursor.execute(
+            f"DELETE FROM script_execucoes WHERE script_id IN ({marcadores_ids}) OR hash_estrutura IN ({marcadores_hashes})",
+            ids_remover + hashes_remover
+        )
+    if "script_variantes" in tabelas:
+        cursor.execute(f"DELETE FROM script_variantes WHERE hash_estrutura IN ({marcadores_hashes})", hashes_remover)
+    if "fila_regeneracao" in tabelas:
+        cursor.execute(
+            f"DELETE FROM fila_regeneracao WHERE script_id IN ({marcadores_ids}) OR hash_estrutura IN ({marcadores_hashes})",
+            ids_remover + hashes_remover
+        )
+
+
+def aplicar_limites_cache(limite_entradas: int = LIMITE_ENTRADAS, limite_bytes: int = LIMITE_BYTES,
+                          db_path=DB_PATH, lote: int = LOTE_MANUTENCAO) -> int:
+    # Remove entradas frias ate respeitar os limites. A prioridade de descarte combina
+    # frequencia (vezes_utilizado) e idade (dias desde o ultimo uso em updated_at).
+    with emprestar_conexao(db_path) as conn:
+        cursor = conn.cursor()
+        removidos = 0
+
+        while True:
+            total_entradas, total_bytes = _uso_atual_cache(cursor)
+            excesso_entradas = total_entradas - limite_entradas
+            excesso_bytes = total_bytes - limite_bytes
+
+            if excesso_entradas <= 0 and excesso_bytes <= 0:
+                break
+
+            cursor.execute(
+                """
+                SELECT id, hash_estrutura, LENGTH(CAST(script_python AS BLOB))
+                FROM scripts_transformacao
+                ORDER BY
+                    COALESCE(vezes_utilizado, 0) / (1.0 + julianday('now') - julianday(COALESCE(updated_at, created_at))) ASC,
+                    updated_at ASC
+                LIMIT ?
+                """,
+                (lote,)
+            )
+            candidatos = cursor.fetchall()
+
+            if not candidatos:
+                break
+
+            ids_remover = []
+            hashes_remover = []
+            for script_id, hash_estrutura, tamanho in candidatos:
+                if excesso_entradas <= 0 and excesso_bytes <= 0:
+                    break
+                ids_remover.append(script_id)
+                hashes_remover.append(hash_estrutura)
+                excesso_entradas -= 1
+                excesso_bytes -= tamanho or 0
+
+            placeholders = ",".join(["?"] * len(ids_remover))
+            cursor.execute(f"DELETE FROM script_costs WHERE script_id IN ({placeholders})", ids_remover)
+            _remover_dependentes(cursor, ids_remover, hashes_remover)
+            cursor.execute(f"DELETE FROM scripts_transformacao WHERE id IN ({placeholders})", ids_remover)
+            conn.commit()
+            removidos += len(ids_remover)
+
+            time.sleep(PAUSA_ENTRE_LOTES_SEGUNDOS)
+
+        return removidos
+
+
+def executar_manutencao_cache(db_path=DB_PATH) -> dict:
+    custos_compactados = compactar_custos_scripts(db_path)
+    scripts_removidos = aplicar_limites_cache(db_path=db_path)
+
+    return {
+        "custos_compactados": custos_compactados,
+        "scripts_removidos": scripts_removidos
+    }
+
+
+def _rodar_manutencao_em_segundo_plano(db_path):
+    try:
+        _estado_manutencao["ultimo_resultado"] = executar_manutencao_cache(db_path)
+    except sqlite3.Error as e:
+        _estado_manutencao["ultimo_resultado"] = {"erro": str(e)}
+    finally:
+        with _lock_manutencao:
+            _estado_manutencao["thread"] = None
+
+
+def agendar_manutencao_cache(db_path=DB_PATH, forcar: bool = False) -> bool:
+    if not Path(db_path).exists():
+        return False
+
+    with _lock_manutencao:
+        if _estado_manutencao["thread"] is not None:
+            return False
+
+        agora = time.time()
+        if not forcar and agora - _estado_manutencao["ultima_execucao"] < INTERVALO_MANUTENCAO_SEGUNDOS:
+            return False
+
+        _estado_manutencao["ultima_execucao"] = agora
+        thread = threading.Thread(
+            target=_rodar_manutencao_em_segundo_plano,
+            args=(db_path,),
+            name="manutencao-cache-scripts",
+            daemon=True
+        )
+        _estado_manutencao["thread"] = thread
+        thread.start()
+        return True
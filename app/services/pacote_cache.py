@@ -0,0 +1,201 @@
+import argparse
+import gzip
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from app.services.script_cache import registrar_codigo_compilado
+from app.services.linter_desempenho import registrar_pontuacao, init_pontuacao_scripts
+from app.services.conexao_db import emprestar_conexao
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+FORMATO_PACOTE = "script-cache-bundle"
+VERSAO_PACOTE = 1
+ESTRATEGIAS_CONFLITO = ("mais_recente", "mais_usado", "manter_local", "sobrescrever")
+
+
+def _ler_entradas_locais(cursor) -> dict:
+    cursor.execute("""
+        SELECT
+            s.hash_estrutura, s.script_python, s.descricao, s.vezes_utilizado,
+            s.created_at, s.updated_at,
+            COALESCE(c.custo_tokens, 0) AS custo_tokens,
+            COALESCE(c.custo_acumulado, c.custo_tokens, 0) AS custo_acumulado,
+            COALESCE(c.geracoes, 1) AS geracoes
+        FROM scripts_transformacao s
+        LEFT JOIN script_costs c ON s.id = c.script_id
+    """)
+    return {row["hash_estrutura"]: dict(row) for row in cursor.fetchall()}
+
+
+def gerar_pacote_cache(db_path=DB_PATH) -> bytes:
+    with emprestar_conexao(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        entradas = list(_ler_entradas_locais(conn.cursor()).values())
+
+    pacote = {
+        "formato": FORMATO_PACOTE,
+        "versao": VERSAO_PACOTE,
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "entradas": entradas
+    }
+
+    return gzip.compress(json.dumps(pacote, ensure_ascii=False).encode("utf-8"))
+
+
+def ler_pacote_cache(conteudo: bytes) -> dict:
+    try:
+        pacote = json.loads(gzip.decompress(conteudo).decode("utf-8"))
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Pacote de cache invalido: {e}")
+
+    if pacote.get("formato") != FORMATO_PACOTE:
+        raise ValueError("Arquivo nao e um pacote de cache de scripts")
+
+    versao = pacote.get("versao")
+    if not isinstance(versao, int) or versao > VERSAO_PACOTE:
+        raise ValueError(f"Versao de pacote nao suportada: {versao}")
+
+    return pacote
+
+
+def _remota_vence(local: dict, remota: dict, estrategia: str) -> bool:
+    if estrategia == "sobrescrever":
+        return True
+    if estrategia == "manter_local":
+        return False
+    if estrategia == "mais_usado":
+        return (remota.get("vezes_utilizado") or 0) > (local.get("vezes_utilizado") or 0)
+    return (remota.get("updated_at") or "") > (local.get("updated_at") or "")
+
+
+def importar_pacote_cache(conteudo: bytes, estrategia: str = "mais_recente", db_path=DB_PATH) -> dict:
+    if estrategia not in ESTRATEGIAS_CONFLITO:
+        raise ValueError(f"Estrategia de conflito desconhecida: {estrategia}")
+
+    pacote = ler_pacote_cache(conteudo)
+
+    resumo = {"inseridos": 0, "atualizados": 0, "mantidos": 0, "invalidos": 0}
+
+    with emprestar_conexao(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        locais = _ler_entradas_locais(cursor)
+
+        for remota in pacote.get("entradas", []):
+            hash_estrutura = remota.get("hash_estrutura")
+            script = remota.get("script_python")
+
+            if not hash_estrutura or not script:
+                resumo["invalidos"] += 1
+                continue
+
+            # Bytecode de outro no nunca e importado: o que executa e sempre o fonte compilado aqui
+            try:
+                codigo = compile(script, filename='<script_ia>', mode='exec')
+            except SyntaxError:
+                resumo["invalidos"] += 1
+                continue
+
+            local = locais.get(hash_estrutura)
+
+            if local is None:
+                cursor.execute(
+                    """
+                    INSERT INTO scripts_transformacao
+                    (hash_estrutura, script_python, descricao, vezes_utilizado, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+                    """,
+                    (
+                        hash_estrutura,
+                        script,
+                        remota.get("descricao"),
+                        remota.get("vezes_utilizado") or 1,
+                        remota.get("created_at"),
+                        remota.get("updated_at")
+                    )
+                )
+                script_id = cursor.lastrowid
+                resumo["inseridos"] += 1
+
+            elif _remota_vence(local, remota, estrategia) and local["script_python"] != script:
+                cursor.execute(
+                    """
+                    UPDATE scripts_transformacao SET
+                        script_python = ?,
+                        descricao = ?,
+                        vezes_utilizado = MAX(vezes_utilizado, ?),
+                        updated_at = COALESCE(?, CURRENT_TIMESTAMP)
+                    WHERE hash_estrutura = ?
+                    """,
+                    (
+                        script,
+                        remota.get("descricao"),
+                        remota.get("vezes_utilizado") or 1,
+                        remota.get("updated_at"),
+                        hash_estrutura
+                    )
+                )
+                cursor.execute("SELECT id FROM scripts_transformacao WHERE hash_estrutura = ?", (hash_estrutura,))
+                script_id = cursor.fetchone()[0]
+                resumo["atualizados"] += 1
+
+            else:
+                cursor.execute(
+                    "UPDATE scripts_transformacao SET vezes_utilizado = MAX(vezes_utilizado, ?) WHERE hash_estrutura = ?",
+                    (remota.get("vezes_utilizado") or 1, hash_estrutura)
+                )
+                resumo["mantidos"] += 1
+                continue
+
+            registrar_pontuacao(cursor, hash_estrutura, script)
+
+            cursor.execute(
+                """
+                INSERT INTO script_costs (script_id, custo_tokens, custo_acumulado, geracoes)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(script_id) DO UPDATE SET
+                    custo_tokens = excluded.custo_tokens,
+                    custo_acumulado = MAX(COALESCE(script_costs.custo_acumulado, 0), excluded.custo_acumulado),
+                    geracoes = MAX(COALESCE(script_costs.geracoes, 1), excluded.geracoes)
+                """,
+                (
+                    script_id,
+                    remota.get("custo_tokens") or 0,
+                    remota.get("custo_acumulado") or remota.get("custo_tokens") or 0,
+                    remota.get("geracoes") or 1
+                )
+            )
+
+            registrar_codigo_compilado(script, codigo)
+
+        conn.commit()
+        return resumo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta ou importa o cache de scripts de correcao.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    exportar = subparsers.add_parser("exportar", help="Gera um pacote .json.gz com o cache local")
+    exportar.add_argument("destino", type=Path)
+
+    importar = subparsers.add_parser("importar", help="Mescla um pacote no cache local")
+    importar.add_argument("origem", type=Path)
+    importar.add_argument("--estrategia", choices=ESTRATEGIAS_CONFLITO, default="mais_recente")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "exportar":
+        args.destino.write_bytes(gerar_pacote_cache())
+        print(f"Pacote gerado em {args.destino}")
+    else:
+        init_pontuacao_scripts()
+        resumo = importar_pacote_cache(args.origem.read_bytes(), estrategia=args.estrategia)
+        print(json.dumps(resumo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import streamlit as st
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.linter_desempenho import registrar_pontuacao
+from app.services.conexao_db import emprestar_conexao
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+
+LIMIAR_LINHAS_POR_SEGUNDO = float(os.getenv("SCRIPT_MIN_LINHAS_POR_SEGUNDO", 20_000))
+REGENERACAO_AUTOMATICA = os.getenv("SCRIPT_REGENERACAO_AUTOMATICA", "1") == "1"
+# Abaixo disso o tempo e dominado por overhead fixo e nao diz nada sobre o script
+MIN_LINHAS_AVALIACAO = 1_000
+# Expoente de tempo x linhas acima do qual o script cresce pior que linear (ex: apply com buscas)
+EXPOENTE_ESCALA_RUIM = 1.3
+
+
+def gerar_hash_script(script: str) -> str:
+    return hashlib.sha256(script.encode("utf-8")).hexdigest()
+
+
+def init_perfil_scripts_tables(db_path=DB_PATH):
+    try:
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS script_execucoes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    script_id INTEGER,
+                    hash_estrutura TEXT,
+                    hash_script TEXT NOT NULL,
+                    linhas INTEGER NOT NULL,
+                    duracao_segundos REAL NOT NULL,
+                    linhas_por_segundo REAL,
+                    memoria_pico_bytes INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_execucoes_hash_script ON script_execucoes(hash_script)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_execucoes_estrutura ON script_execucoes(hash_estrutura)")
+
+            # Todos os scripts ja validados para uma estrutura; o mais rapido vira o script do cache
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS script_variantes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    hash_estrutura TEXT NOT NULL,
+                    hash_script TEXT NOT NULL,
+                    script_python TEXT NOT NULL,
+                    descricao TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(hash_estrutura, hash_script)
+                )
+            """)
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS fila_regeneracao (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    hash_estrutura TEXT NOT NULL,
+                    hash_script TEXT NOT NULL UNIQUE,
+                    script_id INTEGER,
+                    linhas_por_segundo REAL,
+                    motivo TEXT,
+                    status TEXT NOT NULL DEFAULT 'PENDENTE' CHECK (status IN ('PENDENTE', 'PROCESSANDO', 'CONCLUIDO', 'DESCARTADO')),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            conn.commit()
+    except Exception as e:
+        st.error(f"Erro ao inicializar tabelas de desempenho de scripts: {e}")
+
+
+def registrar_execucao_script(script: str, metricas: dict, hash_estrutura: str = None, script_id: int = None, db_path=DB_PATH) -> bool:
+    try:
+        with emprestar_conexao(db_path) as conn:
+            conn.execute(
+                """
+                INSERT INTO script_execucoes
+                (script_id, hash_estrutura, hash_script, linhas, duracao_segundos, linhas_por_segundo, memoria_pico_bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    script_id,
+                    hash_estrutura,
+                    gerar_hash_script(script),
+                    metricas["linhas"],
+                    metricas["duracao_segundos"],
+                    metricas.get("linhas_por_segundo"),
+                    metricas.get("memoria_pico_bytes")
+                )
+            )
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        st.error(f"Erro ao registrar execucao do script: {e}")
+        return False
+
+
+def registrar_variante_script(hash_estrutura: str, script: str, descricao: str = None, script_id: int = None, db_path=DB_PATH):
+    hash_script = gerar_hash_script(script)
+    with emprestar_conexao(db_path) as conn:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO script_variantes (hash_estrutura, hash_script, script_python, descricao)
+            VALUES (?, ?, ?, ?)
+            """,
+            (hash_estrutura, hash_script, script, descricao)
+        )
+        if script_id is not None:
+            # Execucoes feitas antes do script entrar no cache passam a apontar para ele
+            conn.execute(
+                "UPDATE script_execucoes SET script_id = ? WHERE hash_script = ? AND script_id IS NULL",
+                (script_id, hash_script)
+            )
+        conn.commit()
+
+
+def registrar_script_validado(hash_estrutura: str, script: str, script_id: int = None, descricao: str = None, db_path=DB_PATH) -> Optional[dict]:
+    registrar_variante_script(hash_estrutura, script, descricao, script_id, db_path)
+    return selecionar_variante_mais_rapida(hash_estrutura, db_path)
+
+
+def _vazao_por_variante(conn, hash_estrutura: str) -> pd.DataFrame:
+    # Vazao agregada = total de linhas / tempo total, para nao favorecer execucoes pequenas
+    return pd.read_sql_query(
+        """
+        SELECT
+            v.hash_script,
+            v.script_python,
+            v.descricao,
+            COUNT(e.id) AS execucoes,
+            SUM(e.linhas) * 1.0 / NULLIF(SUM(e.duracao_segundos), 0) AS linhas_por_segundo
+        FROM script_variantes v
+        JOIN script_execucoes e ON e.hash_script = v.hash_script
+        WHERE v.hash_estrutura = ?
+        GROUP BY v.hash_script
+        """,
+        conn,
+        params=(hash_estrutura,)
+    )
+
+
+def selecionar_variante_mais_rapida(hash_estrutura: str, db_path=DB_PATH) -> Optional[dict]:
+    with emprestar_conexao(db_path) as conn:
+        variantes = _vazao_por_variante(conn, hash_estrutura).dropna(subset=["linhas_por_segundo"])
+        if variantes.empty:
+            return None
+
+        melhor = variantes.sort_values("linhas_por_segundo", ascending=False).iloc[0]
+
+        cursor = conn.execute(
+            """
+            UPDATE scripts_transformacao
+            SET script_python = ?, descricao = COALESCE(?, descricao), updated_at = CURRENT_TIMESTAMP
+            WHERE hash_estrutura = ? AND script_python != ?
+            """,
+            (melhor["script_python"], melhor["descricao"], hash_estrutura, melhor["script_python"])
+        )
+        substituiu = cursor.rowcount > 0
+        if substituiu:
+            registrar_pontuacao(cursor, hash_estrutura, melhor["script_python"])
+        conn.commit()
+
+        return {
+            "hash_script": melhor["hash_script"],
+            "linhas_por_segundo": float(melhor["linhas_por_segundo"]),
+            "variantes": len(variantes),
+            "substituiu": substituiu
+        }
+
+
+def _expoente_escala(execucoes: pd.DataFrame) -> Optional[float]:
+    # Inclinacao de log(tempo) x log(linhas): ~1 e linear, >1 indica crescimento superlinear
+    amostras = execucoes[(execucoes["linhas"] >= MIN_LINHAS_AVALIACAO) & (execucoes["duracao_segundos"] > 0)]
+    if amostras["linhas"].nunique() < 2:
+        return None
+    inclinacao, _ = np.polyfit(np.log(amostras["linhas"]), np.log(amostras["duracao_segundos"]), 1)
+    return float(inclinacao)
+
+
+def carregar_perfil_scripts(db_path=DB_PATH) -> pd.DataFrame:
+    try:
+        with emprestar_conexao(db_path, somente_leitura=True) as conn:
+            execucoes = pd.read_sql_query(
+                """
+                SELECT
+                    e.hash_script, e.hash_estrutura, e.script_id, e.linhas, e.duracao_segundos,
+                    e.memoria_pico_bytes, v.id IS NOT NULL AS validado
+                FROM script_execucoes e
+                LEFT JOIN script_variantes v ON v.hash_script = e.hash_script AND v.hash_estrutura = e.hash_estrutura
+                """,
+                conn
+            )
+    except Exception as e:
+        st.error(f"Erro ao carregar desempenho dos scripts: {e}")
+        return pd.DataFrame()
+
+    if execucoes.empty:
+        return pd.DataFrame()
+
+    linhas = []
+    for hash_script, grupo in execucoes.groupby("hash_script"):
+        duracao_total = grupo["duracao_segundos"].sum()
+        vazao = grupo["linhas"].sum() / duracao_total if duracao_total > 0 else None
+        expoente = _expoente_escala(grupo)
+
+        alertas = []
+        if expoente is not None and expoente > EXPOENTE_ESCALA_RUIM:
+            alertas.append(f"Escala superlinear (t ~ n^{expoente:.2f})")
+        if vazao is not None and grupo["linhas"].max() >= MIN_LINHAS_AVALIACAO and vazao < LIMIAR_LINHAS_POR_SEGUNDO:
+            alertas.append("Abaixo do limiar de vazao")
+
+        linhas.append({
+            "script_id": grupo["script_id"].max(),
+            "hash_script": hash_script[:12],
+            "hash_estrutura": grupo["hash_estrutura"].iloc[0],
+            "validado": bool(grupo["validado"].max()),
+            "execucoes": len(grupo),
+            "linhas_max": int(grupo["linhas"].max()),
+            "tempo_medio_segundos": grupo["duracao_segundos"].mean(),
+            "linhas_por_segundo": vazao,
+            "memoria_pico_mb": grupo["memoria_pico_bytes"].max() / (1024 * 1024),
+            "expoente_escala": expoente,
+            "alerta": "; ".join(alertas)
+        })
+
+    return pd.DataFrame(linhas).sort_values("linhas_por_segundo", na_position="first")
+
+
+# =============================================================================
+# FILA DE REESCRITA VETORIZADA
+# =============================================================================
+
+def precisa_reescrita(metricas: dict) -> bool:
+    vazao = metricas.get("linhas_por_segundo")
+    return (
+        metricas.get("linhas", 0) >= MIN_LINHAS_AVALIACAO
+        and vazao is not None
+        and vazao < LIMIAR_LINHAS_POR_SEGUNDO
+    )
+
+
+def enfileirar_regeneracao(hash_estrutura: str, script: str, script_id: int, metricas: dict, db_path=DB_PATH) -> Optional[int]:
+    with emprestar_conexao(db_path) as conn:
+        cursor = conn.execute(
+            """
+            INSERT OR IGNORE INTO fila_regeneracao (hash_estrutura, hash_script, script_id, linhas_por_segundo, motivo)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                hash_estrutura,
+                gerar_hash_script(script),
+                script_id,
+                metricas.get("linhas_por_segundo"),
+                f"{metricas.get('linhas_por_segundo', 0):.0f} linhas/s abaixo do limiar de {LIMIAR_LINHAS_POR_SEGUNDO:.0f}"
+            )
+        )
+        conn.commit()
+        return cursor.lastrowid if cursor.rowcount else None
+
+
+def _atualizar_status_regeneracao(id_fila: int, status: str, db_path=DB_PATH):
+    with emprestar_conexao(db_path) as conn:
+        conn.execute(
+            "UPDATE fila_regeneracao SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, id_fila)
+        )
+        conn.commit()
+
+
+def carregar_fila_regeneracao(db_path=DB_PATH) -> pd.DataFrame:
+    try:
+        with emprestar_conexao(db_path, somente_leitura=True) as conn:
+            df = pd.read_sql_query(
+                """
+                SELECT id, script_id, hash_estrutura, linhas_por_segundo, motivo, status, created_at, updated_at
+                FROM fila_regeneracao
+                ORDER BY created_at DESC
+                """,
+                conn
+            )
+        df["created_at"] = pd.to_datetime(df["created_at"])
+        df["updated_at"] = pd.to_datetime(df["updated_at"])
+        return df
+    except Exception as e:
+        st.error(f"Erro ao carregar fila de regeneracao: {e}")
+        return pd.DataFrame()
+
+
+def _resultados_equivalentes(df_original: pd.DataFrame, df_novo: pd.DataFrame) -> bool:
+    # A reescrita so vale se produzir os mesmos dados; diferencas de dtype sao toleradas
+    try:
+        pd.testing.assert_frame_equal(df_original, df_novo, check_dtype=False)
+        return True
+    except AssertionError:
+        return False
+
+
+def _reescrever_script(id_fila, script, metricas, df, validacao, api_key, template):
+    # Roda fora da thread do Streamlit, dentro do agendador de geracao
+    from app.services.ai_code_generator import gerar_codigo_correcao_ia
+    from app.services.executor_scripts import executar_script_perfilado
+    from app.utils.data_handler import revalidar_dataframe
+
+    _atualizar_status_regeneracao(id_fila, "PROCESSANDO")
+
+    historico = f"""
+        REESCRITA DE DESEMPENHO: o script abaixo ja corrige os dados corretamente, mas processa apenas
+        {metricas['linhas_por_segundo']:.0f} linhas/s. Reescreva-o usando apenas operacoes vetorizadas do pandas
+        (sem iterrows, itertuples, apply linha a linha ou loops Python sobre as linhas), mantendo exatamente o mesmo resultado.
+
+        SCRIPT ATUAL:
+        {script}
+        """
+
+    try:
+        codigo, _, hash_estrutura, _, _, tokens, _ = gerar_codigo_correcao_ia(
+            df, validacao, True, api_key, template, historico
+        )
+        df_referencia, _ = executar_script_perfilado(script, df).result()
+        df_novo, metricas_novas = executar_script_perfilado(codigo, df).result()
+        registrar_execucao_script(codigo, metricas_novas, hash_estrutura)
+
+        if not _resultados_equivalentes(df_referencia, df_novo) or not revalidar_dataframe(df_novo, template)["valido"]:
+            _atualizar_status_regeneracao(id_fila, "DESCARTADO")
+            return None
+
+        registrar_variante_script(hash_estrutura, codigo, "Reescrita vetorizada")
+        selecionar_variante_mais_rapida(hash_estrutura)
+        _atualizar_status_regeneracao(id_fila, "CONCLUIDO")
+        return metricas_novas
+
+    except Exception:
+        _atualizar_status_regeneracao(id_fila, "DESCARTADO")
+        raise
+
+
+def solicitar_reescrita_vetorizada(hash_estrutura, script, script_id, metricas, df, validacao, api_key, template):
+    if not (REGENERACAO_AUTOMATICA and api_key and precisa_reescrita(metricas)):
+        return None
+
+    id_fila = enfileirar_regeneracao(hash_estrutura, script, script_id, metricas)
+    if id_fila is None:
+        return None
+
+    from app.services.agendador_geracao import obter_agendador
+    return obter_agendador().agendar_tarefa(
+        _reescrever_script, id_fila, script, metricas, df, validacao, api_key, template
+    )
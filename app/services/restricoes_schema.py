@@ -0,0 +1,165 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.services.helpers_correcao import parse_brl
+
+SCHEMA_PATH = Path(__file__).parent.parent.parent / "database" / "schema.sql"
+
+# Afinidade numerica do SQLite para os tipos declarados
+TIPOS_NUMERICOS = ("INT", "REAL", "FLOA", "DOUB", "DECIMAL", "NUMERIC")
+
+OPERADORES = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "=": np.equal,
+    "!=": np.not_equal,
+    "<>": np.not_equal,
+}
+
+# Colunas gravadas a partir de um conversor proprio: a verificacao usa o mesmo valor que chegara ao banco
+CONVERSORES_NUMERICOS = {
+    "valor": parse_brl,
+}
+
+def _dividir_nivel_superior(texto: str) -> list:
+    # Separa por virgulas fora de parenteses e de strings: "DECIMAL(15, 2)" e "IN ('A', 'B')" ficam inteiros
+    partes, atual, profundidade, em_string = [], [], 0, False
+    for caractere in texto:
+        if caractere == "'":
+            em_string = not em_string
+        elif not em_string and caractere == "(":
+            profundidade += 1
+        elif not em_string and caractere == ")":
+            profundidade -= 1
+        elif not em_string and caractere == "," and profundidade == 0:
+            partes.append("".join(atual).strip())
+            atual = []
+            continue
+        atual.append(caractere)
+    if "".join(atual).strip():
+        partes.append("".join(atual).strip())
+    return partes
+
+def _extrair_parenteses(texto: str, inicio: int) -> str:
+    # Conteudo entre o parentese aberto em texto[inicio] e o seu par
+    profundidade = 0
+    for posicao in range(inicio, len(texto)):
+        if texto[posicao] == "(":
+            profundidade += 1
+        elif texto[posicao] == ")":
+            profundidade -= 1
+            if profundidade == 0:
+                return texto[inicio + 1:posicao]
+    raise ValueError("Parenteses desbalanceados no schema")
+
+def _interpretar_check(expressao: str):
+    # Apenas as formas usadas no schema; as demais ficam para o banco (isolamento por bissecao)
+    expressao = " ".join(expressao.split())
+
+    em_lista = re.fullmatch(r"(\w+) IN \((.*)\)", expressao, re.IGNORECASE)
+    if em_lista:
+        valores = [v.replace("''", "'") for v in re.findall(r"'((?:[^']|'')*)'", em_lista.group(2))]
+        return {"coluna": em_lista.group(1), "tipo": "in", "valores": valores, "expressao": expressao}
+
+    comparacao = re.fullmatch(r"(\w+) ?(>=|<=|<>|!=|>|<|=) ?(-?\d+(?:\.\d+)?)", expressao)
+    if comparacao:
+        return {
+            "coluna": comparacao.group(1),
+            "tipo": "comparacao",
+            "operador": comparacao.group(2),
+            "limite": float(comparacao.group(3)),
+            "expressao": expressao,
+        }
+    return None
+
+@lru_cache(maxsize=None)
+def carregar_restricoes(schema_path=SCHEMA_PATH, tabela: str = "transacoes_financeiras") -> dict:
+    with open(schema_path, "r", encoding="utf-8") as f:
+        sql = re.sub(r"--[^\n]*", "", f.read())
+
+    criacao = re.search(rf"CREATE TABLE (?:IF NOT EXISTS )?{tabela}\s*\(", sql, re.IGNORECASE)
+    if not criacao:
+        raise ValueError(f"Tabela {tabela} nao encontrada em {schema_path}")
+    corpo = _extrair_parenteses(sql, criacao.end() - 1)
+
+    restricoes = {}
+    for definicao in _dividir_nivel_superior(corpo):
+        partes = definicao.split()
+        if partes[0].upper() in ("PRIMARY", "UNIQUE", "CHECK", "FOREIGN", "CONSTRAINT"):
+            continue
+
+        coluna = partes[0]
+        tipo = partes[1].upper() if len(partes) > 1 else ""
+        checks = []
+        for marcador in re.finditer(r"\bCHECK\s*\(", definicao, re.IGNORECASE):
+            check = _interpretar_check(_extrair_parenteses(definicao, marcador.end() - 1))
+            if check:
+                checks.append(check)
+
+        restricoes[coluna] = {
+            "tipo": tipo,
+            "numerico": any(t in tipo for t in TIPOS_NUMERICOS),
+            "not_null": re.search(r"\bNOT NULL\b", definicao, re.IGNORECASE) is not None,
+            "checks": checks,
+        }
+    return restricoes
+
+def numerar_linhas(df: pd.DataFrame) -> list:
+    # Mesma numeracao dos erros de insercao: indice + 1 quando inteiro, senao a posicao
+    return (df.index + 1).tolist() if pd.api.types.is_integer_dtype(df.index) else list(range(1, len(df) + 1))
+
+def verificar_restricoes(df: pd.DataFrame, restricoes: dict = None) -> tuple:
+    # Avalia NOT NULL, tipo numerico e CHECK como mascaras por coluna.
+    # Retorna (mascara de linhas invalidas, erros); cada linha recebe apenas a primeira violacao
+    restricoes = restricoes if restricoes is not None else carregar_restricoes()
+    total = len(df)
+    invalidas = np.zeros(total, dtype=bool)
+    violacoes = []
+
+    def registrar(mascara, original, mensagem):
+        novas = mascara & ~invalidas
+        if novas.any():
+            for posicao in np.flatnonzero(novas):
+                violacoes.append((posicao, mensagem(original.iloc[posicao])))
+            invalidas[novas] = True
+
+    for coluna, regra in restricoes.items():
+        if coluna in df.columns:
+            original = df[coluna]
+        else:
+            original = pd.Series(None, index=df.index, dtype=object)
+
+        nulos = original.isna().to_numpy()
+        if regra["not_null"]:
+            registrar(nulos, original, lambda v, c=coluna: f"Campo obrigatorio ausente: {c}")
+
+        valores = original
+        if regra["numerico"]:
+            conversor = CONVERSORES_NUMERICOS.get(coluna)
+            valores = conversor(original) if conversor else pd.to_numeric(original, errors="coerce").astype(float)
+            registrar(valores.isna().to_numpy() & ~nulos, original, lambda v, c=coluna: f"Valor nao numerico em {c}: {v!r}")
+
+        # NULL nunca viola um CHECK no SQLite
+        presentes = valores.notna().to_numpy()
+        for check in regra["checks"]:
+            if check["tipo"] == "in":
+                fora = presentes & ~valores.isin(check["valores"]).to_numpy()
+            elif regra["numerico"]:
+                fora = presentes & ~OPERADORES[check["operador"]](valores.to_numpy(), check["limite"])
+            else:
+                continue
+            registrar(fora, original, lambda v, e=check["expressao"]: f"Violacao de restricao: {e} (recebido {v!r})")
+
+    linhas = numerar_linhas(df)
+    ids = df["id_transacao"].astype(str).str.strip() if "id_transacao" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    erros = [
+        {"linha": linhas[posicao], "id_transacao": ids.iloc[posicao], "erro": mensagem}
+        for posicao, mensagem in sorted(violacoes, key=lambda v: v[0])
+    ]
+    return invalidas, erros
@@ -1,28 +1,84 @@
 import streamlit as st
 import hashlib
 import json
+import logging
+import os
 import sqlite3
+from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Optional
+from app.services.manutencao_cache import compactar_custos_scripts, agendar_manutencao_cache
+from app.services.linter_desempenho import registrar_pontuacao
+from app.services.conexao_db import emprestar_conexao
+
+DB_PATH = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
+CACHE_REMOTO_URL = os.getenv("SCRIPT_CACHE_REMOTO_URL")
+CACHE_REMOTO_PREFIXO = "script_cache:"
+CACHE_REMOTO_TTL_SEGUNDOS = 30 * 24 * 3600
+
+logger = logging.getLogger(__name__)
 
 def init_script_costs_table():
-    db_path = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    db_path = DB_PATH
+    with emprestar_conexao(db_path) as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS script_costs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            script_id INTEGER,
-            custo_tokens INTEGER DEFAULT 0,
-            FOREIGN KEY(script_id) REFERENCES scripts_transformacao(id)
-        )
-    """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS script_costs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                script_id INTEGER,
+                custo_tokens INTEGER DEFAULT 0,
+                custo_acumulado INTEGER,
+                geracoes INTEGER,
+                FOREIGN KEY(script_id) REFERENCES scripts_transformacao(id)
+            )
+        """)
     
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_costs_script_id ON script_costs(script_id)")
+        # Bancos criados antes da consolidacao de custos nao possuem as colunas agregadas
+        colunas_existentes = {row[1] for row in cursor.execute("PRAGMA table_info(script_costs)")}
+        if "custo_acumulado" not in colunas_existentes:
+            cursor.execute("ALTER TABLE script_costs ADD COLUMN custo_acumulado INTEGER")
+        if "geracoes" not in colunas_existentes:
+            cursor.execute("ALTER TABLE script_costs ADD COLUMN geracoes INTEGER")
     
-    conn.commit()
-    conn.close()
+        # Com o indice unico presente a tabela ja foi compactada e nao pode voltar a ter
+        # linhas repetidas; so bancos antigos pagam a compactacao, uma unica vez
+        ja_compactada = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_costs_script_unico'"
+        ).fetchone() is not None
+        conn.commit()
+    
+    if not ja_compactada:
+        compactar_custos_scripts(db_path)
+        
+        with emprestar_conexao(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DROP INDEX IF EXISTS idx_costs_script_id")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_costs_script_unico ON script_costs(script_id)")
+            conn.commit()
+    
+    agendar_manutencao_cache(db_path)
+
+LIMITE_CODIGOS_COMPILADOS = 256
+_codigos_compilados = {}
+
+def _chave_codigo(script: str) -> str:
+    return hashlib.sha256(script.encode('utf-8')).hexdigest()
+
+def obter_codigo_compilado(script: str):
+    chave = _chave_codigo(script)
+    codigo = _codigos_compilados.get(chave)
+    
+    if codigo is None:
+        codigo = compile(script, filename='<script_ia>', mode='exec')
+        registrar_codigo_compilado(script, codigo)
+    
+    return codigo
+
+def registrar_codigo_compilado(script: str, codigo) -> None:
+    if len(_codigos_compilados) >= LIMITE_CODIGOS_COMPILADOS:
+        _codigos_compilados.pop(next(iter(_codigos_compilados)))
+    _codigos_compilados[_chave_codigo(script)] = codigo
 
 def gerar_hash_estrutura(colunas: list, erros: list) -> str:
     colunas_ordenadas = sorted(colunas)
@@ -63,63 +119,107 @@ def gerar_hash_estrutura(colunas: list, erros: list) -> str:
     return hash_obj.hexdigest()
 
 
-def buscar_script_cache(hash_estrutura: str) -> Optional[dict]:
-    db_path = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
-    
-    if not db_path.exists():
-        return None
-    
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """
-        SELECT 
-            s.id, 
-            s.script_python, 
-            s.vezes_utilizado,
-            COALESCE(c.custo_tokens, 0) as custo_tokens
-        FROM scripts_transformacao s
-        LEFT JOIN script_costs c ON s.id = c.script_id
-        WHERE s.hash_estrutura = ?
-        """,
-        (hash_estrutura,)
-    )
-    
-    resultado = cursor.fetchone()
-    
-    if resultado:
-        cursor.execute(
-            """
-            UPDATE scripts_transformacao 
-            SET vezes_utilizado = vezes_utilizado + 1,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-            """,
-            (resultado["id"],)
-        )
-        conn.commit()
+class BackendCache(ABC):
+    @abstractmethod
+    def buscar(self, hash_estrutura: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def salvar(self, hash_estrutura: str, script: str, descricao: str = None, tokens: int = 0) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def replicar(self, hash_estrutura: str, script: str, descricao: str = None, custo_tokens: int = 0) -> Optional[int]:
+        # Copia um script gerado em outro no, sem contar uma nova geracao nem somar custo gasto aqui
+        ...
+
+
+class BackendSQLite(BackendCache):
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = Path(db_path)
+
+    def buscar(self, hash_estrutura: str) -> Optional[dict]:
+        if not self.db_path.exists():
+            return None
         
-        script_info = {
-            "id": resultado["id"],
-            "script": resultado["script_python"],
-            "vezes_utilizado": resultado["vezes_utilizado"] + 1,
-            "custo_tokens": resultado["custo_tokens"]
-        }
-        conn.close()
-        return script_info
-    
-    conn.close()
-    return None
+        with emprestar_conexao(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                """
+                SELECT 
+                    s.id, 
+                    s.script_python, 
+                    s.descricao,
+                    s.vezes_utilizado,
+                    COALESCE(c.custo_tokens, 0) as custo_tokens
+                FROM scripts_transformacao s
+                LEFT JOIN script_costs c ON s.id = c.script_id
+                WHERE s.hash_estrutura = ?
+                """,
+                (hash_estrutura,)
+            )
+            
+            resultado = cursor.fetchone()
+            
+            if resultado:
+                cursor.execute(
+                    """
+                    UPDATE scripts_transformacao 
+                    SET vezes_utilizado = vezes_utilizado + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    """,
+                    (resultado["id"],)
+                )
+                conn.commit()
+                
+                script_info = {
+                    "id": resultado["id"],
+                    "script": resultado["script_python"],
+                    "descricao": resultado["descricao"],
+                    "vezes_utilizado": resultado["vezes_utilizado"] + 1,
+                    "custo_tokens": resultado["custo_tokens"]
+                }
+                return script_info
+        
+        return None
 
-def salvar_script_cache(hash_estrutura: str, script: str, descricao: str = None, tokens: int = 0) -> int:
-    db_path = Path(__file__).parent.parent.parent / "database" / "transacoes.db"
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    try:
+    def salvar(self, hash_estrutura: str, script: str, descricao: str = None, tokens: int = 0) -> Optional[int]:
+        try:
+            with emprestar_conexao(self.db_path) as conn:
+                cursor = conn.cursor()
+                script_id, alterado = self._gravar_script(cursor, hash_estrutura, script, descricao)
+                if not alterado:
+                    return script_id
+                
+                cursor.execute(
+                    """
+                    INSERT INTO script_costs (script_id, custo_tokens, custo_acumulado, geracoes)
+                    VALUES (?, ?, ?, 1)
+                    ON CONFLICT(script_id) DO UPDATE SET
+                        custo_tokens = excluded.custo_tokens,
+                        custo_acumulado = COALESCE(script_costs.custo_acumulado, script_costs.custo_tokens, 0) + excluded.custo_tokens,
+                        geracoes = COALESCE(script_costs.geracoes, 1) + 1
+                    """,
+                    (script_id, tokens, tokens)
+                )
+                
+                conn.commit()
+                agendar_manutencao_cache(self.db_path)
+                return script_id
+        except Exception as e:
+            st.error(f"Erro ao salvar script: {e}")
+            return None
+
+    def _gravar_script(self, cursor, hash_estrutura: str, script: str, descricao: str) -> tuple:
+        # Retorna (id, alterado); um script identico ao salvo nao e regravado
+        cursor.execute("SELECT id, script_python FROM scripts_transformacao WHERE hash_estrutura = ?", (hash_estrutura,))
+        existente = cursor.fetchone()
+        if existente and existente[1] == script:
+            return existente[0], False
+        
         cursor.execute(
             """
             INSERT INTO scripts_transformacao (hash_estrutura, script_python, descricao)
@@ -131,22 +231,146 @@ def salvar_script_cache(hash_estrutura: str, script: str, descricao: str = None,
             """,
             (hash_estrutura, script, descricao)
         )
+        registrar_pontuacao(cursor, hash_estrutura, script)
         
         cursor.execute("SELECT id FROM scripts_transformacao WHERE hash_estrutura = ?", (hash_estrutura,))
-        script_id = cursor.fetchone()[0]
+        return cursor.fetchone()[0], True
+
+    def replicar(self, hash_estrutura: str, script: str, descricao: str = None, custo_tokens: int = 0) -> Optional[int]:
+        try:
+            with emprestar_conexao(self.db_path) as conn:
+                cursor = conn.cursor()
+                script_id, _ = self._gravar_script(cursor, hash_estrutura, script, descricao)
+                # custo_tokens informa a economia dos proximos acertos; nenhuma geracao foi paga neste no
+                cursor.execute(
+                    """
+                    INSERT INTO script_costs (script_id, custo_tokens, custo_acumulado, geracoes)
+                    VALUES (?, ?, 0, 0)
+                    ON CONFLICT(script_id) DO NOTHING
+                    """,
+                    (script_id, custo_tokens)
+                )
+                conn.commit()
+                return script_id
+        except Exception as e:
+            st.error(f"Erro ao replicar script: {e}")
+            return None
+
+
+class BackendChaveValor(BackendCache):
+    # Aceita qualquer cliente compativel com Redis (get/set/incr), ex: redis.Redis ou um servidor local de testes
+    def __init__(self, cliente, prefixo: str = CACHE_REMOTO_PREFIXO, ttl_segundos: int = CACHE_REMOTO_TTL_SEGUNDOS):
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.ttl_segundos = ttl_segundos
+
+    @classmethod
+    def a_partir_de_url(cls, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Cache remoto requer o pacote 'redis' (pip install redis)")
         
-        cursor.execute(
-            """
-            INSERT INTO script_costs (script_id, custo_tokens)
-            VALUES (?, ?)
-            """,
-            (script_id, tokens)
-        )
+        return cls(redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2))
+
+    def _chave(self, hash_estrutura: str) -> str:
+        return f"{self.prefixo}{hash_estrutura}"
+
+    def buscar(self, hash_estrutura: str) -> Optional[dict]:
+        bruto = self.cliente.get(self._chave(hash_estrutura))
+        if bruto is None:
+            return None
         
-        conn.commit()
-        return script_id
-    except Exception as e:
-        st.error(f"Erro ao salvar script: {e}")
+        entrada = json.loads(bruto)
+        usos = self.cliente.incr(self._chave(hash_estrutura) + ":usos")
+        
+        return {
+            "id": None,
+            "script": entrada["script"],
+            "descricao": entrada.get("descricao"),
+            "vezes_utilizado": int(usos),
+            "custo_tokens": entrada.get("custo_tokens", 0)
+        }
+
+    def salvar(self, hash_estrutura: str, script: str, descricao: str = None, tokens: int = 0) -> Optional[int]:
+        entrada = json.dumps({
+            "script": script,
+            "descricao": descricao,
+            "custo_tokens": tokens
+        }, ensure_ascii=False)
+        
+        self.cliente.set(self._chave(hash_estrutura), entrada, ex=self.ttl_segundos)
         return None
-    finally:
-        conn.close()
\ No newline at end of file
+
+    def replicar(self, hash_estrutura: str, script: str, descricao: str = None, custo_tokens: int = 0) -> Optional[int]:
+        return self.salvar(hash_estrutura, script, descricao, custo_tokens)
+
+
+class CacheEmCamadas(BackendCache):
+    # A camada local e sempre consultada primeiro; o remoto so e acionado em falhas locais
+    def __init__(self, local: BackendCache, remoto: Optional[BackendCache] = None):
+        self.local = local
+        self.remoto = remoto
+        self.ultimo_erro_remoto = None
+
+    def buscar(self, hash_estrutura: str) -> Optional[dict]:
+        entrada = self.local.buscar(hash_estrutura)
+        if entrada or self.remoto is None:
+            return entrada
+        
+        try:
+            entrada = self.remoto.buscar(hash_estrutura)
+        except Exception as e:
+            self.ultimo_erro_remoto = str(e)
+            return None
+        
+        if entrada:
+            entrada["id"] = self.local.replicar(
+                hash_estrutura, entrada["script"], entrada.get("descricao"), entrada.get("custo_tokens", 0)
+            )
+        
+        return entrada
+
+    def salvar(self, hash_estrutura: str, script: str, descricao: str = None, tokens: int = 0) -> Optional[int]:
+        script_id = self.local.salvar(hash_estrutura, script, descricao, tokens)
+        
+        if self.remoto is not None:
+            try:
+                self.remoto.salvar(hash_estrutura, script, descricao, tokens)
+            except Exception as e:
+                self.ultimo_erro_remoto = str(e)
+        
+        return script_id
+
+    def replicar(self, hash_estrutura: str, script: str, descricao: str = None, custo_tokens: int = 0) -> Optional[int]:
+        return self.local.replicar(hash_estrutura, script, descricao, custo_tokens)
+
+
+_cache_ativo = None
+
+def obter_cache() -> BackendCache:
+    global _cache_ativo
+    
+    if _cache_ativo is None:
+        remoto, erro_remoto = None, None
+        if CACHE_REMOTO_URL:
+            try:
+                remoto = BackendChaveValor.a_partir_de_url(CACHE_REMOTO_URL)
+            except Exception as e:
+                # Sem o remoto a aplicacao segue apenas com o cache local
+                erro_remoto = str(e)
+                logger.warning("Cache remoto desativado: %s", e)
+        _cache_ativo = CacheEmCamadas(BackendSQLite(DB_PATH), remoto)
+        _cache_ativo.ultimo_erro_remoto = erro_remoto
+    
+    return _cache_ativo
+
+def configurar_cache(cache: BackendCache) -> None:
+    global _cache_ativo
+    _cache_ativo = cache
+
+def buscar_script_cache(hash_estrutura: str) -> Optional[dict]:
+    return obter_cache().buscar(hash_estrutura)
+
+def salvar_script_cache(hash_estrutura: str, script: str, descricao: str = None, tokens: int = 0) -> int:
+    return obter_cache().salvar(hash_estrutura, script, descricao, tokens)
@@ -0,0 +1,62 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+LIMITE_RESULTADOS_CONCLUIDOS = int(os.getenv("SINGLE_FLIGHT_LIMITE_RESULTADOS", 256))
+
+
+class SingleFlight:
+    # Garante uma unica execucao por chave; chamadas com a mesma chave (de qualquer sessao
+    # do processo) aguardam o resultado da primeira. O resultado concluido fica guardado:
+    # um script gerado so chega ao cache quando o operador confirma, e ate la arquivos
+    # com a mesma estrutura nao devem pagar outra geracao
+    def __init__(self, limite_resultados: int = LIMITE_RESULTADOS_CONCLUIDOS):
+        self.limite_resultados = limite_resultados
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self._concluidos = OrderedDict()
+
+    def futuro(self, chave):
+        # Futuro da execucao em andamento ou ja concluida com sucesso; None se nao houver
+        with self._lock:
+            futuro = self._em_andamento.get(chave) or self._concluidos.get(chave)
+            if chave in self._concluidos:
+                self._concluidos.move_to_end(chave)
+            return futuro
+
+    def executar(self, chave, funcao):
+        with self._lock:
+            futuro = self._em_andamento.get(chave) or self._concluidos.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = Future()
+                self._em_andamento[chave] = futuro
+
+        if not lider:
+            return futuro.result(), False
+
+        try:
+            resultado = funcao()
+            futuro.set_result(resultado)
+            with self._lock:
+                self._concluidos[chave] = futuro
+                while len(self._concluidos) > self.limite_resultados:
+                    self._concluidos.popitem(last=False)
+            return resultado, True
+        except BaseException as e:
+            # Falhas nao ficam guardadas: a proxima chamada tenta de novo
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+
+    def descartar(self, chave):
+        # Resultado recusado (script com erro, regeneracao explicita) nao deve ser reaproveitado
+        with self._lock:
+            self._concluidos.pop(chave, None)
+
+    def em_andamento(self, chave) -> bool:
+        with self._lock:
+            return chave in self._em_andamento
@@ -0,0 +1,94 @@
+import os
+import re
+
+LIMITE_CARACTERES_SCRIPT = int(os.getenv("LLM_LIMITE_CARACTERES_SCRIPT", 12_000))
+
+CERCA_MARKDOWN = re.compile(r"^\s*```[\w+-]*\s*$")
+# Linhas em coluna zero que continuam a instrucao anterior, e nao iniciam uma nova
+CONTINUACOES = re.compile(r"^(else\b|elif\b|except\b|finally\b|case\b|[)\]}])")
+# Erros que so indicam que a instrucao ainda nao terminou de chegar
+MENSAGENS_INCOMPLETO = ("was never closed", "unterminated triple-quoted", "unexpected EOF")
+
+
+class ErroGeracaoInterrompida(Exception):
+    def __init__(self, motivo: str, parcial: str = ""):
+        super().__init__(motivo, parcial)
+        self.motivo = motivo
+        self.parcial = parcial
+
+    def __str__(self):
+        return f"Geracao interrompida: {self.motivo}"
+
+
+class ValidadorIncremental:
+    # Recebe a resposta do modelo em fragmentos, descarta as cercas de markdown e
+    # compila cada instrucao de topo assim que a seguinte comeca, para abortar
+    # a geracao no primeiro erro de sintaxe em vez de esperar a resposta inteira
+    def __init__(self, limite_caracteres: int = LIMITE_CARACTERES_SCRIPT):
+        self.limite_caracteres = limite_caracteres
+        self.caracteres = 0
+        self.motivo_interrupcao = None
+        self._linhas = []
+        self._pendente = ""
+        self._inicio_instrucao = 0
+
+    @property
+    def codigo(self) -> str:
+        return "\n".join(self._linhas + ([self._pendente] if self._pendente else [])).strip()
+
+    def alimentar(self, fragmento: str) -> bool:
+        self.caracteres += len(fragmento)
+        if self.caracteres > self.limite_caracteres:
+            self.motivo_interrupcao = f"resposta excedeu o limite de {self.limite_caracteres} caracteres"
+            return False
+
+        *completas, self._pendente = (self._pendente + fragmento).split("\n")
+        return all(self._processar_linha(linha) for linha in completas)
+
+    def finalizar(self) -> str:
+        if self._pendente:
+            linha, self._pendente = self._pendente, ""
+            if not self._processar_linha(linha):
+                raise ErroGeracaoInterrompida(self.motivo_interrupcao, self.codigo)
+
+        completa, erro = self._verificar(self._linhas)
+        if erro or not completa:
+            self.motivo_interrupcao = erro or "resposta terminou no meio de uma instrucao"
+            raise ErroGeracaoInterrompida(self.motivo_interrupcao, self.codigo)
+        return self.codigo
+
+    def _processar_linha(self, linha: str) -> bool:
+        if CERCA_MARKDOWN.match(linha):
+            return True
+
+        inicia_instrucao = (
+            linha.strip()
+            and not linha[0].isspace()
+            and not CONTINUACOES.match(linha)
+            and not self._ultima_linha_e_decorador()
+        )
+        if inicia_instrucao and self._inicio_instrucao < len(self._linhas):
+            # Instrucoes de topo sao independentes: basta compilar a que acabou de terminar
+            completa, erro = self._verificar(self._linhas[self._inicio_instrucao:], self._inicio_instrucao)
+            if erro:
+                self.motivo_interrupcao = erro
+                return False
+            if completa:
+                self._inicio_instrucao = len(self._linhas)
+
+        self._linhas.append(linha)
+        return True
+
+    def _ultima_linha_e_decorador(self) -> bool:
+        ultima = next((l for l in reversed(self._linhas) if l.strip()), "")
+        return ultima.startswith("@")
+
+    def _verificar(self, linhas: list, deslocamento: int = 0) -> tuple:
+        # Retorna (completa, erro); instrucao incompleta nao e erro enquanto a resposta chega
+        try:
+            compile("\n".join(linhas) + "\n", "<script_ia>", "exec", dont_inherit=True)
+        except SyntaxError as e:
+            if any(m in (e.msg or "") for m in MENSAGENS_INCOMPLETO):
+                return False, None
+            return False, f"erro de sintaxe: {e.msg} (Linha {(e.lineno or 0) + deslocamento})"
+        return True, None
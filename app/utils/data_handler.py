@@ -32,19 +32,7 @@ def processar_arquivo(uploaded_file):
         df = pd.read_csv(tmp_path, encoding=encoding_detectado, sep=delimitador_detectado)
         
         template = carregar_template()
-        resultado = validar_csv_completo(tmp_path, template)
-        erros_duplicata = detectar_colisoes_validacao(df, resultado)
-        erros_enum = detectar_erros_enum(df, template, resultado)
-
-        if erros_duplicata:
-            resultado["valido"] = False
-            resultado["detalhes"].extend(erros_duplicata)
-    
-        if erros_enum:
-            resultado["valido"] = False
-            resultado["detalhes"].extend(erros_enum)
-            
-        resultado["total_erros"] = len(resultado["detalhes"])
+        resultado = _validar_completo(tmp_path, df, template)
         
         return df, encoding_detectado, delimitador_detectado, resultado
         
@@ -52,6 +40,33 @@ def processar_arquivo(uploaded_file):
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
 
+def _validar_completo(caminho_csv, df: pd.DataFrame, template: dict) -> dict:
+    resultado = validar_csv_completo(caminho_csv, template)
+    erros_duplicata = detectar_colisoes_validacao(df, resultado)
+    erros_enum = detectar_erros_enum(df, template, resultado)
+
+    if erros_duplicata:
+        resultado["valido"] = False
+        resultado["detalhes"].extend(erros_duplicata)
+
+    if erros_enum:
+        resultado["valido"] = False
+        resultado["detalhes"].extend(erros_enum)
+        
+    resultado["total_erros"] = len(resultado["detalhes"])
+    return resultado
+
+def revalidar_dataframe(df: pd.DataFrame, template: dict) -> dict:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv", mode='w', encoding='utf-8') as tmp_file:
+        df.to_csv(tmp_file.name, index=False)
+        tmp_path = tmp_file.name
+
+    try:
+        return _validar_completo(tmp_path, df, template)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 def detectar_colisoes_validacao(df: pd.DataFrame, resultado_validacao: dict) -> list:
     if "erro_leitura" in [e["tipo"] for e in resultado_validacao.get("detalhes", [])]:
         return []
@@ -21,6 +21,8 @@ class FileSession:
         self.resultado_insercao = None
         self.relatorio_visualizado = False
         self.fonte_correcao = None 
+        self.geracao_antecipada = None
+        self.job_insercao = None
         
         self.logger = LogMonitoramento(uploaded_file) 
 
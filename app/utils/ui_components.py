@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from app.services.helpers_correcao import parse_brl_centavos
+
 def formatar_titulo_erro(tipo_erro):
     titulos = {
         'nomes_colunas': 'Nomes das Colunas Incorretos',
@@ -12,14 +14,21 @@ def formatar_titulo_erro(tipo_erro):
     }
     return titulos.get(tipo_erro, 'Erro de Validação')
 
+def formatar_centavos(centavos: int) -> str:
+    # divmod sobre o valor absoluto: com centavos negativos, // e % arredondam para baixo
+    sinal = "-" if centavos < 0 else ""
+    reais, cent = divmod(abs(centavos), 100)
+    return f"R$ {sinal}{reais:,}.{cent:02d}"
+
 def exibir_preview(df):
     col1, col2, col3 = st.columns(3)
     col1.metric("Total de Registros", len(df))
     col2.metric("Colunas", len(df.columns))
     
     if "valor" in df.columns:
-        valor_total = df["valor"].sum()
-        col3.metric("Valor Total", f"R$ {valor_total:,.2f}")
+        # Soma exata em centavos, sem o acumulo de erro de float
+        centavos = int(parse_brl_centavos(df["valor"]).sum())
+        col3.metric("Valor Total", formatar_centavos(centavos))
 
     st.divider()
     st.caption("Visualização completa dos dados (role para ver mais):")
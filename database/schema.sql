@@ -6,6 +6,7 @@ CREATE TABLE IF NOT EXISTS transacoes_financeiras (
     id_transacao TEXT PRIMARY KEY,
     data_transacao DATE NOT NULL,
     valor DECIMAL(15, 2) NOT NULL CHECK (valor > 0),
+    valor_centavos INTEGER,
     tipo TEXT NOT NULL CHECK (tipo IN ('CREDITO', 'DEBITO')),
     categoria TEXT NOT NULL CHECK (categoria IN (
         'SALARIO',
@@ -27,7 +28,8 @@ CREATE TABLE IF NOT EXISTS transacoes_financeiras (
         'CONFIRMADO',
         'CANCELADO'
     )),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    lote_id INTEGER REFERENCES monitoramento_processamento(id)
 );
 
 -- Indice para consultas por data
@@ -42,6 +44,28 @@ CREATE INDEX IF NOT EXISTS idx_status ON transacoes_financeiras(status);
 -- Indice para consultas por conta de origem
 CREATE INDEX IF NOT EXISTS idx_conta_origem ON transacoes_financeiras(conta_origem);
 
+-- Indice para somas e filtros por valor em centavos
+CREATE INDEX IF NOT EXISTS idx_valor_centavos ON transacoes_financeiras(valor_centavos);
+
+-- Indice para remover ou reimportar um lote inteiro
+CREATE INDEX IF NOT EXISTS idx_lote_id ON transacoes_financeiras(lote_id);
+
+-- Visao com o valor decimal exato derivado dos centavos
+CREATE VIEW IF NOT EXISTS transacoes_valor_decimal AS
+SELECT
+    id_transacao,
+    data_transacao,
+    valor_centavos,
+    printf('%d.%02d', valor_centavos / 100, valor_centavos % 100) AS valor_decimal,
+    tipo,
+    categoria,
+    descricao,
+    conta_origem,
+    conta_destino,
+    status,
+    created_at
+FROM transacoes_financeiras;
+
 -- Tabela para armazenar scripts de transformacao validados
 CREATE TABLE IF NOT EXISTS scripts_transformacao (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -49,6 +73,7 @@ CREATE TABLE IF NOT EXISTS scripts_transformacao (
     script_python TEXT NOT NULL,
     descricao TEXT,
     vezes_utilizado INTEGER DEFAULT 1,
+    pontuacao_desempenho INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
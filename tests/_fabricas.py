@@ -0,0 +1,54 @@
+"""
+Fabricas compartilhadas pelos testes de insercao de transacoes.
+
+Importe a fixture e as fabricas no modulo de teste:
+    from tests._fabricas import db_transacoes, transacoes, contar_transacoes
+"""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from tests.conftest import DATABASE_DIR
+
+
+def criar_banco_transacoes(db_path):
+    """Cria o banco com o schema oficial."""
+    conn = sqlite3.connect(db_path)
+    with open(DATABASE_DIR / "schema.sql", "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def db_transacoes(tmp_path):
+    """Banco temporario com o schema oficial."""
+    return criar_banco_transacoes(tmp_path / "transacoes.db")
+
+
+def transacoes(ids, **colunas):
+    """DataFrame de transacoes validas com os IDs informados; colunas extras sobrescrevem as padrao."""
+    df = pd.DataFrame({
+        "id_transacao": ids,
+        "data_transacao": "2024-01-15",
+        "valor": 100.5,
+        "tipo": "CREDITO",
+        "categoria": "OUTROS",
+        "descricao": "Teste",
+        "conta_origem": "12345-6",
+        "conta_destino": None,
+        "status": "CONFIRMADO",
+    })
+    for coluna, valores in colunas.items():
+        df[coluna] = valores
+    return df
+
+
+def contar_transacoes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM transacoes_financeiras").fetchone()[0]
+    finally:
+        conn.close()
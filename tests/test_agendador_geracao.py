@@ -0,0 +1,192 @@
+"""
+Testes do agendador de geracoes antecipadas de scripts.
+
+Execute com: pytest tests/test_agendador_geracao.py -v
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import app.services.agendador_geracao as agendador_geracao
+import app.services.ai_code_generator as ai_code_generator
+from app.services.agendador_geracao import AgendadorGeracao, agendar_geracao_fila
+from app.services.single_flight import SingleFlight
+
+
+def _arquivo(detalhes, status="PENDENTE_CORRECAO"):
+    return SimpleNamespace(
+        status=status,
+        geracao_antecipada=None,
+        df_original=pd.DataFrame(),
+        validacao={"detalhes": detalhes},
+    )
+
+
+# =============================================================================
+# TESTES DE CONCORRENCIA E TAXA
+# =============================================================================
+
+class TestLimites:
+    """As tarefas respeitam o limite de concorrencia e o espacamento por minuto."""
+
+    def test_taxa_espaca_inicios(self):
+        """Com 600 requisicoes por minuto os inicios ficam a 0.1s um do outro."""
+        agendador = AgendadorGeracao(limite_concorrencia=4, requisicoes_por_minuto=600)
+        inicios = []
+
+        futuros = [agendador.agendar_tarefa(lambda: inicios.append(time.monotonic())) for _ in range(4)]
+        for futuro in futuros:
+            futuro.result(timeout=5)
+
+        inicios.sort()
+        intervalos = [b - a for a, b in zip(inicios, inicios[1:])]
+        assert min(intervalos) >= 0.08
+
+    def test_limite_de_concorrencia(self):
+        """Nunca ha mais tarefas simultaneas que o limite."""
+        agendador = AgendadorGeracao(limite_concorrencia=2, requisicoes_por_minuto=60_000)
+        lock = threading.Lock()
+        estado = {"ativas": 0, "maximo": 0}
+
+        def tarefa():
+            with lock:
+                estado["ativas"] += 1
+                estado["maximo"] = max(estado["maximo"], estado["ativas"])
+            time.sleep(0.05)
+            with lock:
+                estado["ativas"] -= 1
+
+        for futuro in [agendador.agendar_tarefa(tarefa) for _ in range(6)]:
+            futuro.result(timeout=5)
+
+        assert estado["maximo"] == 2
+
+    def test_cancelamento_antes_de_iniciar(self):
+        """Uma tarefa cancelada enquanto espera a vez nunca e executada."""
+        agendador = AgendadorGeracao(limite_concorrencia=1, requisicoes_por_minuto=60_000)
+        liberar = threading.Event()
+        executadas = []
+
+        primeira = agendador.agendar_tarefa(liberar.wait, 5)
+        segunda = agendador.agendar_tarefa(lambda: executadas.append(True))
+        assert segunda.cancel()
+        liberar.set()
+        primeira.result(timeout=5)
+        time.sleep(0.05)
+
+        assert executadas == []
+
+
+# =============================================================================
+# TESTES DO AGENDAMENTO DA FILA
+# =============================================================================
+
+class TestAgendamentoFila:
+    """Somente arquivos que precisam da IA sao agendados."""
+
+    @pytest.fixture
+    def agendados(self, monkeypatch):
+        chamadas = []
+        falso = SimpleNamespace(agendar=lambda df, validacao, api_key, template: chamadas.append(validacao) or object())
+        monkeypatch.setattr(agendador_geracao, "obter_agendador", lambda: falso)
+        return chamadas
+
+    def test_motor_de_regras_dispensa_ia(self, agendados):
+        """Erros cobertos pelas regras nao geram chamada ao LLM."""
+        fila = [_arquivo([{"tipo": "formato_valor"}]), _arquivo([{"tipo": "erro_desconhecido"}])]
+        assert agendar_geracao_fila(fila, "chave", {}) == 1
+        assert fila[0].geracao_antecipada is None
+        assert fila[1].geracao_antecipada is not None
+
+    def test_sem_chave_nada_e_agendado(self, agendados):
+        """Sem chave de API nenhuma geracao e disparada."""
+        assert agendar_geracao_fila([_arquivo([{"tipo": "erro_desconhecido"}])], None, {}) == 0
+        assert agendados == []
+
+    def test_arquivos_fora_da_correcao_ignorados(self, agendados):
+        """Arquivos prontos ou ja agendados nao sao reagendados."""
+        pronto = _arquivo([{"tipo": "erro_desconhecido"}], status="PRONTO_VALIDO")
+        ja_agendado = _arquivo([{"tipo": "erro_desconhecido"}])
+        ja_agendado.geracao_antecipada = object()
+        assert agendar_geracao_fila([pronto, ja_agendado], "chave", {}) == 0
+
+    def test_erros_mistos_agendados(self, agendados):
+        """Com erros fora das regras o arquivo segue para a IA mesmo tendo erros suportados."""
+        fila = [_arquivo([{"tipo": "formato_valor"}, {"tipo": "erro_desconhecido"}])]
+        assert agendar_geracao_fila(fila, "chave", {}) == 1
+
+    def test_llm_recebe_somente_pendentes(self, monkeypatch):
+        """A geracao usa o arquivo ja corrigido pelas regras e apenas os erros restantes."""
+        recebidos = {}
+        df_regras = pd.DataFrame({"valor": [1]})
+        monkeypatch.setattr(
+            agendador_geracao, "separar_erros_para_ia",
+            lambda df, validacao, template: (df_regras, {"detalhes": [{"tipo": "erro_desconhecido"}]}, ["acao"])
+        )
+        monkeypatch.setattr(
+            agendador_geracao, "gerar_codigo_correcao_ia",
+            lambda df, validacao, *args: recebidos.update(df=df, validacao=validacao)
+        )
+
+        validacao = {"detalhes": [{"tipo": "formato_valor"}, {"tipo": "erro_desconhecido"}]}
+        AgendadorGeracao().agendar(pd.DataFrame(), validacao, "chave", {}).result(timeout=5)
+
+        assert recebidos["df"] is df_regras
+        assert recebidos["validacao"]["detalhes"] == [{"tipo": "erro_desconhecido"}]
+
+
+# =============================================================================
+# TESTES DE DEDUPLICACAO POR ESTRUTURA
+# =============================================================================
+
+class TestDeduplicacao:
+    """Arquivos com a mesma estrutura dividem uma unica geracao, mesmo apos ela terminar."""
+
+    @pytest.fixture
+    def geracoes(self, monkeypatch):
+        voo = SingleFlight()
+        estado = {"llm": [], "liberar": threading.Event()}
+
+        def solicitar(df, validacao, api_key, template, historico):
+            estado["llm"].append(list(df.columns))
+            if "lenta" in df.columns:
+                estado["liberar"].wait(5)
+            return "df = df", 100
+
+        monkeypatch.setattr(ai_code_generator, "geracoes_em_andamento", voo)
+        monkeypatch.setattr(agendador_geracao, "geracoes_em_andamento", voo)
+        monkeypatch.setattr(ai_code_generator, "buscar_script_cache", lambda hash_estrutura: None)
+        monkeypatch.setattr(ai_code_generator, "_solicitar_codigo_com_revisao_desempenho", solicitar)
+        return estado
+
+    def test_mesma_estrutura_gera_uma_vez(self, geracoes):
+        """Seis arquivos com o mesmo hash, em lotes que nao se sobrepoem, fazem uma unica chamada ao LLM."""
+        agendador = AgendadorGeracao(limite_concorrencia=2, requisicoes_por_minuto=60_000)
+        validacao = {"detalhes": [{"tipo": "erro_desconhecido"}]}
+
+        resultados = []
+        for _ in range(3):
+            futuros = [agendador.agendar(pd.DataFrame({"a": [1]}), validacao, "chave", {}) for _ in range(2)]
+            resultados.extend(futuro.result(timeout=5) for futuro in futuros)
+
+        assert len(geracoes["llm"]) == 1
+        assert sum(not resultado[1] for resultado in resultados) == 1
+        assert {resultado[0] for resultado in resultados} == {"df = df"}
+
+    def test_seguidores_nao_ocupam_vaga(self, geracoes):
+        """Enquanto uma estrutura e gerada, quem a aguarda nao impede a geracao de outra estrutura."""
+        agendador = AgendadorGeracao(limite_concorrencia=2, requisicoes_por_minuto=60_000)
+        validacao = {"detalhes": [{"tipo": "erro_desconhecido"}]}
+
+        lentos = [agendador.agendar(pd.DataFrame({"lenta": [1]}), validacao, "chave", {}) for _ in range(3)]
+        outra = agendador.agendar(pd.DataFrame({"b": [1]}), validacao, "chave", {})
+
+        assert outra.result(timeout=2)[0] == "df = df"
+        geracoes["liberar"].set()
+        for futuro in lentos:
+            futuro.result(timeout=5)
+        assert sorted(map(tuple, geracoes["llm"])) == [("b",), ("lenta",)]
@@ -0,0 +1,139 @@
+"""
+Testes do cache de validacao de chaves de API.
+
+Execute com: pytest tests/test_cache_validacao.py -v
+"""
+
+import time
+
+import pytest
+import streamlit as st
+
+import app.services.auth_manager as auth_manager
+from app.services.cache_validacao import CacheValidacaoChaves
+
+
+class _ValidadorFalso:
+    """Conta as chamadas de rede e devolve o resultado configurado."""
+
+    def __init__(self, resultado=(True, "ok", True), atraso=0.0):
+        self.resultado = resultado
+        self.atraso = atraso
+        self.chamadas = 0
+
+    def __call__(self, api_key):
+        self.chamadas += 1
+        time.sleep(self.atraso)
+        return self.resultado
+
+
+def _aguardar_revalidacao(cache, chave):
+    limite = time.monotonic() + 2
+    while cache.em_andamento(chave) and time.monotonic() < limite:
+        time.sleep(0.01)
+
+
+# =============================================================================
+# TESTES DO CACHE DO PROCESSO
+# =============================================================================
+
+class TestCacheProcesso:
+    """A rede e usada uma vez por chave; depois, so em segundo plano."""
+
+    def test_primeira_validacao_bloqueia_e_depois_usa_cache(self):
+        """Chamadas seguintes dentro do TTL nao acessam a rede."""
+        validador = _ValidadorFalso()
+        cache = CacheValidacaoChaves(validador, ttl=60)
+        assert cache.validar("gsk_a") == (True, "ok")
+        assert cache.validar("gsk_a") == (True, "ok")
+        assert validador.chamadas == 1
+
+    def test_forcar_ignora_o_cache(self):
+        """O teste pedido pelo operador sempre acessa a rede e atualiza o resultado guardado."""
+        validador = _ValidadorFalso()
+        cache = CacheValidacaoChaves(validador, ttl=60)
+        cache.validar("gsk_a")
+
+        validador.resultado = (False, "Erro 401", True)
+        assert cache.validar("gsk_a", forcar=True) == (False, "Erro 401")
+        assert validador.chamadas == 2
+        assert cache.validar("gsk_a") == (False, "Erro 401")
+        assert validador.chamadas == 2
+
+    def test_vencido_revalida_em_segundo_plano(self):
+        """Resultado vencido e devolvido na hora e atualizado por outra thread."""
+        agora = [0.0]
+        validador = _ValidadorFalso(atraso=0.05)
+        cache = CacheValidacaoChaves(validador, ttl=10, relogio=lambda: agora[0])
+        cache.validar("gsk_a")
+
+        agora[0] = 11
+        validador.resultado = (False, "Erro 401", True)
+        inicio = time.perf_counter()
+        assert cache.validar("gsk_a") == (True, "ok")
+        assert time.perf_counter() - inicio < 0.05
+
+        _aguardar_revalidacao(cache, "gsk_a")
+        assert validador.chamadas == 2
+        assert cache.consultar("gsk_a") == (False, "Erro 401")
+
+    def test_falha_de_rede_nao_entra_no_cache(self):
+        """Resultados inconclusivos sao repetidos na proxima validacao."""
+        validador = _ValidadorFalso(resultado=(False, "Erro de conexao", False))
+        cache = CacheValidacaoChaves(validador, ttl=60)
+        cache.validar("gsk_a")
+        cache.validar("gsk_a")
+        assert validador.chamadas == 2
+
+    def test_consultar_nunca_bloqueia(self):
+        """Chave desconhecida retorna None e dispara uma unica revalidacao."""
+        validador = _ValidadorFalso(atraso=0.1)
+        cache = CacheValidacaoChaves(validador, ttl=60)
+        assert cache.consultar("gsk_a") is None
+        assert cache.consultar("gsk_a") is None
+        _aguardar_revalidacao(cache, "gsk_a")
+        assert validador.chamadas == 1
+        assert cache.consultar("gsk_a") == (True, "ok")
+
+
+# =============================================================================
+# TESTES DO AUTH MANAGER
+# =============================================================================
+
+@pytest.fixture
+def sessao_limpa(monkeypatch):
+    for chave in ("GROQ_API_KEY", "GROQ_API_KEY_VALIDADA_EM"):
+        if chave in st.session_state:
+            del st.session_state[chave]
+    monkeypatch.setattr(auth_manager, "load_dotenv", lambda *args, **kwargs: None)
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    yield
+    for chave in ("GROQ_API_KEY", "GROQ_API_KEY_VALIDADA_EM"):
+        if chave in st.session_state:
+            del st.session_state[chave]
+
+
+class TestAuthManager:
+    """Execucoes repetidas da pagina nao pagam validacao na rede."""
+
+    def test_reexecucao_sem_rede(self, sessao_limpa, monkeypatch):
+        """Chave do .env e validada uma vez; novas instancias usam a sessao."""
+        validador = _ValidadorFalso()
+        monkeypatch.setattr(auth_manager, "cache_validacao", CacheValidacaoChaves(validador, ttl=60))
+        monkeypatch.setenv("GROQ_API_KEY", "gsk_env")
+
+        for _ in range(5):
+            assert auth_manager.AuthManager().api_key == "gsk_env"
+        assert validador.chamadas == 1
+
+    def test_sessao_vencida_com_chave_recusada(self, sessao_limpa, monkeypatch):
+        """Chave recusada pela revalidacao sai da sessao sem bloquear a pagina."""
+        cache = CacheValidacaoChaves(_ValidadorFalso(resultado=(False, "Erro 401", True)), ttl=60)
+        cache.validar("gsk_sessao")
+        monkeypatch.setattr(auth_manager, "cache_validacao", cache)
+
+        st.session_state["GROQ_API_KEY"] = "gsk_sessao"
+        st.session_state["GROQ_API_KEY_VALIDADA_EM"] = time.monotonic() - auth_manager.TTL_VALIDACAO_SEGUNDOS - 1
+
+        assert auth_manager.AuthManager().api_key is None
+        assert "GROQ_API_KEY" not in st.session_state
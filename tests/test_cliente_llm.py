@@ -0,0 +1,241 @@
+"""
+Testes do cliente LLM resiliente contra um servidor HTTP local.
+
+Execute com: pytest tests/test_cliente_llm.py -v
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from app.services.cliente_llm import (
+    ClienteLLM,
+    DisjuntorCircuito,
+    HistogramaLatencia,
+    ProvedorIndisponivel,
+    CircuitoAberto,
+)
+
+RESPOSTA_OK = {
+    "id": "chatcmpl-teste",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "modelo-teste",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "df = df"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+}
+
+
+class _ServidorStub:
+    """Servidor compativel com /chat/completions que responde uma sequencia de status."""
+
+    def __init__(self, status):
+        self.status = list(status)
+        self.requisicoes = 0
+        self.conexoes = set()
+        stub = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.requisicoes += 1
+                stub.conexoes.add(self.client_address)
+                codigo = stub.status.pop(0) if stub.status else 200
+                corpo = json.dumps(RESPOSTA_OK if codigo == 200 else {"error": {"message": f"status {codigo}"}}).encode()
+                self.send_response(codigo)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                if codigo == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/v1"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+@pytest.fixture
+def stub():
+    servidores = []
+
+    def criar(status=()):
+        servidor = _ServidorStub(status)
+        servidores.append(servidor)
+        return servidor
+
+    yield criar
+    for servidor in servidores:
+        servidor.parar()
+
+
+def _cliente(url, **kwargs):
+    parametros = {"max_tentativas": 3, "espera_base": 0.01, "espera_maxima": 0.05, **kwargs}
+    return ClienteLLM(url_base=url, tempo_limite=5, tempo_limite_conexao=1, **parametros)
+
+
+def _completar(cliente):
+    return cliente.criar_completion("chave-teste", model="modelo-teste", messages=[{"role": "user", "content": "oi"}])
+
+
+# =============================================================================
+# TESTES DE RETENTATIVA
+# =============================================================================
+
+class TestRetentativas:
+    """429 e 5xx sao repetidos com espera; erros do cliente nao."""
+
+    def test_429_seguido_de_sucesso(self, stub):
+        """Uma resposta 429 e repetida e a segunda tentativa e aproveitada."""
+        servidor = stub([429])
+        cliente = _cliente(servidor.url)
+        resposta = _completar(cliente)
+        assert resposta.choices[0].message.content == "df = df"
+        assert servidor.requisicoes == 2
+        assert cliente.disjuntor.estado == DisjuntorCircuito.FECHADO
+
+    def test_5xx_esgota_tentativas(self, stub):
+        """Falhas persistentes viram ProvedorIndisponivel apos o limite de tentativas."""
+        servidor = stub([500, 502, 503])
+        with pytest.raises(ProvedorIndisponivel):
+            _completar(_cliente(servidor.url))
+        assert servidor.requisicoes == 3
+
+    def test_401_nao_e_repetido(self, stub):
+        """Chave invalida falha na primeira tentativa sem afetar o circuito."""
+        servidor = stub([401])
+        cliente = _cliente(servidor.url)
+        with pytest.raises(openai.AuthenticationError):
+            _completar(cliente)
+        assert servidor.requisicoes == 1
+        assert cliente.disjuntor.estado == DisjuntorCircuito.FECHADO
+
+    def test_conexao_reutilizada(self, stub):
+        """Chamadas sequenciais compartilham a mesma conexao HTTP."""
+        servidor = stub()
+        cliente = _cliente(servidor.url)
+        for _ in range(3):
+            _completar(cliente)
+        assert servidor.requisicoes == 3
+        assert len(servidor.conexoes) == 1
+
+
+# =============================================================================
+# TESTES DO DISJUNTOR
+# =============================================================================
+
+class TestDisjuntor:
+    """O circuito abre apos falhas seguidas e falha rapido enquanto aberto."""
+
+    def test_circuito_abre_e_falha_rapido(self, stub):
+        """Com o circuito aberto, nenhuma requisicao chega ao servidor."""
+        servidor = stub([500] * 10)
+        disjuntor = DisjuntorCircuito(falhas_para_abrir=2, segundos_aberto=60)
+        cliente = _cliente(servidor.url, disjuntor=disjuntor)
+
+        with pytest.raises(CircuitoAberto):
+            _completar(cliente)
+        assert servidor.requisicoes == 2
+
+        with pytest.raises(CircuitoAberto):
+            _completar(cliente)
+        assert servidor.requisicoes == 2
+
+    def test_meio_aberto_fecha_com_sucesso(self):
+        """Passado o tempo de abertura, uma sondagem bem-sucedida fecha o circuito."""
+        agora = [0.0]
+        disjuntor = DisjuntorCircuito(falhas_para_abrir=1, segundos_aberto=10, relogio=lambda: agora[0])
+        disjuntor.registrar_falha()
+        assert disjuntor.estado == DisjuntorCircuito.ABERTO
+
+        agora[0] = 11
+        disjuntor.permitir()
+        # Apenas uma sondagem por vez
+        with pytest.raises(CircuitoAberto):
+            disjuntor.permitir()
+        disjuntor.registrar_sucesso()
+        assert disjuntor.estado == DisjuntorCircuito.FECHADO
+
+    def test_meio_aberto_reabre_com_falha(self):
+        """Sondagem com falha reabre o circuito imediatamente."""
+        agora = [0.0]
+        disjuntor = DisjuntorCircuito(falhas_para_abrir=3, segundos_aberto=10, relogio=lambda: agora[0])
+        for _ in range(3):
+            disjuntor.registrar_falha()
+        agora[0] = 11
+        disjuntor.permitir()
+        disjuntor.registrar_falha()
+        assert disjuntor.estado == DisjuntorCircuito.ABERTO
+
+
+    @staticmethod
+    def _meio_aberto(segundos_aberto=10):
+        agora = [0.0]
+        disjuntor = DisjuntorCircuito(falhas_para_abrir=1, segundos_aberto=segundos_aberto, relogio=lambda: agora[0])
+        disjuntor.registrar_falha()
+        agora[0] = segundos_aberto + 1
+        return disjuntor
+
+    def test_sondagem_com_erro_do_cliente(self, stub):
+        """Um 401 na sondagem libera a vaga sem fechar o circuito."""
+        servidor = stub([401])
+        disjuntor = self._meio_aberto()
+        cliente = _cliente(servidor.url, disjuntor=disjuntor)
+
+        with pytest.raises(openai.AuthenticationError):
+            _completar(cliente)
+        assert disjuntor.estado == DisjuntorCircuito.MEIO_ABERTO
+
+        # A proxima chamada volta a sondar e o sucesso fecha o circuito
+        _completar(cliente)
+        assert disjuntor.estado == DisjuntorCircuito.FECHADO
+
+    def test_sondagem_com_excecao_inesperada(self, stub):
+        """Excecoes fora dos erros da API nao deixam a sondagem presa."""
+        servidor = stub()
+        disjuntor = self._meio_aberto()
+        cliente = _cliente(servidor.url, disjuntor=disjuntor)
+
+        with pytest.raises(TypeError):
+            cliente.criar_completion("chave-teste", model="modelo-teste", messages=[], parametro_inexistente=1)
+        assert servidor.requisicoes == 0
+
+        assert disjuntor.permitir() is True
+
+
+# =============================================================================
+# TESTES DO HISTOGRAMA
+# =============================================================================
+
+class TestHistograma:
+    """Latencias sao agrupadas por faixa com percentis aproximados."""
+
+    def test_resumo(self):
+        """p50 e p95 usam o limite superior da faixa."""
+        histograma = HistogramaLatencia(faixas=(1, 2, 4))
+        for segundos in [0.5] * 10 + [3] * 9 + [10]:
+            histograma.registrar(segundos)
+        resumo = histograma.resumo()
+        assert resumo["total"] == 20
+        assert resumo["p50_segundos"] == 1
+        assert resumo["p95_segundos"] == 4
+        assert resumo["faixas"] == {"<= 1s": 10, "<= 2s": 0, "<= 4s": 9, "> 4s": 1}
+
+    def test_chamadas_registram_latencia(self, stub):
+        """Cada tentativa, com ou sem sucesso, entra no histograma."""
+        servidor = stub([429])
+        cliente = _cliente(servidor.url)
+        _completar(cliente)
+        assert cliente.estatisticas()["latencia"]["total"] == 2
@@ -0,0 +1,199 @@
+"""
+Testes do gerenciador de conexoes SQLite.
+
+Execute com: pytest tests/test_conexao_db.py -v
+"""
+
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+from app.services.conexao_db import emprestar_conexao, fechar_conexoes
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    caminho = tmp_path / "teste.db"
+    with emprestar_conexao(caminho) as conn:
+        conn.execute("CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)")
+    yield caminho
+    fechar_conexoes()
+
+
+def _contar(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+    finally:
+        conn.close()
+
+
+# =============================================================================
+# TESTES DE CONFIGURACAO
+# =============================================================================
+
+class TestConfiguracao:
+    """As conexoes saem com WAL e os pragmas de desempenho aplicados."""
+
+    def test_pragmas(self, db_path):
+        """WAL, synchronous NORMAL, temp_store em memoria e busy_timeout."""
+        with emprestar_conexao(db_path) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+            assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] < 0
+
+    def test_somente_leitura_rejeita_escrita(self, db_path):
+        """Conexoes de leitura sao separadas e nao gravam."""
+        with emprestar_conexao(db_path, somente_leitura=True) as leitura, emprestar_conexao(db_path) as escrita:
+            assert leitura is not escrita
+            with pytest.raises(sqlite3.OperationalError):
+                leitura.execute("INSERT INTO itens (nome) VALUES ('x')")
+
+
+# =============================================================================
+# TESTES DE REUTILIZACAO
+# =============================================================================
+
+class TestReutilizacao:
+    """Cada thread reaproveita a sua conexao enquanto estiver viva."""
+
+    def test_mesma_conexao_na_thread(self, db_path):
+        """Emprestimos seguidos na mesma thread recebem a mesma conexao."""
+        with emprestar_conexao(db_path) as conn:
+            pass
+        with emprestar_conexao(db_path) as outra:
+            assert outra is conn
+
+    def test_conexao_por_thread(self, db_path):
+        """Outra thread recebe outra conexao."""
+        outras = []
+
+        def trabalhar():
+            with emprestar_conexao(db_path) as conn:
+                outras.append(conn)
+            fechar_conexoes()
+
+        thread = threading.Thread(target=trabalhar)
+        thread.start()
+        thread.join()
+        with emprestar_conexao(db_path) as conn:
+            assert outras[0] is not conn
+
+    def test_fim_da_thread_fecha_conexoes(self, db_path):
+        """Conexoes de uma thread encerrada sao fechadas sem chamada explicita."""
+        outras = []
+
+        def trabalhar():
+            with emprestar_conexao(db_path) as conn:
+                outras.append(conn)
+
+        thread = threading.Thread(target=trabalhar)
+        thread.start()
+        thread.join()
+        gc.collect()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            outras[0].execute("SELECT 1")
+
+    def test_close_fecha_de_fato(self, db_path):
+        """close() encerra a conexao e o proximo emprestimo abre outra."""
+        with emprestar_conexao(db_path) as conn:
+            pass
+        conn.close()
+        with emprestar_conexao(db_path) as outra:
+            assert outra is not conn
+            outra.execute("SELECT 1")
+
+
+# =============================================================================
+# TESTES DE TRANSACAO
+# =============================================================================
+
+class TestTransacao:
+    """Cada emprestimo confirma ou desfaz apenas o proprio trabalho."""
+
+    def test_confirma_ao_sair(self, db_path):
+        """Sem excecao o trabalho do bloco e confirmado e o row_factory volta ao original."""
+        with emprestar_conexao(db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+        assert conn.row_factory is None
+        assert _contar(db_path) == 1
+
+    def test_desfaz_com_excecao(self, db_path):
+        """Uma excecao descarta o que o bloco gravou."""
+        with pytest.raises(ValueError):
+            with emprestar_conexao(db_path) as conn:
+                conn.execute("INSERT INTO itens (nome) VALUES ('a')")
+                raise ValueError("falha")
+        assert _contar(db_path) == 0
+
+    def test_aninhado_preserva_transacao_do_chamador(self, db_path):
+        """O emprestimo interno nao confirma nem descarta o trabalho pendente de quem o chamou."""
+        with emprestar_conexao(db_path) as externa:
+            externa.execute("INSERT INTO itens (nome) VALUES ('chamador')")
+
+            with emprestar_conexao(db_path) as interna:
+                interna.execute("INSERT INTO itens (nome) VALUES ('log')")
+                interna.commit()
+            assert externa.in_transaction
+            assert _contar(db_path) == 0
+
+            with pytest.raises(ValueError):
+                with emprestar_conexao(db_path) as interna:
+                    interna.execute("INSERT INTO itens (nome) VALUES ('descartado')")
+                    raise ValueError("falha")
+
+            nomes = {linha[0] for linha in externa.execute("SELECT nome FROM itens")}
+            assert nomes == {"chamador", "log"}
+
+        assert _contar(db_path) == 2
+
+    def test_rollback_aninhado_desfaz_so_o_bloco(self, db_path):
+        """rollback() dentro de um emprestimo aninhado volta ao inicio do bloco."""
+        with emprestar_conexao(db_path) as externa:
+            externa.execute("INSERT INTO itens (nome) VALUES ('chamador')")
+            with emprestar_conexao(db_path) as interna:
+                interna.execute("INSERT INTO itens (nome) VALUES ('interno')")
+                interna.rollback()
+
+        assert _contar(db_path) == 1
+
+
+# =============================================================================
+# TESTES DE CONCORRENCIA
+# =============================================================================
+
+class TestConcorrencia:
+    """Escritores concorrentes esperam a vez em vez de falhar."""
+
+    def test_escritores_concorrentes(self, db_path):
+        """Varias threads gravando ao mesmo tempo nao recebem 'database is locked'."""
+        falhas = []
+
+        def gravar(numero):
+            try:
+                for i in range(50):
+                    with emprestar_conexao(db_path) as conn:
+                        conn.execute("INSERT INTO itens (nome) VALUES (?)", (f"{numero}-{i}",))
+            except sqlite3.Error as e:
+                falhas.append(e)
+            finally:
+                fechar_conexoes()
+
+        threads = [threading.Thread(target=gravar, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+
+        with emprestar_conexao(db_path, somente_leitura=True) as leitura:
+            leitura.execute("SELECT COUNT(*) FROM itens").fetchone()
+
+        for thread in threads:
+            thread.join()
+
+        assert falhas == []
+        assert _contar(db_path) == 400
@@ -0,0 +1,141 @@
+"""
+Testes do construtor de prompt com orcamento de tokens.
+
+Execute com: pytest tests/test_construtor_prompt.py -v
+"""
+
+import pandas as pd
+import pytest
+
+from app.services.construtor_prompt import (
+    construir_prompt,
+    contar_tokens,
+    identificar_colunas_envolvidas,
+    selecionar_amostras,
+    resumir_historico,
+    init_prompt_tokens_table,
+    registrar_tokens_prompt,
+    carregar_uso_tokens_por_secao,
+)
+
+
+@pytest.fixture
+def df_largo():
+    """Arquivo largo: poucas colunas com erro no meio de muitas colunas corretas."""
+    df = pd.DataFrame({
+        "id_transacao": [f"TXN{i:08d}" for i in range(20)],
+        "data": ["2024-01-15"] * 15 + ["15/01/2024", "16/01/2024", "17/01/2024", None, "18/01/2024"],
+        "valor": ["100.50"] * 18 + ["R$ 1.234,56", "1.000,00"],
+        "tipo": ["CREDITO"] * 18 + ["entrada", "xpto"],
+    })
+    for i in range(40):
+        df[f"extra_{i:02d}"] = "sem erro"
+    return df
+
+
+@pytest.fixture
+def validacao_largo():
+    return {
+        "valido": False,
+        "detalhes": [
+            {"tipo": "nomes_colunas", "mapeamento": {"data": "data_transacao"}},
+            {"tipo": "formato_data", "formato_detectado": "DD/MM/YYYY"},
+            {"tipo": "formato_valor", "formato_detectado": "brasileiro"},
+            {
+                "tipo": "valores_invalidos",
+                "coluna": "tipo",
+                "coluna_origem": "tipo",
+                "valores_invalidos": ["xpto"],
+                "mapeamento_sugerido": {"entrada": "CREDITO"},
+                "valores_permitidos": ["CREDITO", "DEBITO"],
+            },
+        ],
+    }
+
+
+# =============================================================================
+# TESTES DE SELECAO DE COLUNAS E AMOSTRAS
+# =============================================================================
+
+class TestColunasEAmostras:
+    """Somente colunas com erro entram no prompt, com amostras problematicas."""
+
+    def test_colunas_envolvidas(self, df_largo, validacao_largo, template_schema):
+        """Data via mapeamento, valor e enum sao identificados; extras nao."""
+        envolvidas = identificar_colunas_envolvidas(df_largo, validacao_largo["detalhes"], template_schema)
+        assert envolvidas == {"data": "data", "valor": "valor", "tipo": "enum"}
+
+    def test_amostras_priorizam_valores_problematicos(self, df_largo):
+        """Datas fora do padrao aparecem antes, mesmo estando no fim do arquivo."""
+        amostras = selecionar_amostras(df_largo["data"], "data", limite=3)
+        assert amostras == ["15/01/2024", "16/01/2024", "2024-01-15"]
+
+    def test_amostras_enum_usam_detalhes(self, df_largo, validacao_largo):
+        """Para enums, os valores invalidos e mapeaveis vem do proprio erro."""
+        erro = validacao_largo["detalhes"][3]
+        amostras = selecionar_amostras(df_largo["tipo"], "enum", limite=5, erro=erro)
+        assert amostras == ["entrada", "xpto", "CREDITO"]
+
+    def test_limite_unitario_mostra_problema(self, df_largo):
+        """Com uma unica vaga, a amostra e um valor problematico."""
+        assert selecionar_amostras(df_largo["valor"], "valor", limite=1) == ["R$ 1.234,56"]
+
+
+# =============================================================================
+# TESTES DE ORCAMENTO
+# =============================================================================
+
+class TestOrcamento:
+    """O prompt respeita o orcamento cortando secoes menos importantes."""
+
+    def test_prompt_nao_usa_head(self, df_largo, validacao_largo, template_schema):
+        """O prompt cita valores problematicos e nao lista o dtype das colunas extras."""
+        resultado = construir_prompt(df_largo, validacao_largo, template_schema, "1. Tarefa")
+        assert "R$ 1.234,56" in resultado["prompt"]
+        assert "extra_00: " not in resultado["prompt"]
+        assert resultado["nivel_compactacao"] == 0
+        assert set(resultado["secoes"]) == {"cabecalho", "contexto", "amostras", "historico", "tarefas", "funcoes", "regras"}
+
+    def test_orcamento_apertado_compacta(self, df_largo, validacao_largo, template_schema):
+        """Com orcamento curto, colunas extras viram contagem e o historico e resumido."""
+        historico = "TENTATIVA ANTERIOR FALHOU\n" + "\n".join(f"df['c{i}'] = df['c{i}'].str.strip()" for i in range(200))
+        completo = construir_prompt(df_largo, validacao_largo, template_schema, "1. Tarefa", historico, orcamento=100_000)
+        compacto = construir_prompt(df_largo, validacao_largo, template_schema, "1. Tarefa", historico, orcamento=1200)
+
+        assert compacto["total_tokens"] < completo["total_tokens"]
+        assert compacto["total_tokens"] <= 1200
+        assert "Mais 41 colunas sem erros" in compacto["prompt"]
+        assert "linhas omitidas" in compacto["prompt"]
+        assert "TENTATIVA ANTERIOR FALHOU" in compacto["prompt"]
+
+    def test_resumo_remove_comentarios(self):
+        """Comentarios e linhas vazias do historico sao descartados."""
+        historico = "ERRO: x\n\n# comentario\ndf = df.copy()\n"
+        assert resumir_historico(historico) == "ERRO: x\ndf = df.copy()"
+
+    def test_contagem_tokens(self):
+        """Texto vazio nao consome tokens; texto maior consome mais."""
+        assert contar_tokens("") == 0
+        assert contar_tokens("a" * 400) > contar_tokens("a" * 40)
+
+
+# =============================================================================
+# TESTES DE REGISTRO
+# =============================================================================
+
+class TestRegistroTokens:
+    """Tokens por secao ficam registrados para ajuste do orcamento."""
+
+    def test_registro_por_secao(self, tmp_path, df_largo, validacao_largo, template_schema):
+        """Cada secao gera uma linha e a agregacao agrupa por secao."""
+        db_path = tmp_path / "prompt.db"
+        init_prompt_tokens_table(db_path)
+
+        resultado = construir_prompt(df_largo, validacao_largo, template_schema, "1. Tarefa")
+        prompt_id = registrar_tokens_prompt(resultado, "estrutura", 900, db_path)
+        registrar_tokens_prompt(resultado, "estrutura", 910, db_path)
+
+        assert prompt_id is not None
+        uso = carregar_uso_tokens_por_secao(db_path)
+        assert len(uso) == len(resultado["secoes"])
+        assert (uso["prompts"] == 2).all()
@@ -0,0 +1,152 @@
+"""
+Testes do motor de correcao baseado em regras (sem uso de IA).
+
+Execute com: pytest tests/test_corretor_regras.py -v
+"""
+
+import pandas as pd
+import pytest
+
+from src.validation import carregar_csv
+from app.services.corretor_regras import (
+    erros_suportados,
+    todos_erros_suportados,
+    aplicar_correcoes_nativas,
+    separar_erros_para_ia,
+)
+from app.utils.data_handler import revalidar_dataframe, _validar_completo
+
+
+def _corrigir(caminho, template):
+    df = carregar_csv(caminho)
+    validacao = _validar_completo(caminho, df, template)
+    df_corrigido, acoes, pendentes = aplicar_correcoes_nativas(df, validacao["detalhes"], template)
+    return validacao, df_corrigido, acoes, pendentes
+
+
+# =============================================================================
+# TESTES DE COBERTURA DO MOTOR
+# =============================================================================
+
+class TestCobertura:
+    """Identifica quando o motor atua e quando trata todos os erros."""
+
+    def test_tipos_conhecidos(self):
+        """Erros de estrutura e formato sao suportados."""
+        assert erros_suportados([{"tipo": "formato_data"}, {"tipo": "nomes_colunas"}])
+        assert todos_erros_suportados([{"tipo": "formato_data"}, {"tipo": "nomes_colunas"}])
+
+    def test_tipo_desconhecido(self):
+        """Com um erro coberto o motor atua; o erro de leitura continua dependendo da IA."""
+        erros = [{"tipo": "formato_data"}, {"tipo": "erro_leitura"}]
+        assert erros_suportados(erros)
+        assert not todos_erros_suportados(erros)
+        assert not erros_suportados([{"tipo": "erro_leitura"}])
+
+    def test_sem_erros(self):
+        """Lista vazia nao aciona o motor."""
+        assert not erros_suportados([])
+        assert not todos_erros_suportados([])
+
+
+class TestSeparacaoParaIa:
+    """O LLM recebe o arquivo corrigido pelas regras e apenas os erros pendentes."""
+
+    def test_somente_pendentes_para_ia(self, template_schema):
+        """Os erros cobertos sao corrigidos aqui e saem da validacao enviada a IA."""
+        df = pd.DataFrame({"valor": ["1.500,00", "2,50"], "outra": [1, 2]})
+        validacao = {
+            "valido": False,
+            "total_erros": 2,
+            "detalhes": [{"tipo": "formato_valor"}, {"tipo": "erro_desconhecido", "coluna": "outra"}],
+        }
+
+        df_base, validacao_ia, acoes = separar_erros_para_ia(df, validacao, template_schema)
+
+        assert df_base["valor"].tolist() == [1500.0, 2.5]
+        assert validacao_ia["detalhes"] == [{"tipo": "erro_desconhecido", "coluna": "outra"}]
+        assert validacao_ia["total_erros"] == 1
+        assert acoes
+
+    def test_sem_erro_coberto_nada_muda(self, template_schema):
+        """Sem erros cobertos o arquivo original segue inteiro para a IA."""
+        df = pd.DataFrame({"valor": ["1"]})
+        validacao = {"valido": False, "total_erros": 1, "detalhes": [{"tipo": "erro_leitura"}]}
+        df_base, validacao_ia, acoes = separar_erros_para_ia(df, validacao, template_schema)
+        assert df_base is df and validacao_ia is validacao and acoes == []
+
+
+# =============================================================================
+# TESTES DE CORRECAO DOS ARQUIVOS DE EXEMPLO
+# =============================================================================
+
+class TestCorrecaoArquivos:
+    """Cada arquivo problematico deve ficar valido apos o motor de regras."""
+
+    @pytest.mark.parametrize("fixture_csv", [
+        "sample_csv_colunas_extras",
+        "sample_csv_colunas_faltando",
+        "sample_csv_nomes_diferentes",
+        "sample_csv_formato_data_br",
+        "sample_csv_formato_valor_br",
+        "sample_csv_multiplos_problemas",
+    ])
+    def test_arquivo_fica_valido(self, fixture_csv, template_schema, request):
+        """O resultado revalidado nao deve apresentar erros."""
+        caminho = request.getfixturevalue(fixture_csv)
+        validacao, df_corrigido, acoes, pendentes = _corrigir(caminho, template_schema)
+
+        assert not validacao["valido"]
+        assert pendentes == []
+        resultado = revalidar_dataframe(df_corrigido, template_schema)
+        assert resultado["valido"], f"Erros restantes: {resultado['detalhes']}"
+
+    def test_multiplos_problemas_valores(self, sample_csv_multiplos_problemas, template_schema):
+        """Valores monetarios, datas e enums sao normalizados."""
+        _, df, _, _ = _corrigir(sample_csv_multiplos_problemas, template_schema)
+        primeira = df.iloc[0]
+
+        assert primeira["valor"] == 1500.0
+        assert primeira["data_transacao"] == "2024-01-15"
+        assert primeira["tipo"] == "CREDITO"
+        assert primeira["categoria"] == "SALARIO"
+        assert primeira["status"] == "PENDENTE"
+        assert "extra_col" not in df.columns
+
+    def test_coluna_faltando_recebe_default(self, sample_csv_colunas_faltando, template_schema):
+        """A coluna status ausente e criada com o padrao do template."""
+        _, df, _, _ = _corrigir(sample_csv_colunas_faltando, template_schema)
+        assert (df["status"] == "CONFIRMADO").all()
+
+
+# =============================================================================
+# TESTES DE REGRAS ISOLADAS
+# =============================================================================
+
+class TestRegras:
+    """Comportamento das regras em DataFrames construidos nos testes."""
+
+    def test_coalesce_prioriza_destino(self, template_schema):
+        """A coluna de destino prevalece e as origens so preenchem lacunas."""
+        df = pd.DataFrame({"valor": [10.0, None], "amount": [99.0, 20.0]})
+        erros = [{"tipo": "colunas_duplicadas", "conflitos": {"valor": ["valor", "amount"]}}]
+
+        corrigido, _, _ = aplicar_correcoes_nativas(df, erros, template_schema)
+
+        assert corrigido["valor"].tolist() == [10.0, 20.0]
+        assert "amount" not in corrigido.columns
+
+    def test_enum_desconhecido_vira_default(self, template_schema):
+        """Valores fora da lista permitida recebem o padrao configurado."""
+        df = pd.DataFrame({"status": ["confirmed", "???", None]})
+        erros = [{
+            "tipo": "valores_invalidos",
+            "coluna": "status",
+            "valores_permitidos": ["PENDENTE", "CONFIRMADO", "CANCELADO"],
+            "mapeamento_sugerido": {"confirmed": "CONFIRMADO"},
+            "default": "CONFIRMADO",
+        }]
+
+        corrigido, _, _ = aplicar_correcoes_nativas(df, erros, template_schema)
+
+        assert corrigido["status"].tolist() == ["CONFIRMADO", "CONFIRMADO", "CONFIRMADO"]
@@ -0,0 +1,183 @@
+"""
+Testes da aplicacao em blocos de scripts de correcao locais por linha.
+
+Execute com: pytest tests/test_execucao_blocos.py -v
+"""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from app.services.executor_scripts import ExecutorScripts
+from app.services.execucao_blocos import (
+    verificar_localidade_estatica,
+    verificar_localidade_empirica,
+    aplicar_script_em_blocos,
+    DestinoInsercao,
+    DestinoParquet,
+)
+from app.services.logger import SQL_TABELA_MONITORAMENTO
+from app.services.lotes_ingestao import remover_lote
+
+from tests._fabricas import criar_banco_transacoes, transacoes
+
+SCRIPT_LOCAL = """
+df = df.rename(columns={"amount": "valor"})
+df["valor"] = df["valor"].astype(str).str.replace("R$", "", regex=False).str.strip()
+df = df.loc[:, ~df.columns.duplicated()]
+"""
+
+
+@pytest.fixture(scope="module")
+def executor():
+    return ExecutorScripts(workers=2, tempo_limite=10)
+
+
+@pytest.fixture
+def df_amostra():
+    return pd.DataFrame({
+        "id": [f"TRX-{i}" for i in range(12)],
+        "amount": [f"R$ {i}" for i in range(12)],
+    })
+
+
+# =============================================================================
+# TESTES DE ANALISE ESTATICA
+# =============================================================================
+
+class TestLocalidadeEstatica:
+    """Deteccao de operacoes que dependem de outras linhas."""
+
+    def test_script_local(self):
+        """Operacoes valor a valor sao aceitas."""
+        local, motivos = verificar_localidade_estatica(SCRIPT_LOCAL)
+        assert local, motivos
+
+    @pytest.mark.parametrize("codigo", [
+        "df = df.sort_values('id')",
+        "df = df.groupby('id').first()",
+        "df['x'] = df['amount'].shift(1)",
+        "df['n'] = len(df)",
+        "df['amount'] = df['amount'].fillna(method='ffill')",
+    ])
+    def test_script_nao_local(self, codigo):
+        """Ordenacao, agregacao e propagacao entre linhas sao recusadas."""
+        local, motivos = verificar_localidade_estatica(codigo)
+        assert not local
+        assert motivos
+
+
+# =============================================================================
+# TESTES DE VERIFICACAO EMPIRICA
+# =============================================================================
+
+class TestLocalidadeEmpirica:
+    """Comparacao entre a execucao completa e a execucao em blocos."""
+
+    def test_script_local(self, executor, df_amostra):
+        """Scripts locais produzem o mesmo resultado em blocos."""
+        local, _ = verificar_localidade_empirica(SCRIPT_LOCAL, df_amostra, executor)
+        assert local
+
+    def test_dependencia_escondida(self, executor, df_amostra):
+        """Dependencias que escapam da analise estatica sao detectadas."""
+        codigo = "df['posicao'] = df.reset_index(drop=True).index"
+        assert verificar_localidade_estatica(codigo)[0]
+
+        local, motivos = verificar_localidade_empirica(codigo, df_amostra, executor)
+        assert not local
+        assert "posicao" in motivos[0]
+
+
+# =============================================================================
+# TESTES DE APLICACAO EM BLOCOS
+# =============================================================================
+
+class TestAplicacaoEmBlocos:
+    """Streaming do CSV pelo executor ate o destino."""
+
+    def test_parquet(self, executor, df_amostra, tmp_path):
+        """Todas as linhas chegam ao Parquet corrigidas."""
+        caminho_csv = tmp_path / "grande.csv"
+        pd.concat([df_amostra] * 50, ignore_index=True).to_csv(caminho_csv, index=False)
+        caminho_parquet = tmp_path / "saida.parquet"
+
+        resumo = aplicar_script_em_blocos(SCRIPT_LOCAL, caminho_csv, DestinoParquet(caminho_parquet), 100, executor)
+
+        assert resumo["blocos"] == 6
+        assert resumo["linhas_saida"] == 600
+        resultado = pd.read_parquet(caminho_parquet)
+        assert list(resultado.columns) == ["id", "valor"]
+        assert resultado["valor"].iloc[13] == "1"
+
+    def test_destino_recebe_blocos_em_ordem(self, executor, df_amostra, tmp_path):
+        """Blocos sao entregues na ordem do arquivo."""
+        caminho_csv = tmp_path / "grande.csv"
+        df_amostra.to_csv(caminho_csv, index=False)
+        recebidos = []
+
+        class Destino:
+            def __call__(self, bloco):
+                recebidos.append(bloco["id"].iloc[0])
+
+            def fechar(self):
+                recebidos.append("fim")
+
+        aplicar_script_em_blocos(SCRIPT_LOCAL, caminho_csv, Destino(), 4, executor)
+
+        assert recebidos == ["TRX-0", "TRX-4", "TRX-8", "fim"]
+
+
+# =============================================================================
+# TESTES DO DESTINO DE INSERCAO
+# =============================================================================
+
+class TestDestinoInsercao:
+    """Blocos gravados no banco levam o lote da importacao e podem ser retomados."""
+
+    @pytest.fixture
+    def db_lotes(self, tmp_path):
+        db_path = criar_banco_transacoes(tmp_path / "transacoes.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(SQL_TABELA_MONITORAMENTO)
+        conn.executemany(
+            "INSERT INTO monitoramento_processamento (id, arquivo_hash, arquivo_nome, status) VALUES (?, 'h', 'grande.csv', 'PROCESSANDO')",
+            [(1,), (2,)]
+        )
+        conn.commit()
+        conn.close()
+        return db_path
+
+    @staticmethod
+    def _consultar(db_path, sql):
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def test_blocos_levam_o_lote(self, db_lotes):
+        """Todas as linhas gravadas em blocos saem juntas ao desfazer o lote."""
+        destino = DestinoInsercao(db_lotes, lote_id=1, hash_arquivo="arquivo")
+        destino(transacoes(["A1", "A2"]))
+        destino(transacoes(["A3"]).set_axis([2]))
+        destino.finalizar()
+
+        assert self._consultar(db_lotes, "SELECT lote_id, COUNT(*) FROM transacoes_financeiras GROUP BY lote_id") == [(1, 3)]
+        assert self._consultar(db_lotes, "SELECT COUNT(*) FROM checkpoints_insercao") == [(0,)]
+        assert remover_lote(1, db_lotes) == 3
+
+    def test_retomada_sob_outro_lote(self, db_lotes):
+        """Blocos concluidos antes da interrupcao vem dos checkpoints e passam para o lote atual."""
+        interrompido = DestinoInsercao(db_lotes, lote_id=1, hash_arquivo="arquivo")
+        interrompido(transacoes(["A1", "A2"]))
+
+        retomado = DestinoInsercao(db_lotes, lote_id=2, hash_arquivo="arquivo")
+        retomado(transacoes(["A1", "A2"]))
+        retomado(transacoes(["A3"]).set_axis([2]))
+        retomado.finalizar()
+
+        assert retomado.resultado["registros_inseridos"] == 3
+        assert retomado.resultado["registros_duplicados"] == 0
+        assert self._consultar(db_lotes, "SELECT lote_id, COUNT(*) FROM transacoes_financeiras GROUP BY lote_id") == [(2, 3)]
@@ -0,0 +1,83 @@
+"""
+Testes do executor isolado de scripts de correcao.
+
+Execute com: pytest tests/test_executor_scripts.py -v
+"""
+
+import pandas as pd
+import pytest
+
+from app.services.executor_scripts import ExecutorScripts, ErroExecucaoScript
+
+
+@pytest.fixture(scope="module")
+def executor():
+    return ExecutorScripts(workers=1, tempo_limite=5, limite_memoria_mb=256)
+
+
+@pytest.fixture
+def df_exemplo():
+    return pd.DataFrame({"valor": [1.5, 2.5, 3.0], "tipo": ["credito", "debito", "credito"]})
+
+
+# =============================================================================
+# TESTES DE EXECUCAO
+# =============================================================================
+
+class TestExecucao:
+    """Execucao de scripts no pool de workers."""
+
+    def test_resultado_retorna_dataframe(self, executor, df_exemplo):
+        """O df alterado pelo script volta para o processo principal."""
+        resultado = executor.executar("df['tipo'] = df['tipo'].str.upper()", df_exemplo).result()
+
+        assert resultado["tipo"].tolist() == ["CREDITO", "DEBITO", "CREDITO"]
+        assert df_exemplo["tipo"].tolist() == ["credito", "debito", "credito"]
+
+    def test_colunas_com_tipos_misturados(self, executor, df_exemplo):
+        """Colunas sem representacao Arrow usam o transporte alternativo."""
+        resultado = executor.executar("df['misto'] = [1, 'a', None]", df_exemplo).result()
+        assert resultado["misto"].tolist()[:2] == [1, "a"]
+
+    def test_erro_do_script(self, executor, df_exemplo):
+        """Excecoes do script chegam com o tipo original."""
+        with pytest.raises(ErroExecucaoScript) as erro:
+            executor.executar("df['x'] = df['inexistente']", df_exemplo).result()
+        assert erro.value.tipo == "KeyError"
+
+
+# =============================================================================
+# TESTES DE LIMITES
+# =============================================================================
+
+class TestLimites:
+    """Protecoes de tempo e memoria."""
+
+    def test_tempo_limite(self, df_exemplo):
+        """Loops infinitos sao interrompidos e o pool volta a funcionar."""
+        executor = ExecutorScripts(workers=1, tempo_limite=1, limite_memoria_mb=256)
+
+        with pytest.raises(TimeoutError):
+            executor.executar("while True:\n    pass", df_exemplo).result()
+
+        resultado = executor.executar("df['ok'] = 1", df_exemplo).result()
+        assert "ok" in resultado.columns
+
+    def test_tempo_limite_preserva_outros_workers(self, df_exemplo):
+        """Somente o worker do script travado e encerrado; o script vizinho termina normalmente."""
+        executor = ExecutorScripts(workers=2, tempo_limite=2, limite_memoria_mb=256)
+        for aquecimento in [executor.executar("df = df", df_exemplo) for _ in range(2)]:
+            aquecimento.result()
+
+        travado = executor.executar("while True:\n    pass", df_exemplo)
+        vizinho = executor.executar("import time\ntime.sleep(1.5)\ndf['ok'] = 1", df_exemplo)
+
+        with pytest.raises(TimeoutError):
+            travado.result()
+        assert "ok" in vizinho.result().columns
+
+    def test_limite_memoria(self, executor, df_exemplo):
+        """Alocacoes acima do limite falham sem derrubar o processo principal."""
+        with pytest.raises(ErroExecucaoScript) as erro:
+            executor.executar("x = bytearray(1024 * 1024 * 1024)", df_exemplo).result()
+        assert erro.value.tipo == "MemoryError"
@@ -0,0 +1,223 @@
+"""
+Testes da fila de insercao com escritor unico.
+
+Execute com: pytest tests/test_fila_insercao.py -v
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import app.services.fila_insercao as fila_insercao
+import app.services.insert_data as insert_data
+from app.services.fila_insercao import EscritorInsercao, consultar_job, STATUS_FINAIS
+from app.services.insert_data import inserir_transacoes_agrupadas
+
+from tests._fabricas import db_transacoes, transacoes, contar_transacoes
+
+
+@pytest.fixture
+def escritor(db_transacoes):
+    escritores = []
+
+    def criar(**kwargs):
+        novo = EscritorInsercao(db_transacoes, **kwargs)
+        escritores.append(novo)
+        return novo
+
+    yield criar
+    for item in escritores:
+        item.parar(timeout=5)
+
+
+def _aguardar(job_id, db_path):
+    limite = time.monotonic() + 5
+    while time.monotonic() < limite:
+        job = consultar_job(job_id, db_path)
+        if job and job["status"] in STATUS_FINAIS:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} nao terminou")
+
+
+# =============================================================================
+# TESTES DO ESCRITOR
+# =============================================================================
+
+class TestEscritor:
+    """Os jobs sao gravados pela thread do escritor e acompanhados pela tabela."""
+
+    def test_job_concluido(self, escritor, db_transacoes):
+        """O resultado da insercao fica disponivel no job."""
+        job_id = escritor().enfileirar(transacoes([f"TXN{i:08d}" for i in range(10)]), "a.csv")
+        job = _aguardar(job_id, db_transacoes)
+
+        assert job["status"] == "CONCLUIDO"
+        assert job["arquivo_nome"] == "a.csv"
+        assert job["registros_processados"] == 10
+        assert job["resultado"]["registros_inseridos"] == 10
+        assert contar_transacoes(db_transacoes) == 10
+
+    def test_jobs_pequenos_agrupados(self, escritor, db_transacoes, monkeypatch):
+        """Jobs pequenos que esperam na fila dividem a mesma transacao."""
+        liberar = threading.Event()
+        grupos = []
+        original_unico = fila_insercao.inserir_transacoes
+        original_agrupado = fila_insercao.inserir_transacoes_agrupadas
+
+        def unico_bloqueado(df, db_path, **kwargs):
+            liberar.wait(5)
+            return original_unico(df, db_path, **kwargs)
+
+        def agrupado(dfs, db_path, *args):
+            grupos.append(len(dfs))
+            return original_agrupado(dfs, db_path, *args)
+
+        monkeypatch.setattr(fila_insercao, "inserir_transacoes", unico_bloqueado)
+        monkeypatch.setattr(fila_insercao, "inserir_transacoes_agrupadas", agrupado)
+
+        fila = escritor()
+        ids = [fila.enfileirar(transacoes(["TXN00000000"]), "0.csv")]
+        # O primeiro job ja esta com o escritor quando os demais chegam
+        while consultar_job(ids[0], db_transacoes)["status"] != "PROCESSANDO":
+            time.sleep(0.01)
+        ids += [fila.enfileirar(transacoes([f"TXN{n:08d}"]), f"{n}.csv") for n in range(1, 4)]
+        liberar.set()
+        jobs = [_aguardar(job_id, db_transacoes) for job_id in ids]
+
+        assert grupos == [3]
+        assert all(job["status"] == "CONCLUIDO" for job in jobs)
+        assert contar_transacoes(db_transacoes) == 4
+
+    def test_job_grande_nao_agrupado(self, escritor, db_transacoes, monkeypatch):
+        """Um job acima do limite segue sozinho, depois do grupo de pequenos."""
+        liberar = threading.Event()
+        grupos = []
+        original_unico = fila_insercao.inserir_transacoes
+        original_agrupado = fila_insercao.inserir_transacoes_agrupadas
+
+        def unico_bloqueado(df, db_path, **kwargs):
+            liberar.wait(5)
+            grupos.append(1)
+            return original_unico(df, db_path, **kwargs)
+
+        def agrupado(dfs, db_path, *args):
+            grupos.append(len(dfs))
+            return original_agrupado(dfs, db_path, *args)
+
+        monkeypatch.setattr(fila_insercao, "inserir_transacoes", unico_bloqueado)
+        monkeypatch.setattr(fila_insercao, "inserir_transacoes_agrupadas", agrupado)
+
+        fila = escritor(limite_job_pequeno=5)
+        ids = [
+            fila.enfileirar(transacoes([f"TXN2{n:07d}" for n in range(10)]), "primeiro.csv"),
+            fila.enfileirar(transacoes(["TXN00000001"]), "a.csv"),
+            fila.enfileirar(transacoes(["TXN00000002"]), "b.csv"),
+            fila.enfileirar(transacoes([f"TXN1{n:07d}" for n in range(10)]), "grande.csv"),
+        ]
+        liberar.set()
+        jobs = [_aguardar(job_id, db_transacoes) for job_id in ids]
+
+        assert grupos == [1, 2, 1]
+        assert jobs[3]["resultado"]["registros_inseridos"] == 10
+        assert contar_transacoes(db_transacoes) == 22
+
+    def test_falha_fatal(self, escritor, db_transacoes, monkeypatch):
+        """Erro do banco deixa o job em FALHA com a mensagem."""
+        def falhar(cursor, df_lote, *args):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        monkeypatch.setattr(insert_data, "_inserir_lote", falhar)
+        job_id = escritor().enfileirar(transacoes(["TXN00000001"]), "a.csv")
+        job = _aguardar(job_id, db_transacoes)
+
+        assert job["status"] == "FALHA"
+        assert "disk I/O error" in job["mensagem_erro"]
+        assert not job["resultado"]["sucesso"]
+
+    def test_falha_ao_registrar_falha(self, escritor, db_transacoes, monkeypatch):
+        """Se ate o registro da falha der erro, o escritor continua atendendo a fila."""
+        novo = escritor()
+        finalizar = novo._finalizar
+        estado = {"falhas": 0}
+
+        def processar_quebrado(grupo):
+            raise sqlite3.OperationalError("database is locked")
+
+        def finalizar_quebrado(job_id, resultado, mensagem_erro=None):
+            if resultado is None and estado["falhas"] == 0:
+                estado["falhas"] += 1
+                raise sqlite3.OperationalError("database is locked")
+            return finalizar(job_id, resultado, mensagem_erro)
+
+        processar = novo._processar
+        monkeypatch.setattr(novo, "_processar", processar_quebrado)
+        monkeypatch.setattr(novo, "_finalizar", finalizar_quebrado)
+        novo.enfileirar(transacoes(["TXN00000001"]), "a.csv")
+
+        limite = time.monotonic() + 5
+        while estado["falhas"] == 0 and time.monotonic() < limite:
+            time.sleep(0.01)
+        monkeypatch.setattr(novo, "_processar", processar)
+
+        job = _aguardar(novo.enfileirar(transacoes(["TXN00000002"]), "b.csv"), db_transacoes)
+        assert novo.ativo()
+        assert job["status"] == "CONCLUIDO"
+
+    def test_thread_encerrada_reiniciada(self, escritor, db_transacoes, monkeypatch):
+        """O acesso ao singleton recria a thread se ela tiver morrido, sem perder jobs da fila."""
+        novo = escritor()
+        novo.parar(timeout=5)
+        monkeypatch.setattr(fila_insercao, "_escritor", novo)
+
+        job_id = novo.enfileirar(transacoes(["TXN00000001"]), "a.csv")
+        assert fila_insercao.obter_escritor_insercao() is novo
+        assert novo.ativo()
+        assert _aguardar(job_id, db_transacoes)["status"] == "CONCLUIDO"
+
+    def test_jobs_orfaos(self, escritor, db_transacoes):
+        """Jobs em aberto de um processo anterior sao marcados como falha."""
+        escritor()
+        conn = sqlite3.connect(db_transacoes)
+        conn.execute("INSERT INTO jobs_insercao (arquivo_nome, status) VALUES ('velho.csv', 'PROCESSANDO')")
+        conn.commit()
+        job_id = conn.execute("SELECT MAX(id) FROM jobs_insercao").fetchone()[0]
+        conn.close()
+
+        escritor()
+        job = consultar_job(job_id, db_transacoes)
+        assert job["status"] == "FALHA"
+        assert job["resultado"] is None
+
+
+# =============================================================================
+# TESTES DA INSERCAO AGRUPADA
+# =============================================================================
+
+class TestInsercaoAgrupada:
+    """Cada arquivo do grupo tem o seu resultado e falha sozinho."""
+
+    def test_falha_de_um_arquivo_nao_desfaz_os_outros(self, db_transacoes, monkeypatch):
+        """O SAVEPOINT do arquivo com erro e desfeito; os demais sao gravados."""
+        original = insert_data._inserir_lote
+
+        def falhar_no_segundo(cursor, df_lote, *args):
+            if "TXN00000002" in df_lote["id_transacao"].tolist():
+                cursor.execute(
+                    "INSERT INTO transacoes_financeiras (id_transacao, data_transacao, valor, tipo, categoria, conta_origem) "
+                    "VALUES ('PARCIAL', '2024-01-15', 1, 'CREDITO', 'OUTROS', '1')"
+                )
+                raise sqlite3.OperationalError("falha simulada")
+            return original(cursor, df_lote, *args)
+
+        monkeypatch.setattr(insert_data, "_inserir_lote", falhar_no_segundo)
+        resultados = inserir_transacoes_agrupadas(
+            [transacoes(["TXN00000001"]), transacoes(["TXN00000002"]), transacoes(["TXN00000003", "TXN00000004"])],
+            db_transacoes
+        )
+
+        assert [r["sucesso"] for r in resultados] == [True, False, True]
+        assert [r["registros_inseridos"] for r in resultados] == [1, 0, 2]
+        assert contar_transacoes(db_transacoes) == 3
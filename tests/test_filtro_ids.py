@@ -0,0 +1,151 @@
+"""
+Testes do filtro probabilistico de IDs de transacao.
+
+Execute com: pytest tests/test_filtro_ids.py -v
+"""
+
+import sqlite3
+
+import pandas as pd
+
+import app.services.insert_data as insert_data
+from app.services.filtro_ids import FiltroBloom, IndiceIds, ids_existentes, obter_indice_ids
+from app.services.insert_data import inserir_transacoes
+
+from tests._fabricas import db_transacoes, transacoes
+
+
+def _inserir_externo(db_path, ids):
+    # Gravacao feita fora do app, sem passar pelo filtro
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO transacoes_financeiras (id_transacao, data_transacao, valor, tipo, categoria, conta_origem) "
+        "VALUES (?, '2024-01-15', 1, 'CREDITO', 'OUTROS', '1')",
+        [(i,) for i in ids]
+    )
+    conn.commit()
+    conn.close()
+
+
+# =============================================================================
+# TESTES DO FILTRO
+# =============================================================================
+
+class TestFiltroBloom:
+    """Sem falsos negativos e com falsos positivos dentro da taxa configurada."""
+
+    def test_sem_falsos_negativos(self):
+        """Todo ID adicionado e reconhecido."""
+        filtro = FiltroBloom(10_000)
+        ids = [f"TXN{i:08d}" for i in range(10_000)]
+        filtro.adicionar(ids)
+        assert filtro.contem(ids).all()
+
+    def test_taxa_de_falsos_positivos(self):
+        """IDs nunca adicionados raramente aparecem como presentes."""
+        filtro = FiltroBloom(10_000, taxa_falso_positivo=0.01)
+        filtro.adicionar([f"TXN{i:08d}" for i in range(10_000)])
+        taxa = filtro.contem([f"OUT{i:08d}" for i in range(20_000)]).mean()
+        assert taxa < 0.03
+
+    def test_bits_persistidos(self):
+        """Os bits salvos reproduzem o mesmo filtro."""
+        filtro = FiltroBloom(1_000)
+        filtro.adicionar(["A", "B"])
+        copia = FiltroBloom(1_000, bits=filtro.bits.tobytes(), num_hashes=filtro.num_hashes, total=filtro.total)
+        assert copia.contem(["A", "B"]).all()
+        assert copia.total == 2
+
+
+# =============================================================================
+# TESTES DO INDICE
+# =============================================================================
+
+class TestIndiceIds:
+    """O indice acompanha a tabela por insercoes do app e por sincronizacao."""
+
+    def test_insercao_atualiza_e_persiste(self, db_transacoes):
+        """IDs inseridos entram no filtro salvo no banco."""
+        inserir_transacoes(transacoes(["TXN00000001", "TXN00000002"]), db_transacoes)
+
+        novo = IndiceIds(db_transacoes)
+        novo.sincronizar()
+        assert novo.provaveis(["TXN00000001", "TXN00000002"]).all()
+        assert novo.ultimo_rowid == 2
+
+    def test_gravacao_externa_incorporada(self, db_transacoes):
+        """Linhas gravadas fora do app entram na proxima sincronizacao."""
+        indice = obter_indice_ids(db_transacoes)
+        indice.sincronizar()
+        _inserir_externo(db_transacoes, ["EXT00000001"])
+
+        assert ids_existentes(["EXT00000001", "TXN00000009"], db_transacoes) == {"EXT00000001"}
+
+    def test_duplicado_detectado_com_filtro(self, db_transacoes):
+        """IDs existentes continuam reportados como duplicados."""
+        _inserir_externo(db_transacoes, ["TXN00000001"])
+        resultado = inserir_transacoes(transacoes([" TXN00000001", "TXN00000002"]), db_transacoes)
+        assert resultado["registros_duplicados"] == 1
+        assert resultado["erros"][0]["erro"] == "ID duplicado (já existe no banco)"
+
+    def test_ids_novos_nao_consultam_o_banco(self, db_transacoes, monkeypatch):
+        """Linhas descartadas pelo filtro chegam ao staging sem suspeita."""
+        inserir_transacoes(transacoes([f"TXN{i:08d}" for i in range(100)]), db_transacoes)
+        suspeitos = []
+        original = insert_data._carregar_staging
+
+        def capturar(cursor, registros):
+            registros = list(registros)
+            suspeitos.extend(r[-1] for r in registros)
+            return original(cursor, iter(registros))
+
+        monkeypatch.setattr(insert_data, "_carregar_staging", capturar)
+        inserir_transacoes(transacoes(["TXN00000050"] + [f"NOV{i:08d}" for i in range(100)]), db_transacoes)
+
+        assert suspeitos[0] is True
+        assert sum(suspeitos) <= 5
+
+
+# =============================================================================
+# TESTES DE FILTRO DEFASADO
+# =============================================================================
+
+class TestFiltroDefasado:
+    """Falsos negativos de um filtro defasado nunca somem em silencio."""
+
+    def test_rowid_reutilizado_reconstroi(self, db_transacoes):
+        """Remover o fim da tabela e gravar de novo por fora e detectado na sincronizacao."""
+        inserir_transacoes(transacoes(["TXN00000001", "TXN00000002"]), db_transacoes)
+        conn = sqlite3.connect(db_transacoes)
+        conn.execute("DELETE FROM transacoes_financeiras WHERE id_transacao = 'TXN00000002'")
+        conn.commit()
+        conn.close()
+        _inserir_externo(db_transacoes, ["EXT00000001", "EXT00000002"])
+
+        indice = obter_indice_ids(db_transacoes)
+        indice.sincronizar()
+        assert indice.provaveis(["EXT00000001", "EXT00000002"]).all()
+
+    def test_descarte_do_on_conflict_reportado(self, db_transacoes, monkeypatch):
+        """Linha dada como nova pelo filtro e descartada pelo banco conta como duplicada."""
+        _inserir_externo(db_transacoes, ["EXT00000001"])
+        indice = obter_indice_ids(db_transacoes)
+        monkeypatch.setattr(indice, "provaveis", lambda ids: pd.Series(False, index=range(len(ids))).to_numpy())
+
+        resultado = inserir_transacoes(transacoes(["EXT00000001", "TXN00000001"]), db_transacoes)
+
+        assert resultado["registros_inseridos"] == 1
+        assert resultado["registros_duplicados"] == 1
+        assert resultado["erros"] == [
+            {"linha": 1, "id_transacao": "EXT00000001", "erro": "ID duplicado (já existe no banco)"}
+        ]
+        # O descarte indica filtro defasado: ele e reconstruido com a tabela atual
+        assert indice.filtro.contem(["EXT00000001"]).all()
+
+    def test_mesmo_id_em_arquivos_agrupados(self, db_transacoes):
+        """Na transacao compartilhada, o ID gravado por um arquivo e duplicado para o seguinte."""
+        resultados = insert_data.inserir_transacoes_agrupadas(
+            [transacoes(["TXN00000001"]), transacoes(["TXN00000001", "TXN00000002"])], db_transacoes
+        )
+        assert resultados[1]["registros_inseridos"] == 1
+        assert resultados[1]["registros_duplicados"] == 1
@@ -0,0 +1,146 @@
+"""
+Testes das funcoes auxiliares disponiveis para os scripts de correcao.
+
+Execute com: pytest tests/test_helpers_correcao.py -v
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.helpers_correcao import (
+    parse_brl,
+    parse_brl_centavos,
+    normalize_dates,
+    map_enum,
+    coalesce_columns,
+)
+from app.services.executor_scripts import montar_namespace_execucao
+
+
+# =============================================================================
+# TESTES DE VALORES MONETARIOS
+# =============================================================================
+
+class TestParseBrl:
+    """Conversao de valores monetarios brasileiros."""
+
+    def test_formatos_mistos(self):
+        """Aceita R$, milhar com ponto, virgula decimal e decimal com ponto."""
+        serie = pd.Series(["R$ 1.500,00", "1.234,56", "99,9", "1234.56", 10.5, None, "abc"])
+        resultado = parse_brl(serie)
+
+        assert resultado.iloc[:5].tolist() == [1500.0, 1234.56, 99.9, 1234.56, 10.5]
+        assert resultado.iloc[5:].isna().all()
+        assert resultado.dtype == np.float64
+
+    def test_ponto_de_milhar_sem_virgula(self):
+        """Ponto seguido de exatamente 3 digitos e milhar; com outra quantidade e decimal."""
+        serie = pd.Series(["1.500", "R$ 12.000", "1.234.567", "-2.500", "1.50", "1.5", "0.500", "1234.567"])
+        assert parse_brl(serie).tolist() == [1500.0, 12000.0, 1234567.0, -2500.0, 1.5, 1.5, 0.5, 1234.57]
+
+    def test_preserva_indice(self):
+        """O resultado fica alinhado ao indice original."""
+        serie = pd.Series(["1,00", "2,00", "1,00"], index=[10, 20, 30])
+        assert parse_brl(serie).to_dict() == {10: 1.0, 20: 2.0, 30: 1.0}
+
+
+class TestParseBrlCentavos:
+    """Conversao direta para centavos inteiros."""
+
+    def test_texto_sem_float(self):
+        """Strings viram centavos exatos, com a terceira casa arredondando a segunda."""
+        serie = pd.Series(["R$ 1.500,00", "0,1", "1234.56", "2,005", "12345678901234,99", None, "abc", ""])
+        resultado = parse_brl_centavos(serie)
+
+        assert resultado.iloc[:5].tolist() == [150000, 10, 123456, 201, 1234567890123499]
+        assert resultado.iloc[5:].isna().all()
+        assert resultado.dtype == "Int64"
+
+    def test_coluna_numerica(self):
+        """Floats com erro de representacao sao arredondados ao centavo."""
+        serie = pd.Series([0.1 + 0.2, 1234.56, None])
+        assert parse_brl_centavos(serie).tolist() == [30, 123456, pd.NA]
+
+    def test_float_meio_para_cima(self):
+        """Floats arredondam pelo decimal impresso, como o texto: 1.005 vira 101 centavos."""
+        serie = pd.Series([1.005, 2.675, -1.005])
+        assert parse_brl_centavos(serie).tolist() == [101, 268, -101]
+        assert parse_brl_centavos(serie).tolist() == parse_brl_centavos(pd.Series(["1,005", "2,675", "-1,005"])).tolist()
+
+    def test_soma_exata(self):
+        """A soma em centavos nao acumula erro de float."""
+        serie = pd.Series(["0,10"] * 10)
+        assert parse_brl_centavos(serie).sum() == 100
+
+    def test_ponto_de_milhar_sem_virgula(self):
+        """"1.500" sao mil e quinhentos reais, nao um real e cinquenta centavos."""
+        serie = pd.Series(["1.500", "1.234.567", "1.50"])
+        assert parse_brl_centavos(serie).tolist() == [150000, 123456700, 150]
+
+
+# =============================================================================
+# TESTES DE DATAS
+# =============================================================================
+
+class TestNormalizeDates:
+    """Conversao de datas para YYYY-MM-DD."""
+
+    def test_formato_informado(self):
+        """O formato detectado na validacao tem prioridade."""
+        serie = pd.Series(["02/03/2024", "2024-03-05", None])
+        assert normalize_dates(serie, "DD/MM/YYYY").tolist() == ["2024-03-02", "2024-03-05", None]
+
+    def test_formato_strftime(self):
+        """Formatos no padrao strftime tambem sao aceitos."""
+        assert normalize_dates(pd.Series(["03/02/2024"]), "%m/%d/%Y").tolist() == ["2024-03-02"]
+
+    def test_sem_formato_usa_dia_primeiro(self):
+        """Sem formato, datas ambiguas sao lidas como dia/mes."""
+        serie = pd.Series(["15-01-2024", "02/03/2024", "invalida"])
+        assert normalize_dates(serie).tolist() == ["2024-01-15", "2024-03-02", None]
+
+
+# =============================================================================
+# TESTES DE ENUMS E COLUNAS
+# =============================================================================
+
+class TestMapEnum:
+    """Padronizacao de valores categoricos."""
+
+    def test_mapeamento_e_default(self):
+        """Mapeia codigos, normaliza caixa e aplica o padrao."""
+        serie = pd.Series(["C", " debito ", "x", None])
+        resultado = map_enum(serie, ["CREDITO", "DEBITO"], {"C": "CREDITO"}, "CREDITO")
+        assert resultado.tolist() == ["CREDITO", "DEBITO", "CREDITO", "CREDITO"]
+
+    def test_sem_default(self):
+        """Sem padrao, valores desconhecidos viram None."""
+        assert map_enum(pd.Series(["?"]), ["A"]).tolist() == [None]
+
+
+class TestCoalesceColumns:
+    """Resolucao de colunas concorrentes."""
+
+    def test_destino_prioritario(self):
+        """A destino prevalece e as origens sao removidas."""
+        df = pd.DataFrame({"valor": [1.0, None], "amount": [9.0, 2.0], "outra": [0, 0]})
+        resultado = coalesce_columns(df, "valor", ["amount"])
+
+        assert resultado["valor"].tolist() == [1.0, 2.0]
+        assert sorted(resultado.columns) == ["outra", "valor"]
+
+
+# =============================================================================
+# TESTES DO NAMESPACE DE EXECUCAO
+# =============================================================================
+
+class TestNamespace:
+    """As funcoes ficam disponiveis para os scripts gerados."""
+
+    @pytest.mark.parametrize("nome", ["parse_brl", "normalize_dates", "map_enum", "coalesce_columns"])
+    def test_funcao_injetada(self, nome):
+        """Cada funcao auxiliar esta no namespace junto de df, pd e np."""
+        namespace = montar_namespace_execucao(pd.DataFrame())
+        assert callable(namespace[nome])
+        assert {"df", "pd", "np"} <= namespace.keys()
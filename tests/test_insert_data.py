@@ -0,0 +1,347 @@
+"""
+Testes da insercao de transacoes no banco.
+
+Execute com: pytest tests/test_insert_data.py -v
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.services.insert_data as insert_data
+from app.services.insert_data import inserir_transacoes
+
+from tests._fabricas import db_transacoes, transacoes, contar_transacoes
+
+
+# =============================================================================
+# TESTES DE INSERCAO EM MASSA
+# =============================================================================
+
+class TestInsercaoEmMassa:
+    """A insercao via tabela de staging preserva o formato do resultado."""
+
+    def test_insere_novos(self, db_transacoes):
+        """Todos os registros novos sao inseridos."""
+        resultado = inserir_transacoes(transacoes([f"TXN{i:08d}" for i in range(5)]), db_transacoes)
+        assert resultado == {
+            "sucesso": True,
+            "registros_inseridos": 5,
+            "registros_duplicados": 0,
+            "total_registros": 5,
+            "erros": []
+        }
+        assert contar_transacoes(db_transacoes) == 5
+
+    def test_arquivo_acima_do_limite_de_parametros(self, db_transacoes):
+        """Arquivos com mais IDs que o limite de parametros do SQLite sao aceitos."""
+        ids = [f"TXN{i:08d}" for i in range(40_000)]
+        resultado = inserir_transacoes(transacoes(ids), db_transacoes)
+        assert resultado["sucesso"]
+        assert resultado["registros_inseridos"] == 40_000
+
+    def test_duplicados_no_banco(self, db_transacoes):
+        """IDs ja existentes sao contados e reportados com a linha do arquivo."""
+        inserir_transacoes(transacoes(["TXN00000001", "TXN00000002"]), db_transacoes)
+        resultado = inserir_transacoes(transacoes([" TXN00000002", "TXN00000003"]), db_transacoes)
+
+        assert resultado["registros_inseridos"] == 1
+        assert resultado["registros_duplicados"] == 1
+        assert resultado["erros"] == [
+            {"linha": 1, "id_transacao": "TXN00000002", "erro": "ID duplicado (já existe no banco)"}
+        ]
+
+    def test_duplicados_no_arquivo(self, db_transacoes):
+        """A primeira ocorrencia de um ID repetido no arquivo e inserida."""
+        df = transacoes(["TXN00000001", "TXN00000001"], valor=[10.0, 20.0])
+        resultado = inserir_transacoes(df, db_transacoes)
+
+        assert resultado["registros_inseridos"] == 1
+        assert resultado["registros_duplicados"] == 1
+        assert resultado["erros"][0]["linha"] == 2
+
+        conn = sqlite3.connect(db_transacoes)
+        assert conn.execute("SELECT valor FROM transacoes_financeiras").fetchone()[0] == 10.0
+        conn.close()
+
+    def test_erro_de_conversao_por_linha(self, db_transacoes):
+        """Valor nao numerico gera erro da linha sem impedir as demais."""
+        df = transacoes(["TXN00000001", "TXN00000002"], valor=["10.5", "abc"])
+        resultado = inserir_transacoes(df, db_transacoes)
+
+        assert resultado["registros_inseridos"] == 1
+        assert [e["linha"] for e in resultado["erros"]] == [2]
+        assert resultado["erros"][0]["id_transacao"] == "TXN00000002"
+
+
+# =============================================================================
+# TESTES DA CODIFICACAO POR COLUNA
+# =============================================================================
+
+class TestCodificacaoColunas:
+    """Os valores chegam ao SQLite como tipos nativos, sem replace previo."""
+
+    def test_nulos_do_pandas_viram_null(self, db_transacoes):
+        """NaN, pd.NA e None sao gravados como NULL."""
+        df = transacoes(["TXN00000001", "TXN00000002", "TXN00000003"])
+        df["descricao"] = pd.Series(["texto", pd.NA, None], dtype=object)
+        df["conta_destino"] = [float("nan"), "999", None]
+        resultado = inserir_transacoes(df, db_transacoes)
+        assert resultado["registros_inseridos"] == 3
+
+        conn = sqlite3.connect(db_transacoes)
+        linhas = conn.execute(
+            "SELECT descricao, conta_destino FROM transacoes_financeiras ORDER BY id_transacao"
+        ).fetchall()
+        conn.close()
+        assert linhas == [("texto", None), (None, "999"), (None, None)]
+
+    def test_tipos_numpy_e_datas(self, db_transacoes):
+        """Inteiros numpy e colunas datetime sao convertidos uma vez por coluna."""
+        df = transacoes(["TXN00000001"], conta_origem=pd.Series([12345], dtype="int64"))
+        df["data_transacao"] = pd.to_datetime(["2024-03-01"])
+        df["valor"] = pd.Series([7], dtype="int64")
+        assert inserir_transacoes(df, db_transacoes)["registros_inseridos"] == 1
+
+        conn = sqlite3.connect(db_transacoes)
+        linha = conn.execute("SELECT data_transacao, valor, conta_origem FROM transacoes_financeiras").fetchone()
+        conn.close()
+        assert linha == ("2024-03-01", 7.0, "12345")
+
+    def test_valor_ausente_reportado(self, db_transacoes):
+        """Valor nulo gera erro da linha, com o indice original do DataFrame."""
+        df = transacoes(["TXN00000001", "TXN00000002"], valor=[None, 5.0])
+        df.index = [10, 11]
+        resultado = inserir_transacoes(df, db_transacoes)
+        assert resultado["registros_inseridos"] == 1
+        assert resultado["erros"] == [{"linha": 11, "id_transacao": "TXN00000001", "erro": "Campo obrigatorio ausente: valor"}]
+
+
+# =============================================================================
+# TESTES DE VALORES EM CENTAVOS
+# =============================================================================
+
+class TestValorCentavos:
+    """O valor e gravado tambem como inteiro de centavos."""
+
+    def test_centavos_gravados(self, db_transacoes):
+        """Texto e float chegam ao banco com os mesmos centavos exatos."""
+        df = transacoes(["TXN00000001", "TXN00000002"], valor=pd.Series(["1234.56", 0.1 + 0.2], dtype=object))
+        inserir_transacoes(df, db_transacoes)
+
+        conn = sqlite3.connect(db_transacoes)
+        linhas = conn.execute("SELECT valor, valor_centavos FROM transacoes_financeiras ORDER BY id_transacao").fetchall()
+        conn.close()
+        assert linhas == [(1234.56, 123456), (0.3, 30)]
+
+    def test_texto_brl_ponta_a_ponta(self, db_transacoes):
+        """Valores no formato brasileiro passam pela pre-verificacao e sao gravados convertidos."""
+        df = transacoes(["TXN00000001", "TXN00000002", "TXN00000003"], valor=pd.Series(["1.234,56", "R$ 1.500", "-5,00"], dtype=object))
+        resultado = inserir_transacoes(df, db_transacoes)
+
+        assert resultado["registros_inseridos"] == 2
+        # O CHECK valor > 0 e avaliado sobre o valor convertido
+        assert [e["linha"] for e in resultado["erros"]] == [3]
+        assert "valor > 0" in resultado["erros"][0]["erro"]
+        conn = sqlite3.connect(db_transacoes)
+        linhas = conn.execute("SELECT valor, valor_centavos FROM transacoes_financeiras ORDER BY id_transacao").fetchall()
+        conn.close()
+        assert linhas == [(1234.56, 123456), (1500.0, 150000)]
+
+    def test_visao_decimal_e_soma(self, db_transacoes):
+        """A visao expoe o decimal exato e a soma dos centavos nao tem desvio."""
+        inserir_transacoes(transacoes([f"TXN{i:08d}" for i in range(10)], valor=0.1), db_transacoes)
+
+        conn = sqlite3.connect(db_transacoes)
+        decimal = conn.execute("SELECT DISTINCT valor_decimal FROM transacoes_valor_decimal").fetchall()
+        soma = conn.execute("SELECT SUM(valor_centavos) FROM transacoes_financeiras").fetchone()[0]
+        conn.close()
+        assert decimal == [("0.10",)]
+        assert soma == 100
+
+    def test_migracao_preenche_linhas_antigas(self, tmp_path, monkeypatch):
+        """Bancos sem a coluna recebem coluna, indice, visao e os centavos das linhas existentes."""
+        db_path = tmp_path / "antigo.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE transacoes_financeiras (id_transacao TEXT PRIMARY KEY, data_transacao DATE, valor DECIMAL(15, 2), "
+                     "tipo TEXT, categoria TEXT, descricao TEXT, conta_origem TEXT, conta_destino TEXT, status TEXT, "
+                     "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        conn.executemany("INSERT INTO transacoes_financeiras (id_transacao, valor) VALUES (?, ?)",
+                         [(f"TXN{i:08d}", 10.05 + i) for i in range(5)])
+        conn.commit()
+        conn.close()
+
+        monkeypatch.setattr(insert_data, "TAMANHO_LOTE_CENTAVOS", 2)
+        insert_data.init_valor_centavos(db_path)
+
+        conn = sqlite3.connect(db_path)
+        centavos = [c for c, in conn.execute("SELECT valor_centavos FROM transacoes_financeiras ORDER BY rowid")]
+        indices = [linha[1] for linha in conn.execute("PRAGMA index_list(transacoes_financeiras)")]
+        decimal = conn.execute("SELECT valor_decimal FROM transacoes_valor_decimal WHERE id_transacao = 'TXN00000000'").fetchone()
+        conn.close()
+        assert centavos == [1005, 1105, 1205, 1305, 1405]
+        assert "idx_valor_centavos" in indices
+        assert decimal == ("10.05",)
+
+
+# =============================================================================
+# TESTES DE LOTES E CHECKPOINTS
+# =============================================================================
+
+def _contar_checkpoints(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM checkpoints_insercao").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestLotesRetomaveis:
+    """Cada lote e gravado com seu checkpoint e a insercao retoma do ponto da falha."""
+
+    def test_progresso_por_lote(self, db_transacoes):
+        """O callback recebe o total processado apos cada lote."""
+        chamadas = []
+        df = transacoes([f"TXN{i:08d}" for i in range(25)])
+        resultado = inserir_transacoes(df, db_transacoes, tamanho_lote=10, progresso=lambda p, t: chamadas.append((p, t)))
+
+        assert resultado["registros_inseridos"] == 25
+        assert chamadas == [(0, 25), (10, 25), (20, 25), (25, 25)]
+        assert _contar_checkpoints(db_transacoes) == 0
+
+    def test_retoma_apos_falha(self, db_transacoes, monkeypatch):
+        """Lotes gravados antes da falha nao sao reprocessados na nova tentativa."""
+        df = transacoes([f"TXN{i:08d}" for i in range(30)], valor=[1.0] * 29 + ["abc"])
+        original = insert_data._inserir_lote
+        lotes = []
+
+        def falhar_no_segundo(cursor, df_lote, *args):
+            lotes.append(df_lote.index[0])
+            if len(lotes) == 2:
+                raise sqlite3.OperationalError("disk I/O error")
+            return original(cursor, df_lote, *args)
+
+        monkeypatch.setattr(insert_data, "_inserir_lote", falhar_no_segundo)
+        resultado = inserir_transacoes(df, db_transacoes, tamanho_lote=10)
+        assert not resultado["sucesso"]
+        assert resultado["registros_inseridos"] == 10
+        assert "Erro fatal no banco" in resultado["erros"][-1]["erro"]
+        assert contar_transacoes(db_transacoes) == 10
+        assert _contar_checkpoints(db_transacoes) == 1
+
+        monkeypatch.setattr(insert_data, "_inserir_lote", original)
+        chamadas = []
+        resultado = inserir_transacoes(df, db_transacoes, tamanho_lote=10, progresso=lambda p, t: chamadas.append(p))
+        assert resultado["sucesso"]
+        assert resultado["registros_inseridos"] == 29
+        assert resultado["registros_duplicados"] == 0
+        assert [e["linha"] for e in resultado["erros"]] == [30]
+        # A linha invalida sai antes dos lotes e ja conta como processada
+        assert chamadas[0] == 11
+        assert contar_transacoes(db_transacoes) == 29
+        assert _contar_checkpoints(db_transacoes) == 0
+
+    def test_tamanho_de_lote_diferente_descarta_checkpoints(self, db_transacoes):
+        """Checkpoints de outro tamanho de lote nao sao reaproveitados."""
+        df = transacoes([f"TXN{i:08d}" for i in range(20)])
+        conn = sqlite3.connect(db_transacoes)
+        insert_data._garantir_tabela_checkpoints(conn.cursor())
+        conn.execute(
+            "INSERT INTO checkpoints_insercao (hash_arquivo, lote, tamanho_lote, linhas, registros_inseridos, registros_duplicados, erros) "
+            "VALUES (?, 0, 5, 5, 5, 0, '[]')",
+            (insert_data.gerar_hash_dataframe(df),)
+        )
+        conn.commit()
+        conn.close()
+
+        resultado = inserir_transacoes(df, db_transacoes, tamanho_lote=10)
+        assert resultado["registros_inseridos"] == 20
+        assert _contar_checkpoints(db_transacoes) == 0
+
+
+# =============================================================================
+# TESTES DE ISOLAMENTO DE LINHAS INVALIDAS
+# =============================================================================
+
+class TestIsolamentoRestricoes:
+    """Linhas que violam CHECK/NOT NULL sao reportadas sem derrubar o lote."""
+
+    @pytest.fixture(autouse=True)
+    def sem_pre_validacao(self, monkeypatch):
+        # Forca as violacoes a chegarem ao banco, como restricoes que o verificador nao conhece
+        monkeypatch.setattr(insert_data, "verificar_restricoes", lambda df: (np.zeros(len(df), dtype=bool), []))
+
+    def test_linhas_invalidas_isoladas(self, db_transacoes):
+        """As demais linhas sao inseridas e cada violacao aparece com sua linha."""
+        ids = [f"TXN{i:08d}" for i in range(100)]
+        valores = [10.0] * 100
+        valores[7] = -5.0
+        categorias = ["OUTROS"] * 100
+        categorias[63] = "VIAGEM"
+        resultado = inserir_transacoes(transacoes(ids, valor=valores, categoria=categorias), db_transacoes)
+
+        assert resultado["sucesso"]
+        assert resultado["registros_inseridos"] == 98
+        assert [e["linha"] for e in resultado["erros"]] == [8, 64]
+        assert resultado["erros"][0]["id_transacao"] == "TXN00000007"
+        assert "valor > 0" in resultado["erros"][0]["erro"]
+        assert "Violacao de restricao" in resultado["erros"][1]["erro"]
+        assert contar_transacoes(db_transacoes) == 98
+
+    def test_quantidade_de_comandos_logaritmica(self, db_transacoes, monkeypatch):
+        """Uma linha invalida em 1024 e encontrada com poucas tentativas."""
+        tentativas = []
+        original = insert_data._inserir_faixa_staging
+
+        def contar(cursor, rowids, duplicados, erros):
+            tentativas.append(len(rowids))
+            return original(cursor, rowids, duplicados, erros)
+
+        monkeypatch.setattr(insert_data, "_inserir_faixa_staging", contar)
+        valores = [10.0] * 1024
+        valores[500] = 0.0
+        resultado = inserir_transacoes(transacoes([f"TXN{i:08d}" for i in range(1024)], valor=valores), db_transacoes)
+
+        assert resultado["registros_inseridos"] == 1023
+        assert len(tentativas) <= 2 * 10 + 1
+
+    def test_duplicado_invalido_reportado_uma_vez(self, db_transacoes):
+        """Linha duplicada que tambem viola restricao conta apenas como duplicada."""
+        df = transacoes(["TXN00000001", "TXN00000001"], tipo=["CREDITO", "PIX"])
+        resultado = inserir_transacoes(df, db_transacoes)
+        assert resultado["registros_inseridos"] == 1
+        assert resultado["registros_duplicados"] == 1
+        assert len(resultado["erros"]) == 1
+
+
+# =============================================================================
+# TESTES DA PRE-VALIDACAO DO SCHEMA
+# =============================================================================
+
+class TestPreValidacao:
+    """Violacoes conhecidas do schema nao chegam ao banco."""
+
+    def test_linhas_invalidas_nao_chegam_ao_banco(self, db_transacoes, monkeypatch):
+        """Somente linhas limpas sao gravadas, sem acionar a bissecao."""
+        bissecoes = []
+        original = insert_data._inserir_faixa_staging
+
+        def contar(cursor, rowids, duplicados, erros):
+            bissecoes.append(len(rowids))
+            return original(cursor, rowids, duplicados, erros)
+
+        monkeypatch.setattr(insert_data, "_inserir_faixa_staging", contar)
+        df = transacoes(
+            [f"TXN{i:08d}" for i in range(6)],
+            valor=[10.0, -1.0, 10.0, 10.0, 10.0, 10.0],
+            tipo=["CREDITO", "CREDITO", "PIX", "DEBITO", "CREDITO", "CREDITO"],
+            status=["CONFIRMADO", "CONFIRMADO", "CONFIRMADO", "CONFIRMADO", None, "CONFIRMADO"],
+        )
+        resultado = inserir_transacoes(df, db_transacoes)
+
+        assert resultado["registros_inseridos"] == 3
+        assert [e["linha"] for e in resultado["erros"]] == [2, 3, 5]
+        assert bissecoes == [3]
+        assert contar_transacoes(db_transacoes) == 3
@@ -0,0 +1,138 @@
+"""
+Testes do analisador estatico de desempenho dos scripts gerados.
+
+Execute com: pytest tests/test_linter_desempenho.py -v
+"""
+
+import sqlite3
+
+import pytest
+
+from app.services.linter_desempenho import (
+    analisar_desempenho,
+    precisa_vetorizar,
+    init_pontuacao_scripts,
+)
+
+from tests.conftest import DATABASE_DIR
+
+
+def _padroes(codigo):
+    return [p["padrao"] for p in analisar_desempenho(codigo)["problemas"]]
+
+
+# =============================================================================
+# TESTES DE DETECCAO DE PADROES
+# =============================================================================
+
+class TestPadroesLentos:
+    """Cada padrao conhecido e identificado com a linha correta."""
+
+    def test_script_vetorizado(self):
+        """Operacoes por coluna recebem pontuacao maxima."""
+        codigo = (
+            "df['valor'] = df['valor'].str.replace(',', '.').astype(float)\n"
+            "df['data'] = pd.to_datetime(df['data'], format='%d/%m/%Y').dt.strftime('%Y-%m-%d')\n"
+            "for col in ['a', 'b']:\n"
+            "    df[col] = df[col].str.strip()\n"
+        )
+        analise = analisar_desempenho(codigo)
+        assert analise["pontuacao"] == 100
+        assert not precisa_vetorizar(analise)
+
+    def test_iterrows(self):
+        """iterrows e sinalizado uma unica vez, mesmo usado como iteravel."""
+        codigo = "for i, row in df.iterrows():\n    df.loc[i, 'x'] = row['y']\n"
+        assert _padroes(codigo) == ["iterrows", "acesso_escalar_em_laco"]
+
+    def test_itertuples_em_laco(self):
+        """itertuples em laco ou compreensao e sinalizado."""
+        assert _padroes("for r in df.itertuples():\n    pass\n") == ["itertuples_em_laco"]
+        assert _padroes("x = [r.a for r in df.itertuples()]") == ["itertuples_em_laco"]
+
+    @pytest.mark.parametrize("eixo", ["1", "'columns'"])
+    def test_apply_por_linha(self, eixo):
+        """apply(axis=1) e sinalizado; apply em Series nao."""
+        assert _padroes(f"df['x'] = df.apply(lambda r: r['a'], axis={eixo})") == ["apply_por_linha"]
+        assert _padroes("df['x'] = df['a'].apply(str.upper)") == []
+
+    def test_laco_sobre_dataframe(self):
+        """Lacos que percorrem as linhas do df sao sinalizados."""
+        assert _padroes("for v in df['valor']:\n    pass\n") == ["laco_sobre_dataframe"]
+        assert _padroes("for i in range(len(df)):\n    pass\n") == ["laco_sobre_dataframe"]
+        assert _padroes("for x in df:\n    pass\n") == ["laco_sobre_dataframe"]
+        assert _padroes("for v in df.values:\n    pass\n") == ["laco_sobre_dataframe"]
+        assert _padroes("for i in df.index:\n    pass\n") == ["laco_sobre_dataframe"]
+
+    @pytest.mark.parametrize("iteravel", ["df.columns", "df.dtypes", "df.items()", "range(len(df.columns))"])
+    def test_laco_sobre_colunas_nao_penaliza(self, iteravel):
+        """Percorrer colunas e barato e mantem a pontuacao maxima."""
+        codigo = f"for c in {iteravel}:\n    df[c] = df[c].fillna(0)\n"
+        assert analisar_desempenho(codigo)["pontuacao"] == 100
+
+    def test_to_datetime_sem_formato(self):
+        """Cada conversao de data sem formato e penalizada."""
+        codigo = "df['a'] = pd.to_datetime(df['a'])\ndf['b'] = pd.to_datetime(df['b'], dayfirst=True)\n"
+        assert _padroes(codigo) == ["to_datetime_sem_formato", "to_datetime_sem_formato"]
+
+    def test_copia_e_concat_em_laco(self):
+        """Copias e concatenacoes repetidas dentro de laco sao sinalizadas."""
+        codigo = (
+            "partes = []\n"
+            "for c in ['a', 'b']:\n"
+            "    tmp = df.copy()\n"
+            "    saida = pd.concat([saida, tmp])\n"
+        )
+        assert _padroes(codigo) == ["copia_em_laco", "concat_em_laco"]
+        assert _padroes("tmp = df.copy()") == []
+
+    def test_pontuacao_acumula_penalidades(self):
+        """Scripts com varios padroes lentos caem abaixo do minimo."""
+        codigo = "for i, row in df.iterrows():\n    df.loc[i, 'x'] = pd.to_datetime(row['d'])\n"
+        analise = analisar_desempenho(codigo)
+        assert analise["pontuacao"] == 100 - 40 - 15 - 10
+        assert precisa_vetorizar(analise)
+
+    def test_erro_de_sintaxe(self):
+        """Codigo invalido nao recebe pontuacao."""
+        assert analisar_desempenho("df[")["pontuacao"] is None
+
+
+# =============================================================================
+# TESTES DE PONTUACAO NO CACHE
+# =============================================================================
+
+class TestPontuacaoCache:
+    """Migracao e preenchimento da pontuacao em bancos existentes."""
+
+    def test_bancos_antigos_recebem_coluna_e_pontuacao(self, tmp_path):
+        """A coluna e criada e os scripts existentes sao pontuados."""
+        db_path = tmp_path / "antigo.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE scripts_transformacao (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash_estrutura TEXT UNIQUE NOT NULL,
+                script_python TEXT NOT NULL
+            )
+        """)
+        conn.execute("INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES ('a', 'df = df')")
+        conn.execute("INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES ('b', 'for i, r in df.iterrows():\n    pass')")
+        conn.commit()
+        conn.close()
+
+        init_pontuacao_scripts(db_path)
+
+        conn = sqlite3.connect(db_path)
+        pontuacoes = dict(conn.execute("SELECT hash_estrutura, pontuacao_desempenho FROM scripts_transformacao"))
+        conn.close()
+        assert pontuacoes == {"a": 100, "b": 60}
+
+    def test_schema_oficial_possui_coluna(self, tmp_path):
+        """Bancos novos ja nascem com a coluna de pontuacao."""
+        conn = sqlite3.connect(tmp_path / "novo.db")
+        with open(DATABASE_DIR / "schema.sql", "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        colunas = {row[1] for row in conn.execute("PRAGMA table_info(scripts_transformacao)")}
+        conn.close()
+        assert "pontuacao_desempenho" in colunas
@@ -0,0 +1,193 @@
+"""
+Testes dos lotes de importacao e da remocao de um lote inteiro.
+
+Execute com: pytest tests/test_lotes_ingestao.py -v
+"""
+
+import sqlite3
+
+import pytest
+
+import app.services.insert_data as insert_data
+from app.services.filtro_ids import ids_existentes
+from app.services.insert_data import inserir_transacoes, inserir_transacoes_agrupadas
+from app.services.logger import SQL_TABELA_MONITORAMENTO
+from app.services.lotes_ingestao import init_lotes_ingestao, listar_lotes, remover_lote
+
+from tests._fabricas import criar_banco_transacoes, transacoes
+
+
+@pytest.fixture
+def db_transacoes(tmp_path):
+    """Banco temporario com o schema oficial e a tabela de monitoramento."""
+    db_path = criar_banco_transacoes(tmp_path / "transacoes.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(SQL_TABELA_MONITORAMENTO)
+    conn.executemany(
+        "INSERT INTO monitoramento_processamento (id, arquivo_hash, arquivo_nome, status) VALUES (?, 'h', ?, 'CONCLUIDO')",
+        [(1, "a.csv"), (2, "b.csv")]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def _lotes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT lote_id, COUNT(*) FROM transacoes_financeiras GROUP BY lote_id").fetchall())
+    finally:
+        conn.close()
+
+
+# =============================================================================
+# TESTES DE MARCACAO DO LOTE
+# =============================================================================
+
+class TestMarcacaoLote:
+    """Toda linha gravada leva o lote da sua importacao."""
+
+    def test_insercao_grava_lote(self, db_transacoes):
+        """Arquivos diferentes ficam em lotes diferentes."""
+        inserir_transacoes(transacoes(["A1", "A2"]), db_transacoes, lote_id=1)
+        inserir_transacoes(transacoes(["B1"]), db_transacoes, lote_id=2)
+        assert _lotes(db_transacoes) == {1: 2, 2: 1}
+
+    def test_insercao_agrupada_grava_lote_de_cada_arquivo(self, db_transacoes):
+        """Na transacao compartilhada cada arquivo mantem o proprio lote."""
+        inserir_transacoes_agrupadas([transacoes(["A1"]), transacoes(["B1", "B2"])], db_transacoes, [1, 2])
+        assert _lotes(db_transacoes) == {1: 1, 2: 2}
+
+    def test_listar_lotes(self, db_transacoes):
+        """Somente lotes com linhas gravadas aparecem, do mais recente ao mais antigo."""
+        inserir_transacoes(transacoes(["A1", "A2"]), db_transacoes, lote_id=1)
+        lotes = listar_lotes(db_transacoes)
+        assert lotes[["lote_id", "arquivo_nome", "registros"]].to_dict("records") == [
+            {"lote_id": 1, "arquivo_nome": "a.csv", "registros": 2}
+        ]
+
+
+# =============================================================================
+# TESTES DE REMOCAO
+# =============================================================================
+
+class TestRemocaoLote:
+    """O lote sai inteiro, sem afetar os demais, e pode ser importado de novo."""
+
+    def test_remove_somente_o_lote(self, db_transacoes):
+        """As linhas do lote sao apagadas e o monitoramento registra a remocao."""
+        inserir_transacoes(transacoes(["A1", "A2"]), db_transacoes, lote_id=1)
+        inserir_transacoes(transacoes(["B1"]), db_transacoes, lote_id=2)
+
+        assert remover_lote(1, db_transacoes) == 2
+        assert _lotes(db_transacoes) == {2: 1}
+
+        conn = sqlite3.connect(db_transacoes)
+        status = conn.execute("SELECT status, etapa_final, registros_inseridos FROM monitoramento_processamento WHERE id = 1").fetchone()
+        conn.close()
+        assert status == ("CANCELADO", "LOTE_REMOVIDO", 0)
+
+    def test_remocao_usa_indice(self, db_transacoes):
+        """O DELETE do lote e resolvido pelo indice de lote_id."""
+        conn = sqlite3.connect(db_transacoes)
+        plano = " ".join(linha[-1] for linha in conn.execute(
+            "EXPLAIN QUERY PLAN DELETE FROM transacoes_financeiras WHERE lote_id = ?", (1,)
+        ))
+        conn.close()
+        assert "idx_lote_id" in plano
+
+    def test_reimportacao_apos_remocao(self, db_transacoes):
+        """Os mesmos IDs voltam a ser aceitos depois que o lote e removido."""
+        df = transacoes(["A1", "A2"])
+        inserir_transacoes(df, db_transacoes, lote_id=1)
+        remover_lote(1, db_transacoes)
+
+        assert ids_existentes(["A1", "A2"], db_transacoes) == set()
+        resultado = inserir_transacoes(df, db_transacoes, lote_id=1)
+        assert resultado["registros_inseridos"] == 2
+        assert resultado["registros_duplicados"] == 0
+
+    def test_checkpoints_do_lote_descartados(self, db_transacoes, monkeypatch):
+        """Lotes gravados por uma importacao interrompida nao sao pulados na reimportacao."""
+        original = insert_data._inserir_lote
+
+        def falhar_no_segundo(cursor, df_lote, *args):
+            if "A3" in df_lote["id_transacao"].tolist():
+                raise sqlite3.OperationalError("falha simulada")
+            return original(cursor, df_lote, *args)
+
+        df = transacoes(["A1", "A2", "A3"])
+        monkeypatch.setattr(insert_data, "_inserir_lote", falhar_no_segundo)
+        assert not inserir_transacoes(df, db_transacoes, tamanho_lote=2, lote_id=1)["sucesso"]
+
+        remover_lote(1, db_transacoes)
+        monkeypatch.setattr(insert_data, "_inserir_lote", original)
+        resultado = inserir_transacoes(df, db_transacoes, tamanho_lote=2, lote_id=1)
+        assert resultado["registros_inseridos"] == 3
+        assert _lotes(db_transacoes) == {1: 3}
+
+    def test_desfazer_apos_retomada(self, db_transacoes, monkeypatch):
+        """Retomada sob outro lote remarca os lotes ja gravados; desfazer remove o arquivo inteiro."""
+        original = insert_data._inserir_lote
+
+        def falhar_no_segundo(cursor, df_lote, *args):
+            if "A3" in df_lote["id_transacao"].tolist():
+                raise sqlite3.OperationalError("falha simulada")
+            return original(cursor, df_lote, *args)
+
+        df = transacoes(["A1", "A2", "A3"])
+        monkeypatch.setattr(insert_data, "_inserir_lote", falhar_no_segundo)
+        inserir_transacoes(df, db_transacoes, tamanho_lote=2, lote_id=1)
+        assert _lotes(db_transacoes) == {1: 2}
+
+        monkeypatch.setattr(insert_data, "_inserir_lote", original)
+        resultado = inserir_transacoes(df, db_transacoes, tamanho_lote=2, lote_id=2)
+        assert resultado["registros_inseridos"] == 3
+        assert _lotes(db_transacoes) == {2: 3}
+
+        assert remover_lote(2, db_transacoes) == 3
+        assert _lotes(db_transacoes) == {}
+
+    def test_retomada_preserva_ids_de_outros_lotes(self, db_transacoes, monkeypatch):
+        """IDs do arquivo que ja pertenciam a outra importacao nao mudam de lote."""
+        inserir_transacoes(transacoes(["B1"]), db_transacoes, lote_id=2)
+        original = insert_data._inserir_lote
+
+        def falhar_no_segundo(cursor, df_lote, *args):
+            if "A3" in df_lote["id_transacao"].tolist():
+                raise sqlite3.OperationalError("falha simulada")
+            return original(cursor, df_lote, *args)
+
+        df = transacoes(["A1", "B1", "A3"])
+        monkeypatch.setattr(insert_data, "_inserir_lote", falhar_no_segundo)
+        inserir_transacoes(df, db_transacoes, tamanho_lote=2)
+
+        monkeypatch.setattr(insert_data, "_inserir_lote", original)
+        inserir_transacoes(df, db_transacoes, tamanho_lote=2, lote_id=1)
+        assert _lotes(db_transacoes) == {1: 2, 2: 1}
+
+
+# =============================================================================
+# TESTES DE MIGRACAO
+# =============================================================================
+
+class TestMigracao:
+    """Bancos antigos recebem a coluna e o indice."""
+
+    def test_coluna_e_indice_adicionados(self, tmp_path):
+        """Tabelas sem lote_id sao alteradas sem perder as linhas."""
+        db_path = tmp_path / "antigo.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE transacoes_financeiras (id_transacao TEXT PRIMARY KEY, valor REAL)")
+        conn.execute("INSERT INTO transacoes_financeiras VALUES ('X', 1)")
+        conn.commit()
+        conn.close()
+
+        init_lotes_ingestao(db_path)
+
+        conn = sqlite3.connect(db_path)
+        linha = conn.execute("SELECT id_transacao, lote_id FROM transacoes_financeiras").fetchone()
+        indices = [linha[1] for linha in conn.execute("PRAGMA index_list(transacoes_financeiras)")]
+        conn.close()
+        assert linha == ("X", None)
+        assert "idx_lote_id" in indices
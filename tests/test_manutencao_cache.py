@@ -0,0 +1,196 @@
+"""
+Testes da manutencao do cache de scripts de transformacao.
+
+Execute com: pytest tests/test_manutencao_cache.py -v
+"""
+
+import sqlite3
+
+import pytest
+
+import app.services.script_cache as script_cache
+from app.services.perfil_scripts import init_perfil_scripts_tables
+from app.services.manutencao_cache import (
+    compactar_custos_scripts,
+    aplicar_limites_cache,
+)
+
+from tests.conftest import DATABASE_DIR
+
+
+@pytest.fixture
+def db_cache(tmp_path):
+    """Banco temporario com o schema oficial e a tabela legada de custos."""
+    db_path = tmp_path / "cache.db"
+    conn = sqlite3.connect(db_path)
+    with open(DATABASE_DIR / "schema.sql", "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.execute("""
+        CREATE TABLE script_costs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            script_id INTEGER,
+            custo_tokens INTEGER DEFAULT 0,
+            custo_acumulado INTEGER,
+            geracoes INTEGER
+        )
+    """)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def _inserir_script(db_path, hash_estrutura, script, vezes_utilizado=1, dias_atras=0, custos=()):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO scripts_transformacao (hash_estrutura, script_python, vezes_utilizado, updated_at)
+        VALUES (?, ?, ?, datetime('now', ?))
+        """,
+        (hash_estrutura, script, vezes_utilizado, f"-{dias_atras} days")
+    )
+    script_id = cursor.lastrowid
+    for custo in custos:
+        cursor.execute("INSERT INTO script_costs (script_id, custo_tokens) VALUES (?, ?)", (script_id, custo))
+    conn.commit()
+    conn.close()
+    return script_id
+
+
+# =============================================================================
+# TESTES DE COMPACTACAO DE CUSTOS
+# =============================================================================
+
+class TestCompactacaoCustos:
+    """Consolida o historico de custos em uma linha por script."""
+
+    def test_consolida_linhas_repetidas(self, db_cache):
+        """Varias geracoes do mesmo script viram uma unica linha agregada."""
+        script_id = _inserir_script(db_cache, "h1", "df = df", custos=(100, 200, 300))
+
+        removidas = compactar_custos_scripts(db_cache)
+
+        conn = sqlite3.connect(db_cache)
+        linhas = conn.execute(
+            "SELECT custo_tokens, custo_acumulado, geracoes FROM script_costs WHERE script_id = ?",
+            (script_id,)
+        ).fetchall()
+        conn.close()
+
+        assert removidas == 2
+        assert linhas == [(300, 600, 3)]
+
+    def test_remove_custos_orfaos(self, db_cache):
+        """Custos de scripts que ja nao existem sao descartados."""
+        conn = sqlite3.connect(db_cache)
+        conn.execute("INSERT INTO script_costs (script_id, custo_tokens) VALUES (999, 50)")
+        conn.commit()
+        conn.close()
+
+        compactar_custos_scripts(db_cache)
+
+        conn = sqlite3.connect(db_cache)
+        total = conn.execute("SELECT COUNT(*) FROM script_costs").fetchone()[0]
+        conn.close()
+        assert total == 0
+
+    def test_inicializacao_compacta_uma_unica_vez(self, db_cache, monkeypatch):
+        """Depois que o indice unico existe, iniciar o app nao repete a compactacao."""
+        _inserir_script(db_cache, "h1", "df = df", custos=(100, 200))
+        chamadas = []
+
+        def compactar(db_path):
+            chamadas.append(db_path)
+            return compactar_custos_scripts(db_path)
+
+        monkeypatch.setattr(script_cache, "DB_PATH", db_cache)
+        monkeypatch.setattr(script_cache, "compactar_custos_scripts", compactar)
+        monkeypatch.setattr(script_cache, "agendar_manutencao_cache", lambda db_path: False)
+
+        script_cache.init_script_costs_table()
+        script_cache.init_script_costs_table()
+
+        conn = sqlite3.connect(db_cache)
+        linhas = conn.execute("SELECT custo_acumulado FROM script_costs").fetchall()
+        conn.close()
+        assert chamadas == [db_cache]
+        assert linhas == [(300,)]
+
+
+# =============================================================================
+# TESTES DE LIMITES DO CACHE
+# =============================================================================
+
+class TestLimitesCache:
+    """Aplica orcamentos de entradas e bytes descartando entradas frias."""
+
+    def test_respeita_limite_de_entradas(self, db_cache):
+        """Entradas pouco usadas e antigas sao removidas primeiro."""
+        _inserir_script(db_cache, "quente", "df = df", vezes_utilizado=50, dias_atras=1)
+        _inserir_script(db_cache, "recente", "df = df", vezes_utilizado=2, dias_atras=0)
+        _inserir_script(db_cache, "frio", "df = df", vezes_utilizado=1, dias_atras=30, custos=(10,))
+
+        removidos = aplicar_limites_cache(limite_entradas=2, limite_bytes=10**9, db_path=db_cache)
+
+        conn = sqlite3.connect(db_cache)
+        restantes = {row[0] for row in conn.execute("SELECT hash_estrutura FROM scripts_transformacao")}
+        custos = conn.execute("SELECT COUNT(*) FROM script_costs").fetchone()[0]
+        conn.close()
+
+        assert removidos == 1
+        assert restantes == {"quente", "recente"}
+        assert custos == 0
+
+    def test_respeita_limite_de_bytes(self, db_cache):
+        """O orcamento de bytes remove entradas ate caber no limite."""
+        _inserir_script(db_cache, "grande", "x" * 1000, vezes_utilizado=1, dias_atras=10)
+        _inserir_script(db_cache, "pequeno", "y" * 10, vezes_utilizado=5, dias_atras=0)
+
+        aplicar_limites_cache(limite_entradas=100, limite_bytes=500, db_path=db_cache)
+
+        conn = sqlite3.connect(db_cache)
+        restantes = [row[0] for row in conn.execute("SELECT hash_estrutura FROM scripts_transformacao")]
+        conn.close()
+        assert restantes == ["pequeno"]
+
+    def test_dentro_do_limite_nao_remove(self, db_cache):
+        """Sem excesso nenhuma entrada e removida."""
+        _inserir_script(db_cache, "h1", "df = df")
+        assert aplicar_limites_cache(limite_entradas=10, limite_bytes=10**6, db_path=db_cache) == 0
+
+    def test_remove_dados_dependentes(self, db_cache):
+        """Execucoes, variantes e regeneracoes do script descartado saem junto com ele."""
+        init_perfil_scripts_tables(db_cache)
+        _inserir_script(db_cache, "quente", "df = df", vezes_utilizado=50)
+        frio_id = _inserir_script(db_cache, "frio", "df = df", vezes_utilizado=1, dias_atras=30)
+
+        conn = sqlite3.connect(db_cache)
+        for hash_estrutura, script_id in (("quente", None), ("frio", frio_id)):
+            conn.execute(
+                "INSERT INTO script_execucoes (script_id, hash_estrutura, hash_script, linhas, duracao_segundos) VALUES (?, ?, ?, 10, 0.1)",
+                (script_id, hash_estrutura, f"s-{hash_estrutura}")
+            )
+            conn.execute(
+                "INSERT INTO script_variantes (hash_estrutura, hash_script, script_python) VALUES (?, ?, 'df = df')",
+                (hash_estrutura, f"s-{hash_estrutura}")
+            )
+            conn.execute(
+                "INSERT INTO fila_regeneracao (hash_estrutura, hash_script, script_id) VALUES (?, ?, ?)",
+                (hash_estrutura, f"s-{hash_estrutura}", script_id)
+            )
+        conn.commit()
+        conn.close()
+
+        assert aplicar_limites_cache(limite_entradas=1, limite_bytes=10**9, db_path=db_cache) == 1
+
+        conn = sqlite3.connect(db_cache)
+        restantes = {
+            tabela: [row[0] for row in conn.execute(f"SELECT hash_estrutura FROM {tabela}")]
+            for tabela in ("script_execucoes", "script_variantes", "fila_regeneracao")
+        }
+        conn.close()
+        assert restantes == {
+            "script_execucoes": ["quente"],
+            "script_variantes": ["quente"],
+            "fila_regeneracao": ["quente"],
+        }
@@ -0,0 +1,176 @@
+"""
+Testes da exportacao e importacao do pacote de cache de scripts.
+
+Execute com: pytest tests/test_pacote_cache.py -v
+"""
+
+import base64
+import gzip
+import json
+import marshal
+import sqlite3
+
+import pytest
+
+import app.services.script_cache as script_cache
+from app.services.pacote_cache import gerar_pacote_cache, importar_pacote_cache, ler_pacote_cache
+
+from tests.conftest import DATABASE_DIR
+
+
+@pytest.fixture
+def criar_db(tmp_path):
+    """Cria bancos temporarios com o schema oficial e a tabela de custos."""
+    def criar(nome):
+        db_path = tmp_path / nome
+        conn = sqlite3.connect(db_path)
+        with open(DATABASE_DIR / "schema.sql", "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.execute("""
+            CREATE TABLE script_costs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                script_id INTEGER,
+                custo_tokens INTEGER DEFAULT 0,
+                custo_acumulado INTEGER,
+                geracoes INTEGER
+            )
+        """)
+        conn.execute("CREATE UNIQUE INDEX idx_costs_script_unico ON script_costs(script_id)")
+        conn.commit()
+        conn.close()
+        return db_path
+    return criar
+
+
+def _inserir_script(db_path, hash_estrutura, script, vezes_utilizado=1, updated_at="2024-01-01 00:00:00", custo=0):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO scripts_transformacao (hash_estrutura, script_python, vezes_utilizado, updated_at) VALUES (?, ?, ?, ?)",
+        (hash_estrutura, script, vezes_utilizado, updated_at)
+    )
+    cursor.execute(
+        "INSERT INTO script_costs (script_id, custo_tokens, custo_acumulado, geracoes) VALUES (?, ?, ?, 1)",
+        (cursor.lastrowid, custo, custo)
+    )
+    conn.commit()
+    conn.close()
+
+
+def _script(db_path, hash_estrutura):
+    conn = sqlite3.connect(db_path)
+    try:
+        linha = conn.execute("SELECT script_python FROM scripts_transformacao WHERE hash_estrutura = ?", (hash_estrutura,)).fetchone()
+        return linha[0] if linha else None
+    finally:
+        conn.close()
+
+
+def _pacote(entradas):
+    return gzip.compress(json.dumps({"formato": "script-cache-bundle", "versao": 1, "entradas": entradas}).encode("utf-8"))
+
+
+# =============================================================================
+# TESTES DE EXPORTACAO
+# =============================================================================
+
+class TestExportacao:
+    """O pacote leva o fonte, o uso e os custos de cada script."""
+
+    def test_pacote_com_entradas(self, criar_db):
+        """Todas as entradas locais sao exportadas, sem bytecode."""
+        origem = criar_db("origem.db")
+        _inserir_script(origem, "h1", "df = df", vezes_utilizado=3, custo=120)
+
+        pacote = ler_pacote_cache(gerar_pacote_cache(db_path=origem))
+        entrada = pacote["entradas"][0]
+
+        assert entrada["hash_estrutura"] == "h1"
+        assert entrada["script_python"] == "df = df"
+        assert entrada["vezes_utilizado"] == 3
+        assert entrada["custo_acumulado"] == 120
+        assert "codigo_compilado" not in entrada
+
+    def test_pacote_invalido(self):
+        """Conteudo que nao e um pacote e rejeitado."""
+        with pytest.raises(ValueError):
+            ler_pacote_cache(b"nao e gzip")
+        with pytest.raises(ValueError):
+            ler_pacote_cache(gzip.compress(json.dumps({"formato": "outro"}).encode("utf-8")))
+
+
+# =============================================================================
+# TESTES DE IMPORTACAO
+# =============================================================================
+
+class TestImportacao:
+    """Entradas novas sao inseridas e scripts invalidos sao descartados."""
+
+    def test_exportar_e_importar(self, criar_db):
+        """Um pacote exportado aquece outro banco."""
+        origem, destino = criar_db("origem.db"), criar_db("destino.db")
+        _inserir_script(origem, "h1", "df = df", custo=50)
+        _inserir_script(origem, "h2", "df['x'] = 1", custo=70)
+
+        resumo = importar_pacote_cache(gerar_pacote_cache(db_path=origem), db_path=destino)
+
+        assert resumo == {"inseridos": 2, "atualizados": 0, "mantidos": 0, "invalidos": 0}
+        assert _script(destino, "h2") == "df['x'] = 1"
+
+    def test_script_com_erro_de_sintaxe(self, criar_db):
+        """Fonte que nao compila nao entra no cache."""
+        destino = criar_db("destino.db")
+        resumo = importar_pacote_cache(_pacote([{"hash_estrutura": "h1", "script_python": "df = ("}]), db_path=destino)
+        assert resumo["invalidos"] == 1
+        assert _script(destino, "h1") is None
+
+    def test_bytecode_do_pacote_ignorado(self, criar_db):
+        """O codigo registrado e o fonte compilado localmente, nunca o bytecode recebido."""
+        destino = criar_db("destino.db")
+        malicioso = base64.b64encode(marshal.dumps(compile("df = None", "<x>", "exec"))).decode("ascii")
+        script = "df['ok'] = 1"
+
+        importar_pacote_cache(
+            _pacote([{"hash_estrutura": "h1", "script_python": script, "codigo_compilado": malicioso}]),
+            db_path=destino
+        )
+
+        namespace = {"df": {}}
+        exec(script_cache.obter_codigo_compilado(script), namespace)
+        assert namespace["df"] == {"ok": 1}
+
+
+# =============================================================================
+# TESTES DE ESTRATEGIAS DE CONFLITO
+# =============================================================================
+
+class TestConflitos:
+    """Quando o hash ja existe, a estrategia decide qual script fica."""
+
+    @pytest.mark.parametrize("estrategia, vence_remota", [
+        ("mais_recente", True),
+        ("mais_usado", False),
+        ("manter_local", False),
+        ("sobrescrever", True),
+    ])
+    def test_estrategias(self, criar_db, estrategia, vence_remota):
+        """A remota e mais recente e a local e mais usada."""
+        destino = criar_db("destino.db")
+        _inserir_script(destino, "h1", "df = df  # local", vezes_utilizado=10, updated_at="2024-01-01 00:00:00")
+        pacote = _pacote([{
+            "hash_estrutura": "h1",
+            "script_python": "df = df  # remota",
+            "vezes_utilizado": 2,
+            "updated_at": "2024-06-01 00:00:00",
+        }])
+
+        resumo = importar_pacote_cache(pacote, estrategia=estrategia, db_path=destino)
+
+        esperado = "df = df  # remota" if vence_remota else "df = df  # local"
+        assert _script(destino, "h1") == esperado
+        assert resumo["atualizados" if vence_remota else "mantidos"] == 1
+
+    def test_estrategia_desconhecida(self, criar_db):
+        """Estrategia fora da lista e rejeitada."""
+        with pytest.raises(ValueError):
+            importar_pacote_cache(_pacote([]), estrategia="aleatoria", db_path=criar_db("destino.db"))
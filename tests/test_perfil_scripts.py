@@ -0,0 +1,178 @@
+"""
+Testes do registro de desempenho e da selecao de variantes de scripts.
+
+Execute com: pytest tests/test_perfil_scripts.py -v
+"""
+
+import sqlite3
+from concurrent.futures import Future
+
+import pandas as pd
+import pytest
+
+import app.services.ai_code_generator as ai_code_generator
+import app.services.executor_scripts as executor_scripts
+import app.services.perfil_scripts as perfil_scripts
+from app.services.perfil_scripts import (
+    init_perfil_scripts_tables,
+    registrar_execucao_script,
+    registrar_script_validado,
+    carregar_perfil_scripts,
+    precisa_reescrita,
+    enfileirar_regeneracao,
+    LIMIAR_LINHAS_POR_SEGUNDO,
+)
+
+from tests.conftest import DATABASE_DIR
+
+SCRIPT_LENTO = "df['valor'] = df.apply(lambda r: float(r['valor']), axis=1)"
+SCRIPT_RAPIDO = "df['valor'] = df['valor'].astype(float)"
+
+
+@pytest.fixture
+def db_perfil(tmp_path):
+    """Banco temporario com o schema oficial e as tabelas de desempenho."""
+    db_path = tmp_path / "perfil.db"
+    conn = sqlite3.connect(db_path)
+    with open(DATABASE_DIR / "schema.sql", "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.execute(
+        "INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES (?, ?)",
+        ("estrutura", SCRIPT_LENTO)
+    )
+    conn.commit()
+    conn.close()
+    init_perfil_scripts_tables(db_path)
+    return db_path
+
+
+def _metricas(linhas, duracao):
+    return {
+        "linhas": linhas,
+        "duracao_segundos": duracao,
+        "linhas_por_segundo": linhas / duracao,
+        "memoria_pico_bytes": 1024 * 1024
+    }
+
+
+def _script_em_cache(db_path):
+    conn = sqlite3.connect(db_path)
+    script = conn.execute("SELECT script_python FROM scripts_transformacao WHERE hash_estrutura = 'estrutura'").fetchone()[0]
+    conn.close()
+    return script
+
+
+# =============================================================================
+# TESTES DE SELECAO DE VARIANTES
+# =============================================================================
+
+class TestSelecaoVariantes:
+    """O cache passa a servir o script validado mais rapido."""
+
+    def test_variante_mais_rapida_assume_o_cache(self, db_perfil):
+        """Uma variante mais rapida substitui o script atual."""
+        registrar_execucao_script(SCRIPT_LENTO, _metricas(10_000, 2.0), "estrutura", 1, db_perfil)
+        registrar_script_validado("estrutura", SCRIPT_LENTO, 1, db_path=db_perfil)
+
+        registrar_execucao_script(SCRIPT_RAPIDO, _metricas(10_000, 0.01), "estrutura", None, db_perfil)
+        resultado = registrar_script_validado("estrutura", SCRIPT_RAPIDO, 1, db_path=db_perfil)
+
+        assert resultado["substituiu"]
+        assert resultado["variantes"] == 2
+        assert _script_em_cache(db_perfil) == SCRIPT_RAPIDO
+
+    def test_variante_mais_lenta_nao_substitui(self, db_perfil):
+        """Uma nova variante mais lenta nao troca o script do cache."""
+        registrar_execucao_script(SCRIPT_RAPIDO, _metricas(10_000, 0.01), "estrutura", 1, db_perfil)
+        registrar_script_validado("estrutura", SCRIPT_RAPIDO, 1, db_path=db_perfil)
+        registrar_execucao_script(SCRIPT_LENTO, _metricas(10_000, 2.0), "estrutura", 1, db_perfil)
+        registrar_script_validado("estrutura", SCRIPT_LENTO, 1, db_path=db_perfil)
+
+        assert _script_em_cache(db_perfil) == SCRIPT_RAPIDO
+
+    def test_execucoes_sem_validacao_sao_ignoradas(self, db_perfil):
+        """Scripts que nunca passaram na validacao nao entram na disputa."""
+        registrar_execucao_script(SCRIPT_RAPIDO, _metricas(10_000, 0.01), "estrutura", None, db_perfil)
+        registrar_execucao_script(SCRIPT_LENTO, _metricas(10_000, 2.0), "estrutura", 1, db_perfil)
+        registrar_script_validado("estrutura", SCRIPT_LENTO, 1, db_path=db_perfil)
+
+        assert _script_em_cache(db_perfil) == SCRIPT_LENTO
+
+
+# =============================================================================
+# TESTES DE ALERTAS DE DESEMPENHO
+# =============================================================================
+
+class TestAlertas:
+    """Sinalizacao de scripts lentos ou com escala ruim."""
+
+    def test_escala_superlinear(self, db_perfil):
+        """Tempo crescendo com o quadrado das linhas e sinalizado."""
+        for linhas in (1_000, 2_000, 4_000):
+            registrar_execucao_script(SCRIPT_LENTO, _metricas(linhas, (linhas / 1_000) ** 2 * 0.001), "estrutura", 1, db_perfil)
+
+        perfil = carregar_perfil_scripts(db_perfil)
+
+        assert perfil.iloc[0]["expoente_escala"] == pytest.approx(2.0)
+        assert "Escala superlinear" in perfil.iloc[0]["alerta"]
+
+    def test_limiar_de_vazao(self):
+        """Arquivos pequenos nao disparam reescrita mesmo com vazao baixa."""
+        lento = LIMIAR_LINHAS_POR_SEGUNDO / 10
+        assert precisa_reescrita(_metricas(10_000, 10_000 / lento))
+        assert not precisa_reescrita(_metricas(10, 10 / lento))
+
+    def test_fila_nao_duplica(self, db_perfil):
+        """O mesmo script so entra uma vez na fila de reescrita."""
+        metricas = _metricas(10_000, 10.0)
+        assert enfileirar_regeneracao("estrutura", SCRIPT_LENTO, 1, metricas, db_perfil) is not None
+        assert enfileirar_regeneracao("estrutura", SCRIPT_LENTO, 1, metricas, db_perfil) is None
+
+
+# =============================================================================
+# TESTES DA REESCRITA VETORIZADA
+# =============================================================================
+
+class TestReescrita:
+    """A variante reescrita so entra no cache se reproduzir o resultado do script original."""
+
+    @pytest.fixture
+    def reescrita(self, monkeypatch):
+        estado = {"status": [], "variantes": []}
+
+        def executar(codigo, df):
+            namespace = {"df": df.copy(), "pd": pd}
+            exec(codigo, namespace)
+            futuro = Future()
+            futuro.set_result((namespace["df"], _metricas(len(df), 0.01)))
+            return futuro
+
+        monkeypatch.setattr(executor_scripts, "executar_script_perfilado", executar)
+        monkeypatch.setattr(perfil_scripts, "registrar_execucao_script", lambda *args, **kwargs: True)
+        monkeypatch.setattr(perfil_scripts, "selecionar_variante_mais_rapida", lambda *args, **kwargs: None)
+        monkeypatch.setattr(perfil_scripts, "_atualizar_status_regeneracao", lambda id_fila, status: estado["status"].append(status))
+        monkeypatch.setattr(perfil_scripts, "registrar_variante_script", lambda hash_estrutura, codigo, descricao: estado["variantes"].append(codigo))
+        monkeypatch.setattr("app.utils.data_handler.revalidar_dataframe", lambda df, template: {"valido": True})
+
+        def reescrever(codigo_novo):
+            monkeypatch.setattr(
+                ai_code_generator, "gerar_codigo_correcao_ia",
+                lambda *args: (codigo_novo, None, "estrutura", None, None, 0, None)
+            )
+            df = pd.DataFrame({"valor": ["1.5", "2.5"]})
+            perfil_scripts._reescrever_script(1, SCRIPT_LENTO, _metricas(2, 1.0), df, {}, "chave", {})
+            return estado
+
+        return reescrever
+
+    def test_mesmo_resultado_registra_variante(self, reescrita):
+        """Uma reescrita equivalente e registrada como variante."""
+        estado = reescrita(SCRIPT_RAPIDO)
+        assert estado["variantes"] == [SCRIPT_RAPIDO]
+        assert estado["status"][-1] == "CONCLUIDO"
+
+    def test_resultado_diferente_descartado(self, reescrita):
+        """Uma reescrita que altera os dados e descartada mesmo passando na validacao."""
+        estado = reescrita("df['valor'] = df['valor'].astype(float) * 2")
+        assert estado["variantes"] == []
+        assert estado["status"][-1] == "DESCARTADO"
@@ -0,0 +1,108 @@
+"""
+Testes do verificador de restricoes derivado do schema.sql.
+
+Execute com: pytest tests/test_restricoes_schema.py -v
+"""
+
+import pandas as pd
+
+from app.services.restricoes_schema import carregar_restricoes, verificar_restricoes
+
+from tests.conftest import DATABASE_DIR
+
+
+def _transacao(**colunas):
+    base = {
+        "id_transacao": ["TXN00000001"],
+        "data_transacao": ["2024-01-15"],
+        "valor": [100.5],
+        "tipo": ["CREDITO"],
+        "categoria": ["OUTROS"],
+        "descricao": [None],
+        "conta_origem": ["12345-6"],
+        "conta_destino": [None],
+        "status": ["CONFIRMADO"],
+    }
+    base.update(colunas)
+    return pd.DataFrame(base)
+
+
+# =============================================================================
+# TESTES DA LEITURA DO SCHEMA
+# =============================================================================
+
+class TestLeituraSchema:
+    """As restricoes de transacoes_financeiras sao extraidas do schema.sql."""
+
+    def test_colunas_e_restricoes(self):
+        """NOT NULL, tipo e CHECK de cada coluna sao reconhecidos."""
+        restricoes = carregar_restricoes(DATABASE_DIR / "schema.sql")
+
+        assert restricoes["valor"]["numerico"]
+        assert restricoes["valor"]["not_null"]
+        assert restricoes["valor"]["checks"][0]["operador"] == ">"
+        assert restricoes["valor"]["checks"][0]["limite"] == 0
+        assert not restricoes["descricao"]["not_null"]
+        assert restricoes["status"]["not_null"]
+        assert restricoes["status"]["checks"][0]["valores"] == ["PENDENTE", "CONFIRMADO", "CANCELADO"]
+        assert len(restricoes["categoria"]["checks"][0]["valores"]) == 10
+        assert not restricoes["data_transacao"]["numerico"]
+
+    def test_check_nao_suportado_e_ignorado(self, tmp_path):
+        """Expressoes fora das formas conhecidas ficam a cargo do banco."""
+        schema = tmp_path / "schema.sql"
+        schema.write_text(
+            "CREATE TABLE transacoes_financeiras (\n"
+            "    valor REAL CHECK (valor > 0 AND valor < 100), -- comentario, com virgula\n"
+            "    tipo TEXT CHECK (tipo IN ('A', 'B''C'))\n"
+            ");",
+            encoding="utf-8"
+        )
+        restricoes = carregar_restricoes(schema)
+        assert restricoes["valor"]["checks"] == []
+        assert restricoes["tipo"]["checks"][0]["valores"] == ["A", "B'C"]
+
+
+# =============================================================================
+# TESTES DA VERIFICACAO
+# =============================================================================
+
+class TestVerificacao:
+    """Cada linha invalida recebe um erro com a primeira violacao encontrada."""
+
+    def test_linha_valida(self):
+        """Uma transacao completa nao gera erros."""
+        invalidas, erros = verificar_restricoes(_transacao())
+        assert not invalidas.any()
+        assert erros == []
+
+    def test_violacoes(self):
+        """NOT NULL, tipo numerico, comparacao e lista sao verificados."""
+        df = pd.concat([
+            _transacao(conta_origem=[None]),
+            _transacao(valor=["abc"]),
+            _transacao(valor=[0]),
+            _transacao(categoria=["VIAGEM"]),
+            _transacao(),
+        ], ignore_index=True)
+        invalidas, erros = verificar_restricoes(df)
+
+        assert invalidas.tolist() == [True, True, True, True, False]
+        assert [e["linha"] for e in erros] == [1, 2, 3, 4]
+        assert erros[0]["erro"] == "Campo obrigatorio ausente: conta_origem"
+        assert erros[1]["erro"] == "Valor nao numerico em valor: 'abc'"
+        assert erros[2]["erro"].startswith("Violacao de restricao: valor > 0")
+        assert "categoria IN" in erros[3]["erro"]
+
+    def test_uma_violacao_por_linha(self):
+        """Linha com varias violacoes aparece uma unica vez."""
+        invalidas, erros = verificar_restricoes(_transacao(valor=[-1], tipo=["PIX"], status=[None]))
+        assert invalidas.tolist() == [True]
+        assert len(erros) == 1
+
+    def test_coluna_ausente(self):
+        """Coluna obrigatoria fora do DataFrame invalida todas as linhas."""
+        df = _transacao().drop(columns=["status"])
+        invalidas, erros = verificar_restricoes(df)
+        assert invalidas.all()
+        assert erros[0]["erro"] == "Campo obrigatorio ausente: status"
@@ -0,0 +1,201 @@
+"""
+Testes do cache de scripts em camadas (SQLite local + chave-valor remoto).
+
+Execute com: pytest tests/test_script_cache.py -v
+"""
+
+import sqlite3
+
+import pytest
+
+import app.services.script_cache as script_cache
+from app.services.script_cache import (
+    BackendCache,
+    BackendSQLite,
+    BackendChaveValor,
+    CacheEmCamadas,
+    gerar_hash_estrutura,
+)
+
+from tests.conftest import DATABASE_DIR
+
+
+class ClienteChaveValorLocal:
+    """Substituto local de um servidor compativel com Redis (get/set/incr)."""
+
+    def __init__(self):
+        self.dados = {}
+        self.leituras = 0
+
+    def get(self, chave):
+        self.leituras += 1
+        return self.dados.get(chave)
+
+    def set(self, chave, valor, ex=None):
+        self.dados[chave] = valor.encode("utf-8") if isinstance(valor, str) else valor
+        return True
+
+    def incr(self, chave):
+        self.dados[chave] = int(self.dados.get(chave, 0)) + 1
+        return self.dados[chave]
+
+
+class ClienteIndisponivel:
+    """Simula um servidor remoto fora do ar."""
+
+    def get(self, chave):
+        raise ConnectionError("conexao recusada")
+
+    def set(self, chave, valor, ex=None):
+        raise ConnectionError("conexao recusada")
+
+
+@pytest.fixture
+def db_local(tmp_path):
+    """Banco local temporario com as tabelas do cache."""
+    db_path = tmp_path / "local.db"
+    conn = sqlite3.connect(db_path)
+    with open(DATABASE_DIR / "schema.sql", "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.execute("""
+        CREATE TABLE script_costs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            script_id INTEGER UNIQUE,
+            custo_tokens INTEGER DEFAULT 0,
+            custo_acumulado INTEGER,
+            geracoes INTEGER
+        )
+    """)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+# =============================================================================
+# TESTES DO CACHE EM CAMADAS
+# =============================================================================
+
+class TestCacheEmCamadas:
+    """Consulta local primeiro e usa o remoto apenas em falhas locais."""
+
+    def test_replica_enxerga_script_gerado_em_outra(self, tmp_path, db_local):
+        """Script salvo em uma replica fica disponivel para outra via remoto."""
+        remoto = ClienteChaveValorLocal()
+        outra_db = tmp_path / "outra.db"
+        outra_db.write_bytes(db_local.read_bytes())
+
+        replica_a = CacheEmCamadas(BackendSQLite(db_local), BackendChaveValor(remoto))
+        replica_b = CacheEmCamadas(BackendSQLite(outra_db), BackendChaveValor(remoto))
+
+        replica_a.salvar("hash_x", "df = df.rename(columns={'a': 'b'})", "teste", tokens=120)
+        entrada = replica_b.buscar("hash_x")
+
+        assert entrada["script"] == "df = df.rename(columns={'a': 'b'})"
+        assert entrada["custo_tokens"] == 120
+        assert entrada["id"] is not None
+
+    def test_acerto_local_nao_consulta_remoto(self, db_local):
+        """Quando o script existe localmente o remoto nao e acionado."""
+        remoto = ClienteChaveValorLocal()
+        cache = CacheEmCamadas(BackendSQLite(db_local), BackendChaveValor(remoto))
+        cache.salvar("hash_y", "df = df", tokens=10)
+        remoto.leituras = 0
+
+        assert cache.buscar("hash_y")["script"] == "df = df"
+        assert remoto.leituras == 0
+
+    def test_remoto_indisponivel_vira_falha_de_cache(self, db_local):
+        """Erros do remoto nao derrubam a busca local."""
+        cache = CacheEmCamadas(BackendSQLite(db_local), BackendChaveValor(ClienteIndisponivel()))
+
+        assert cache.salvar("hash_z", "df = df") is not None
+        assert cache.buscar("inexistente") is None
+        assert cache.ultimo_erro_remoto is not None
+
+    def test_acerto_remoto_nao_conta_como_geracao(self, tmp_path, db_local):
+        """A copia local de um acerto remoto nao soma custo nem geracao."""
+        remoto = ClienteChaveValorLocal()
+        outra_db = tmp_path / "outra.db"
+        outra_db.write_bytes(db_local.read_bytes())
+        CacheEmCamadas(BackendSQLite(db_local), BackendChaveValor(remoto)).salvar("hash_x", "df = df", tokens=120)
+
+        replica = CacheEmCamadas(BackendSQLite(outra_db), BackendChaveValor(remoto))
+        replica.buscar("hash_x")
+        replica.local.buscar("hash_x")
+
+        conn = sqlite3.connect(outra_db)
+        custos = conn.execute("SELECT custo_tokens, custo_acumulado, geracoes FROM script_costs").fetchall()
+        conn.close()
+        assert custos == [(120, 0, 0)]
+
+    def test_remoto_sem_dependencia_usa_local(self, monkeypatch):
+        """Sem o pacote do cliente remoto o cache segue apenas local."""
+        def sem_redis(url):
+            raise RuntimeError("Cache remoto requer o pacote 'redis'")
+
+        monkeypatch.setattr(script_cache, "CACHE_REMOTO_URL", "redis://localhost:6379/0")
+        monkeypatch.setattr(script_cache, "_cache_ativo", None)
+        monkeypatch.setattr(BackendChaveValor, "a_partir_de_url", staticmethod(sem_redis))
+
+        cache = script_cache.obter_cache()
+        assert cache.remoto is None
+        assert "redis" in cache.ultimo_erro_remoto
+
+    def test_backend_abstrato(self):
+        """A interface nao pode ser instanciada sem implementar os metodos."""
+        with pytest.raises(TypeError):
+            BackendCache()
+
+
+# =============================================================================
+# TESTES DO BACKEND LOCAL
+# =============================================================================
+
+class TestBackendSQLite:
+    """Salvar o mesmo script de novo nao conta uma nova geracao."""
+
+    def test_script_identico_nao_regravado(self, db_local):
+        """Custo, geracoes e data de atualizacao ficam como estavam."""
+        backend = BackendSQLite(db_local)
+        script_id = backend.salvar("hash_x", "df = df", tokens=100)
+
+        conn = sqlite3.connect(db_local)
+        antes = conn.execute("SELECT updated_at FROM scripts_transformacao").fetchone()
+        conn.close()
+
+        assert backend.salvar("hash_x", "df = df", tokens=100) == script_id
+
+        conn = sqlite3.connect(db_local)
+        depois = conn.execute("SELECT updated_at FROM scripts_transformacao").fetchone()
+        custos = conn.execute("SELECT custo_tokens, custo_acumulado, geracoes FROM script_costs").fetchall()
+        conn.close()
+        assert depois == antes
+        assert custos == [(100, 100, 1)]
+
+    def test_script_diferente_soma_geracao(self, db_local):
+        """Um script novo para o mesmo hash substitui o anterior e soma o custo."""
+        backend = BackendSQLite(db_local)
+        backend.salvar("hash_x", "df = df", tokens=100)
+        backend.salvar("hash_x", "df = df.copy()", tokens=50)
+
+        conn = sqlite3.connect(db_local)
+        script = conn.execute("SELECT script_python FROM scripts_transformacao").fetchone()[0]
+        custos = conn.execute("SELECT custo_tokens, custo_acumulado, geracoes FROM script_costs").fetchall()
+        conn.close()
+        assert script == "df = df.copy()"
+        assert custos == [(50, 150, 2)]
+
+
+# =============================================================================
+# TESTES DO HASH DE ESTRUTURA
+# =============================================================================
+
+class TestHashEstrutura:
+    """O hash deve ignorar a ordem de colunas e de erros."""
+
+    def test_ordem_nao_altera_hash(self):
+        """Mesma estrutura em ordens diferentes gera o mesmo hash."""
+        erros = [{"tipo": "formato_data"}, {"tipo": "colunas_faltando", "colunas": ["b", "a"]}]
+        h1 = gerar_hash_estrutura(["x", "y"], erros)
+        h2 = gerar_hash_estrutura(["y", "x"], list(reversed(erros)))
+        assert h1 == h2
@@ -0,0 +1,140 @@
+"""
+Testes da execucao unica por chave (single flight).
+
+Execute com: pytest tests/test_single_flight.py -v
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def _em_threads(quantidade, alvo):
+    threads = [threading.Thread(target=alvo) for _ in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _aguardar_lider(voo, chave):
+    limite = time.monotonic() + 5
+    while not voo.em_andamento(chave):
+        assert time.monotonic() < limite
+        time.sleep(0.001)
+
+
+# =============================================================================
+# TESTES DE EXECUCAO COMPARTILHADA
+# =============================================================================
+
+class TestExecucaoCompartilhada:
+    """Chamadas concorrentes com a mesma chave dividem uma unica execucao."""
+
+    def test_uma_execucao_para_chamadas_concorrentes(self):
+        """O lider executa; os demais recebem o mesmo resultado sem executar."""
+        voo = SingleFlight()
+        liberar = threading.Event()
+        execucoes = []
+        resultados = []
+
+        def funcao():
+            execucoes.append(1)
+            liberar.wait(5)
+            return "script"
+
+        def chamar():
+            resultados.append(voo.executar("hash", funcao))
+
+        lider = _em_threads(1, chamar)
+        _aguardar_lider(voo, "hash")
+        seguidores = _em_threads(3, chamar)
+        time.sleep(0.05)
+        liberar.set()
+        for thread in lider + seguidores:
+            thread.join(5)
+
+        assert execucoes == [1]
+        assert sorted(resultados, key=lambda r: not r[1]) == [("script", True)] + [("script", False)] * 3
+
+    def test_chaves_diferentes_nao_esperam(self):
+        """Cada chave tem a sua execucao."""
+        voo = SingleFlight()
+        assert voo.executar("a", lambda: 1) == (1, True)
+        assert voo.executar("b", lambda: 2) == (2, True)
+
+
+# =============================================================================
+# TESTES DE FALHA
+# =============================================================================
+
+class TestFalha:
+    """A excecao do lider chega a quem esperava e a chave e liberada."""
+
+    def test_excecao_propagada_aos_seguidores(self):
+        """Quem aguardava recebe a mesma excecao do lider."""
+        voo = SingleFlight()
+        liberar = threading.Event()
+        erros = []
+
+        def funcao():
+            liberar.wait(5)
+            raise ValueError("provedor fora do ar")
+
+        def chamar():
+            try:
+                voo.executar("hash", funcao)
+            except ValueError as e:
+                erros.append(str(e))
+
+        lider = _em_threads(1, chamar)
+        _aguardar_lider(voo, "hash")
+        seguidores = _em_threads(2, chamar)
+        time.sleep(0.05)
+        liberar.set()
+        for thread in lider + seguidores:
+            thread.join(5)
+
+        assert erros == ["provedor fora do ar"] * 3
+
+    def test_chave_liberada_apos_falha(self):
+        """Depois de uma falha a proxima chamada executa de novo."""
+        voo = SingleFlight()
+        with pytest.raises(RuntimeError):
+            voo.executar("hash", lambda: (_ for _ in ()).throw(RuntimeError("falha")))
+
+        assert not voo.em_andamento("hash")
+        assert voo.executar("hash", lambda: "novo") == ("novo", True)
+
+
+# =============================================================================
+# TESTES DE RESULTADOS CONCLUIDOS
+# =============================================================================
+
+class TestResultadosConcluidos:
+    """O resultado concluido atende chamadas posteriores ate ser descartado."""
+
+    def test_chamada_posterior_reaproveita(self):
+        """Depois que o lider termina, a mesma chave nao executa de novo."""
+        voo = SingleFlight()
+        assert voo.executar("hash", lambda: "script") == ("script", True)
+        assert voo.executar("hash", lambda: "outro") == ("script", False)
+        assert voo.futuro("hash").result() == "script"
+
+    def test_descartar_libera_nova_execucao(self):
+        """Um resultado recusado deixa de ser reaproveitado."""
+        voo = SingleFlight()
+        voo.executar("hash", lambda: "script")
+        voo.descartar("hash")
+        assert voo.futuro("hash") is None
+        assert voo.executar("hash", lambda: "novo") == ("novo", True)
+
+    def test_limite_de_resultados(self):
+        """Os resultados mais antigos saem quando o limite e atingido."""
+        voo = SingleFlight(limite_resultados=2)
+        for chave in ("a", "b", "c"):
+            voo.executar(chave, lambda: chave)
+        assert voo.futuro("a") is None
+        assert voo.futuro("c").result() == "c"
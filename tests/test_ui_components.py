@@ -0,0 +1,35 @@
+"""
+Testes das funcoes de formatacao dos componentes de interface.
+
+Execute com: pytest tests/test_ui_components.py -v
+"""
+
+import pandas as pd
+import pytest
+
+from app.services.helpers_correcao import parse_brl_centavos
+from app.utils.ui_components import formatar_centavos
+
+
+# =============================================================================
+# TESTES DE FORMATACAO DE VALORES
+# =============================================================================
+
+class TestFormatarCentavos:
+    """O total do preview e exibido a partir da soma exata em centavos."""
+
+    @pytest.mark.parametrize("centavos, esperado", [
+        (0, "R$ 0.00"),
+        (5, "R$ 0.05"),
+        (123456789, "R$ 1,234,567.89"),
+        (-150, "R$ -1.50"),
+        (-5, "R$ -0.05"),
+    ])
+    def test_formatacao(self, centavos, esperado):
+        """Valores negativos mantem reais e centavos do valor absoluto."""
+        assert formatar_centavos(centavos) == esperado
+
+    def test_total_negativo(self):
+        """Um arquivo com mais debitos que creditos mostra o total negativo correto."""
+        serie = pd.Series(["100,00", "-250,50", "-0,99"])
+        assert formatar_centavos(int(parse_brl_centavos(serie).sum())) == "R$ -151.49"
@@ -0,0 +1,125 @@
+"""
+Testes da validacao incremental das respostas do modelo em streaming.
+
+Execute com: pytest tests/test_validacao_incremental.py -v
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.validacao_incremental import ValidadorIncremental, ErroGeracaoInterrompida
+from app.services.ai_code_generator import _transmitir_codigo
+
+SCRIPT_VALIDO = """```python
+df = df.rename(columns={
+    'data': 'data_transacao',
+})
+if 'valor' in df.columns:
+    df['valor'] = parse_brl(df['valor'])
+else:
+    df['valor'] = None
+
+@staticmethod
+def limpar(x):
+    return x
+df = df.loc[:, ~df.columns.duplicated()]
+```"""
+
+
+def _alimentar(validador, texto, tamanho=3):
+    # Simula fragmentos pequenos, que cortam linhas e palavras ao meio
+    for i in range(0, len(texto), tamanho):
+        if not validador.alimentar(texto[i:i + tamanho]):
+            return False
+    return True
+
+
+# =============================================================================
+# TESTES DO VALIDADOR
+# =============================================================================
+
+class TestValidadorIncremental:
+    """Instrucoes sao compiladas conforme chegam, sem falsos positivos."""
+
+    def test_script_valido_sem_cercas(self):
+        """Cercas de markdown sao removidas e blocos multilinha nao abortam."""
+        validador = ValidadorIncremental()
+        assert _alimentar(validador, SCRIPT_VALIDO)
+        codigo = validador.finalizar()
+        assert "```" not in codigo
+        assert codigo.startswith("df = df.rename")
+        compile(codigo, "<teste>", "exec")
+
+    def test_texto_explicativo_aborta_cedo(self):
+        """Prosa antes do codigo aborta na primeira instrucao seguinte."""
+        validador = ValidadorIncremental()
+        resposta = "Aqui esta o codigo corrigido:\ndf = df.copy()\n" + "df['x'] = 1\n" * 200
+        assert not _alimentar(validador, resposta)
+        assert "sintaxe" in validador.motivo_interrupcao
+        assert validador.caracteres < 100
+
+    def test_erro_no_meio_informa_linha(self):
+        """O erro aponta a linha absoluta do script."""
+        validador = ValidadorIncremental()
+        assert not _alimentar(validador, "df = df.copy()\nx = = 1\ny = 2\n")
+        assert "Linha 2" in validador.motivo_interrupcao
+
+    def test_limite_de_tamanho(self):
+        """Respostas maiores que o limite sao abortadas."""
+        validador = ValidadorIncremental(limite_caracteres=50)
+        assert not _alimentar(validador, "df['x'] = 1\n" * 20)
+        assert "limite" in validador.motivo_interrupcao
+
+    def test_resposta_truncada(self):
+        """Resposta que termina no meio de uma instrucao e rejeitada no final."""
+        validador = ValidadorIncremental()
+        assert _alimentar(validador, "df = df.rename(columns={\n    'a': 'b',\n")
+        with pytest.raises(ErroGeracaoInterrompida):
+            validador.finalizar()
+
+
+# =============================================================================
+# TESTES DO STREAMING
+# =============================================================================
+
+class _RespostaFalsa:
+    def __init__(self, fragmentos):
+        self.fragmentos = fragmentos
+        self.consumidos = 0
+        self.fechada = False
+
+    def __iter__(self):
+        for fragmento in self.fragmentos:
+            self.consumidos += 1
+            delta = SimpleNamespace(content=fragmento)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        uso = SimpleNamespace(total_tokens=30, prompt_tokens=20)
+        yield SimpleNamespace(choices=[], usage=uso)
+
+    def close(self):
+        self.fechada = True
+
+
+def _cliente_falso(resposta):
+    return SimpleNamespace(criar_completion=lambda api_key, **kwargs: resposta)
+
+
+class TestTransmissao:
+    """A resposta e consumida em fragmentos e fechada ao abortar."""
+
+    def test_sucesso_retorna_uso(self):
+        """O uso do ultimo fragmento e retornado junto do codigo."""
+        resposta = _RespostaFalsa(["df = df", ".copy()\n", "df['x'] = 1\n"])
+        codigo, uso = _transmitir_codigo(_cliente_falso(resposta), "chave", "prompt")
+        assert codigo == "df = df.copy()\ndf['x'] = 1"
+        assert uso.total_tokens == 30
+        assert resposta.fechada
+
+    def test_aborto_fecha_resposta(self):
+        """Um erro de sintaxe interrompe o consumo dos fragmentos restantes."""
+        resposta = _RespostaFalsa(["Segue o script:\n", "df = df.copy()\n"] + ["df['x'] = 1\n"] * 100)
+        with pytest.raises(ErroGeracaoInterrompida):
+            _transmitir_codigo(_cliente_falso(resposta), "chave", "prompt")
+        assert resposta.fechada
+        assert resposta.consumidos == 2